@@ -31,12 +31,18 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str = None
     # DATABASE_URL: Optional[str] = None
+    # Connections kept open for API requests; syncs add overflow on top (db.database.pool_options)
+    DB_POOL_SIZE: int = 10
 
     # CORS: Comma-separated list of allowed origins
     # Development: "http://localhost:3000"
     # Production: "http://localhost:3000,https://your-app.vercel.app"
     ALLOWED_ORIGINS: str = ""
 
+    # Keyset pagination of list endpoints (emails/pagination.py)
+    API_PAGE_SIZE: int = 50  # page size when only a cursor is given
+    API_MAX_PAGE_SIZE: int = 500
+
     OPENAI_API_KEY: str
     
     # JWT Authentication settings
@@ -51,6 +57,8 @@ class Settings(BaseSettings):
     MICROSOFT_TENANT_ID: str = os.getenv("TENANT_ID", "consumers")
     # Note: offline_access is automatically added by MSAL, don't include it explicitly
     MICROSOFT_SCOPES: List[str] = ["User.Read", "Mail.ReadWrite", "Mail.Send"]
+    # Graph API root (point at fake_graph for local load tests, e.g. http://localhost:8001/v1.0)
+    GRAPH_BASE_URL: str = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
     
     # Token Encryption (for storing refresh tokens)
     TOKEN_ENCRYPTION_KEY: str = os.getenv("TOKEN_ENCRYPTION_KEY")
@@ -58,6 +66,60 @@ class Settings(BaseSettings):
     # Frontend URL (for OAuth redirects)
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+    # Background sync scheduler (runs delta syncs for every Outlook account)
+    SYNC_SCHEDULER_ENABLED: bool = True
+    SYNC_INTERVAL_SECONDS: int = 300  # fixed interval when SYNC_ADAPTIVE_CADENCE is off
+    SYNC_JITTER_SECONDS: int = 30
+    SYNC_MAX_CONCURRENT_ACCOUNTS: int = 8  # global cap across all users
+    SYNC_MAX_CONCURRENT_PER_USER: int = 2
+    SYNC_FANOUT_MAX_CONCURRENCY: int = 4  # accounts synced at once by "sync all accounts"
+
+    # Adaptive cadence (sync/cadence.py): busy accounts sync often, quiet ones rarely
+    SYNC_ADAPTIVE_CADENCE: bool = True
+    SYNC_MIN_INTERVAL_SECONDS: int = 60
+    SYNC_MAX_INTERVAL_SECONDS: int = 3600
+    SYNC_RATE_TIME_CONSTANT_SECONDS: int = 6 * 3600  # memory of the arrival-rate estimate
+    SYNC_TARGET_CHANGES_PER_SYNC: float = 1.0  # aim for about this many changes per round
+
+    # Standalone sync workers (python -m sync_worker) claiming accounts through DB leases
+    ## Run them with SYNC_SCHEDULER_ENABLED=false on the API nodes
+    SYNC_WORKER_CONCURRENCY: int = 16  # accounts synced at once per worker
+    SYNC_LEASE_SECONDS: int = 120  # heartbeats renew every third of this
+    SYNC_WORKER_POLL_SECONDS: float = 5.0
+
+    # Mail folder discovery: every folder is synced, not just inbox + sentitems
+    FOLDER_DISCOVERY_ENABLED: bool = True
+    FOLDER_DISCOVERY_INTERVAL_SECONDS: int = 3600
+    SYNC_MAX_CONCURRENT_FOLDERS: int = 4  # folders of one account synced at once
+    SYNC_COLD_FOLDER_AFTER_DAYS: int = 30  # folders unchanged this long count as cold
+    SYNC_COLD_FOLDER_INTERVAL_SECONDS: int = 3600  # cold folders (and archive) sync at most this often
+
+    # Initial load of a newly connected account (sync/backfill.py)
+    BACKFILL_RECENT_DAYS: int = 14  # phase 1: newest-first recent window
+    BACKFILL_PAGE_SIZE: int = 100
+    BACKFILL_PARTITIONED: bool = True  # phase 2: older mail in parallel date windows
+    BACKFILL_WINDOW_DAYS: int = 30
+    BACKFILL_MAX_WORKERS: int = 4  # Outlook allows 4 concurrent requests per mailbox
+
+    # Metadata-first sync: delta pulls only list fields, bodies are hydrated lazily
+    SYNC_METADATA_ONLY: bool = True
+    BODY_HYDRATOR_ENABLED: bool = True
+    BODY_HYDRATOR_INTERVAL_SECONDS: int = 60
+    BODY_HYDRATOR_BATCH_SIZE: int = 20  # one $batch round trip per account per tick
+
+    # Delta pages are parsed while they download and written in chunks (core.graph_client.iter_graph_chunks)
+    GRAPH_STREAM_JSON: bool = True
+    GRAPH_STREAM_CHUNK_ITEMS: int = 100
+    SYNC_DELTA_PAGE_SIZE: int | None = None  # Prefer: odata.maxpagesize (None = Graph's default)
+
+    # Graph change notifications (push sync). Disabled unless a public webhook URL is set,
+    # e.g. https://api.example.com/api/sync/notifications
+    GRAPH_NOTIFICATION_URL: str | None = os.getenv("GRAPH_NOTIFICATION_URL")
+    GRAPH_LIFECYCLE_NOTIFICATION_URL: str | None = os.getenv("GRAPH_LIFECYCLE_NOTIFICATION_URL")
+    SUBSCRIPTION_LIFETIME_MINUTES: int | None = None  # None = Graph's maximum (sync.subscriptions.GRAPH_MAX_SUBSCRIPTION_MINUTES)
+    SUBSCRIPTION_RENEW_BEFORE_MINUTES: int = 720
+    SUBSCRIPTION_CHECK_INTERVAL_SECONDS: int = 900
+
     # def __init__(self, **values):
     #     super().__init__(**values)
     #     if not self.DEBUG:
@@ -0,0 +1,767 @@
+"""
+webapp/backend/core/graph_client.py
+
+Shared async transport for Microsoft Graph.
+
+One pooled httpx.AsyncClient is created lazily and reused by every caller
+(sync jobs, API requests, background tasks), so keep-alive connections and
+TLS sessions are shared instead of being opened per request.
+
+Features:
+- get_graph_client()       -> returns the shared pooled AsyncClient
+- close_graph_client()     -> closes it (called on app shutdown)
+- graph_headers(...)       -> default headers for a bearer token
+- graph_request(...)       -> any Graph call with Retry-After / backoff retries and
+                              AIMD concurrency limits per tenant and per mailbox
+- set_token_refresher(...) -> hook that swaps a rejected (401) token for a fresh one
+- graph_stream(...)        -> same, but yields the response with its body unread (streaming)
+- graph_get_json(...)      -> GET a Graph URL and return the decoded JSON body
+- graph_batch(...)         -> many calls via JSON $batch (≤20 per round trip, dependsOn aware)
+- iter_graph_pages(...)    -> follow @odata.nextLink of any collection, one page at a time
+- iter_delta_pages(...)    -> async generator over delta pages (@odata.nextLink → @odata.deltaLink)
+- iter_graph_chunks(...)   -> like iter_graph_pages, but parses each page incrementally (ijson)
+                              and yields its items in small chunks while the body downloads
+- prefetch(...)            -> reads an async iterator ahead so fetching overlaps processing
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+import httpx
+import ijson
+from ijson.common import ObjectBuilder
+
+from core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+## Microsoft Graph - API Base Endpoint
+## (overridable via GRAPH_BASE_URL, e.g. to point at the local fake_graph server)
+MS_GRAPH_BASE_URL = settings.GRAPH_BASE_URL.rstrip("/")
+
+# Connection pool shared by all Graph calls in this process
+GRAPH_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+GRAPH_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# Retry policy (throttling + transient failures)
+GRAPH_MAX_RETRIES = 5
+GRAPH_BACKOFF_BASE_SECONDS = 1.0
+GRAPH_BACKOFF_MAX_SECONDS = 60.0
+THROTTLE_STATUSES = (429, 503)
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Adaptive concurrency bounds
+## Outlook allows 4 concurrent requests per app per mailbox
+MAILBOX_CONCURRENCY_INITIAL = 4
+MAILBOX_CONCURRENCY_MAX = 4
+TENANT_CONCURRENCY_INITIAL = 16
+TENANT_CONCURRENCY_MAX = 64
+
+# JSON $batch: Graph accepts at most 20 sub-requests per batch
+GRAPH_BATCH_MAX_REQUESTS = 20
+
+_graph_client: Optional[httpx.AsyncClient] = None
+
+# (mailbox key, rejected access token) -> fresh access token; see set_token_refresher
+TokenRefresher = Callable[[str, str], Awaitable[str]]
+_token_refresher: Optional[TokenRefresher] = None
+
+T = TypeVar("T")
+_END_OF_STREAM = object()
+
+
+def get_graph_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide pooled AsyncClient, creating it on first use.
+    """
+    global _graph_client
+    if _graph_client is None or _graph_client.is_closed:
+        _graph_client = httpx.AsyncClient(limits=GRAPH_HTTP_LIMITS, timeout=GRAPH_HTTP_TIMEOUT)
+    return _graph_client
+
+
+async def close_graph_client() -> None:
+    """Close the shared AsyncClient (safe to call when it was never created)."""
+    global _graph_client
+    if _graph_client is not None and not _graph_client.is_closed:
+        await _graph_client.aclose()
+    _graph_client = None
+
+
+def graph_headers(access_token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+
+
+def set_token_refresher(refresher: Optional[TokenRefresher]) -> None:
+    """
+    Register how a token Graph rejected with 401 is replaced.
+
+    graph_stream calls it once per request that names a mailbox (the token
+    was revoked or expired early), then retries with the token it returns.
+    email_accounts.service registers the account token cache.
+    """
+    global _token_refresher
+    _token_refresher = refresher
+
+
+# ------------------------------------------------------------
+# Throttling: errors, Retry-After, backoff
+# ------------------------------------------------------------
+
+class GraphThrottledError(httpx.HTTPStatusError):
+    """Graph still answered 429/503 after every retry."""
+
+    def __init__(self, message: str, *, request: httpx.Request, response: httpx.Response):
+        super().__init__(message, request=request, response=response)
+        self.retry_after = parse_retry_after(response)
+
+
+def parse_retry_after(resp: httpx.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^attempt))."""
+    return random.uniform(0, min(GRAPH_BACKOFF_MAX_SECONDS, GRAPH_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def raise_for_graph_status(resp: httpx.Response, expected: Tuple[int, ...] = (200,)) -> None:
+    """
+    Raises:
+        GraphThrottledError: on 429/503 (carries .retry_after)
+        httpx.HTTPStatusError: on any other unexpected status
+    """
+    if resp.status_code in expected:
+        return
+    if resp.status_code in THROTTLE_STATUSES:
+        raise GraphThrottledError(f"Graph API throttled: {resp.text}", request=resp.request, response=resp)
+    raise httpx.HTTPStatusError(f"Graph API error: {resp.text}", request=resp.request, response=resp)
+
+
+# ------------------------------------------------------------
+# Adaptive concurrency (AIMD) per tenant / per mailbox
+# ------------------------------------------------------------
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to Graph throttling (AIMD, like TCP congestion control).
+
+    - Additive increase: every successful request adds 1/limit (≈ +1 per window of requests)
+    - Multiplicative decrease: a throttled request halves the limit, at most once per
+      cooldown so a burst of 429s from the same window counts as one signal
+    """
+
+    def __init__(
+        self,
+        initial: float,
+        minimum: float = 1.0,
+        maximum: float = 16.0,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 1.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown_seconds:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.info("Graph throttling: concurrency limit lowered to %.1f", self.limit)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(key: str, initial: float, maximum: float) -> AdaptiveLimiter:
+    """Return the process-wide limiter for `key` ("tenant:..." / "mailbox:...")."""
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = _limiters[key] = AdaptiveLimiter(initial=initial, maximum=maximum)
+    return limiter
+
+
+def _limiters_for(tenant: Optional[str], mailbox: Optional[str]) -> List[AdaptiveLimiter]:
+    """
+    Limiters in acquisition order: mailbox first, then tenant.
+
+    A request queued behind its own mailbox's limit must not sit on a tenant
+    slot meanwhile, or one busy mailbox starves every other mailbox of the tenant.
+    """
+    limiters = []
+    if mailbox:
+        limiters.append(get_limiter(f"mailbox:{mailbox}", MAILBOX_CONCURRENCY_INITIAL, MAILBOX_CONCURRENCY_MAX))
+    limiters.append(get_limiter(f"tenant:{tenant or 'default'}", TENANT_CONCURRENCY_INITIAL, TENANT_CONCURRENCY_MAX))
+    return limiters
+
+
+@contextlib.asynccontextmanager
+async def graph_stream(
+    method: str,
+    url: str,
+    access_token: str,
+    *,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+    **kwargs: Any,
+) -> AsyncIterator[httpx.Response]:
+    """
+    Send a Graph request and hand over the response with its body still unread.
+
+    Same retry / throttling policy as graph_request (retries happen before the
+    body is read). The limiter slots are held until the block exits, so a
+    streamed download counts against the concurrency limits like any other call.
+    A 401 on a mailbox request is retried once with a fresh token from the
+    registered token refresher (set_token_refresher).
+
+    Usage:
+        async with graph_stream("GET", url, token) as resp:
+            async for chunk in resp.aiter_bytes():
+                ...
+    """
+    limiters = _limiters_for(tenant, mailbox)
+    headers = {**graph_headers(access_token), **kwargs.pop("headers", {})}
+    client = get_graph_client()
+
+    attempt = 0
+    # Only one token refresh per request: a second 401 is handed to the caller
+    can_reauthenticate = bool(mailbox) and _token_refresher is not None
+    while True:
+        for limiter in limiters:
+            await limiter.acquire()
+        throttled = False
+        unauthorized = False
+        resp: Optional[httpx.Response] = None
+        try:
+            try:
+                resp = await client.send(client.build_request(method, url, headers=headers, **kwargs), stream=True)
+                throttled = resp.status_code in THROTTLE_STATUSES
+                unauthorized = resp.status_code == 401 and can_reauthenticate
+            except httpx.TransportError:
+                if attempt >= GRAPH_MAX_RETRIES:
+                    raise
+
+            if resp is not None and not unauthorized and (
+                resp.status_code not in RETRYABLE_STATUSES or attempt >= GRAPH_MAX_RETRIES
+            ):
+                try:
+                    yield resp
+                finally:
+                    await resp.aclose()
+                return
+            if resp is not None:
+                await resp.aclose()
+        finally:
+            for limiter in limiters:
+                await limiter.release(throttled=throttled)
+
+        if unauthorized:
+            can_reauthenticate = False
+            logger.warning("Graph %s %s -> 401, retrying with a refreshed token", method, url.split("?")[0])
+            access_token = await _token_refresher(mailbox, access_token)
+            headers["Authorization"] = f"Bearer {access_token}"
+            continue
+
+        delay = (parse_retry_after(resp) if resp is not None else None)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        logger.warning(
+            "Graph %s %s -> %s, retry %d/%d in %.1fs",
+            method, url.split("?")[0], resp.status_code if resp is not None else "transport error",
+            attempt + 1, GRAPH_MAX_RETRIES, delay,
+        )
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def graph_request(
+    method: str,
+    url: str,
+    access_token: str,
+    *,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """
+    Send a Graph request through the shared client with throttling handling.
+
+    - Holds a slot on the mailbox limiter (if given), then on the tenant limiter
+    - Retries 429/5xx and transport errors up to GRAPH_MAX_RETRIES times,
+      sleeping for Retry-After when Graph sends one, else jittered exponential backoff
+    - Slots are released while sleeping, so other mailboxes keep their throughput
+
+    Args:
+        method / url: HTTP method and absolute Graph URL
+        access_token: bearer token
+        mailbox: key of the mailbox (e.g. EmailAccount id) for per-mailbox limits
+        tenant: key of the tenant for per-tenant limits
+        **kwargs: passed to httpx (params, json, headers...)
+
+    Returns:
+        The final httpx.Response, body read (callers check the status, see raise_for_graph_status)
+    """
+    async with graph_stream(method, url, access_token, mailbox=mailbox, tenant=tenant, **kwargs) as resp:
+        await resp.aread()
+        return resp
+
+
+async def graph_get_json(
+    url: str,
+    access_token: str,
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    GET a Graph URL (with retries/throttling) and return the decoded body.
+
+    Raises:
+        GraphThrottledError: if Graph kept throttling after all retries
+        httpx.HTTPStatusError: on any other non-200 response
+    """
+    resp = await graph_request("GET", url, access_token, params=params, mailbox=mailbox, tenant=tenant)
+    raise_for_graph_status(resp)
+    return resp.json()
+
+
+# ------------------------------------------------------------
+# JSON $batch
+# ------------------------------------------------------------
+
+def pack_batches(requests: List[Dict[str, Any]], size: int = GRAPH_BATCH_MAX_REQUESTS) -> List[List[Dict[str, Any]]]:
+    """
+    Split sub-requests into $batch payloads of at most `size` requests.
+
+    Requests linked through "dependsOn" must travel in the same batch, so
+    dependency chains are kept together (first-fit, original order preserved).
+
+    Raises:
+        ValueError: if one dependency chain alone exceeds `size`
+    """
+    index = {req["id"]: i for i, req in enumerate(requests)}
+    parent = list(range(len(requests)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, req in enumerate(requests):
+        for dep in req.get("dependsOn", []):
+            if dep in index:
+                parent[find(i)] = find(index[dep])
+
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for i, req in enumerate(requests):
+        groups.setdefault(find(i), []).append(req)
+
+    batches: List[List[Dict[str, Any]]] = []
+    for group in groups.values():
+        if len(group) > size:
+            raise ValueError(f"dependsOn chain of {len(group)} requests exceeds the $batch limit of {size}")
+        target = next((b for b in batches if len(b) + len(group) <= size), None)
+        if target is None:
+            batches.append(list(group))
+        else:
+            target.extend(group)
+    return batches
+
+
+def _batch_payload(requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    payload = []
+    for req in requests:
+        sub = {"id": req["id"], "method": req.get("method", "GET"), "url": req["url"]}
+        if req.get("dependsOn"):
+            sub["dependsOn"] = list(req["dependsOn"])
+        if "body" in req:
+            sub["body"] = req["body"]
+            sub["headers"] = {"Content-Type": "application/json", **req.get("headers", {})}
+        elif req.get("headers"):
+            sub["headers"] = req["headers"]
+        payload.append(sub)
+    return {"requests": payload}
+
+
+async def _send_batch(
+    requests: List[Dict[str, Any]],
+    access_token: str,
+    mailbox: Optional[str],
+    tenant: Optional[str],
+) -> Dict[str, Dict[str, Any]]:
+    resp = await graph_request(
+        "POST", f"{MS_GRAPH_BASE_URL}/$batch", access_token,
+        json=_batch_payload(requests), mailbox=mailbox, tenant=tenant,
+    )
+    raise_for_graph_status(resp)
+    return {r["id"]: r for r in resp.json().get("responses", [])}
+
+
+async def graph_batch(
+    requests: List[Dict[str, Any]],
+    access_token: str,
+    *,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run many Graph calls through JSON $batch (20 sub-requests per HTTP round trip).
+
+    Args:
+        requests: [{"id": "1", "method": "PATCH", "url": "/me/messages/{id}",
+                    "body": {...}, "dependsOn": ["0"]}, ...]
+                  urls are relative to the API version (e.g. "/me/messages/...")
+        access_token: bearer token
+        mailbox / tenant: throttling keys (see graph_request)
+
+    Batches are sent concurrently (bounded by the mailbox/tenant limiters).
+    Sub-requests answered 429 - and their 424 "failed dependency" dependents -
+    are re-sent after the largest Retry-After, up to GRAPH_MAX_RETRIES times.
+
+    Returns:
+        {id: {"id", "status", "headers", "body"}} for every sub-request
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = list(requests)
+
+    for attempt in range(GRAPH_MAX_RETRIES + 1):
+        responses = await asyncio.gather(
+            *(_send_batch(batch, access_token, mailbox, tenant) for batch in pack_batches(pending))
+        )
+        for batch_results in responses:
+            results.update(batch_results)
+
+        # Throttled sub-requests, plus dependents that failed only because of them
+        retry_ids = {req["id"] for req in pending if results.get(req["id"], {}).get("status") == 429}
+        changed = True
+        while changed:
+            changed = False
+            for req in pending:
+                if (req["id"] not in retry_ids
+                        and results.get(req["id"], {}).get("status") == 424
+                        and retry_ids.intersection(req.get("dependsOn", []))):
+                    retry_ids.add(req["id"])
+                    changed = True
+
+        if not retry_ids or attempt == GRAPH_MAX_RETRIES:
+            break
+
+        delays = [
+            float({k.lower(): v for k, v in (results[i].get("headers") or {}).items()}.get("retry-after") or 0)
+            for i in retry_ids
+        ]
+        delay = max(delays) if any(delays) else backoff_delay(attempt)
+        logger.warning("Graph $batch: %d sub-requests throttled, retrying in %.1fs", len(retry_ids), delay)
+        await asyncio.sleep(delay)
+
+        # Dependencies that already succeeded are dropped from dependsOn
+        pending = [
+            {**req, "dependsOn": [d for d in req.get("dependsOn", []) if d in retry_ids]}
+            for req in pending if req["id"] in retry_ids
+        ]
+
+    return results
+
+
+async def iter_graph_pages(
+    url: str,
+    access_token: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+    metrics: Optional[Dict[str, float]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Follow a paged Graph collection from `url`, yielding each page as it arrives.
+
+    Works for plain list queries (ends when there is no @odata.nextLink) and
+    delta queries (ends at the page carrying "@odata.deltaLink").
+
+    Args:
+        url: first page URL
+        access_token: bearer token for the mailbox
+        params: query parameters of the first request ($filter, $orderby, $top...);
+                later pages use the nextLink as-is
+        headers: extra request headers (e.g. Prefer: odata.maxpagesize=...)
+        mailbox / tenant: throttling keys (see graph_request)
+        metrics: optional dict accumulating "graph_requests", "graph_seconds"
+                 (retries and throttling waits included) and "bytes_downloaded"
+
+    Yields:
+        Page dicts: {"value": [...], "@odata.nextLink" | "@odata.deltaLink": ...}
+    """
+    next_url: Optional[str] = url
+
+    while next_url:
+        started = time.perf_counter()
+        resp = await graph_request(
+            "GET", next_url, access_token, params=params, headers=headers or {}, mailbox=mailbox, tenant=tenant,
+        )
+        raise_for_graph_status(resp)
+        page = resp.json()
+        if metrics is not None:
+            metrics["graph_requests"] = metrics.get("graph_requests", 0) + 1
+            metrics["graph_seconds"] = metrics.get("graph_seconds", 0.0) + time.perf_counter() - started
+            metrics["bytes_downloaded"] = metrics.get("bytes_downloaded", 0) + len(resp.content)
+        yield page
+
+        # Continue until @odata.deltaLink is found (delta) or the nextLinks run out (list)
+        if page.get("@odata.deltaLink"):
+            break
+        next_url = page.get("@odata.nextLink")
+        params = None
+
+
+def iter_delta_pages(
+    delta_url: str,
+    access_token: str,
+    *,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+    metrics: Optional[Dict[str, float]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Follow a delta query from `delta_url`, yielding each Graph page as it arrives.
+
+    Only one page is held at a time, so memory stays flat whatever the mailbox size.
+    The last page carries the "@odata.deltaLink" (next sync's checkpoint).
+
+    Args:
+        delta_url: base delta endpoint (first sync) or a stored @odata.deltaLink
+        access_token: bearer token for the mailbox
+        mailbox / tenant / metrics: see iter_graph_pages
+    """
+    return iter_graph_pages(delta_url, access_token, mailbox=mailbox, tenant=tenant, metrics=metrics)
+
+
+# ------------------------------------------------------------
+# Incremental page parsing
+# ------------------------------------------------------------
+
+class PageChunk(NamedTuple):
+    """
+    Consecutive items of one Graph page.
+
+    `links` is set on the last chunk of each page only: the page's top-level
+    @odata.* annotations ({"@odata.nextLink": ...} or {"@odata.deltaLink": ...}).
+    """
+    items: List[Dict[str, Any]]
+    links: Optional[Dict[str, str]] = None
+
+    @property
+    def page_end(self) -> bool:
+        return self.links is not None
+
+
+class _PageParser:
+    """
+    ijson push parser for one collection page.
+
+    Bytes go in as they arrive; every "value" item comes out as soon as its
+    closing brace was parsed, so only the item being built is resident.
+    """
+
+    def __init__(self) -> None:
+        self._events = ijson.sendable_list()
+        self._coro = ijson.parse_coro(self._events, use_float=True)
+        self._builder: Optional[ObjectBuilder] = None
+        self.links: Dict[str, str] = {}
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        self._coro.send(data)
+        return self._drain()
+
+    def close(self) -> List[Dict[str, Any]]:
+        self._coro.close()
+        return self._drain()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        items = []
+        for prefix, event, value in self._events:
+            if self._builder is not None:
+                self._builder.event(event, value)
+                if prefix == "value.item" and event == "end_map":
+                    items.append(self._builder.value)
+                    self._builder = None
+            elif prefix == "value.item" and event == "start_map":
+                self._builder = ObjectBuilder()
+                self._builder.event(event, value)
+            elif event == "string" and prefix.startswith("@odata."):
+                self.links[prefix] = value
+        del self._events[:]
+        return items
+
+
+async def _iter_streamed_chunks(
+    url: str,
+    access_token: str,
+    *,
+    params: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    chunk_items: int,
+    mailbox: Optional[str],
+    tenant: Optional[str],
+    metrics: Optional[Dict[str, float]],
+) -> AsyncIterator[PageChunk]:
+    next_url: Optional[str] = url
+
+    while next_url:
+        started = time.perf_counter()
+        async with graph_stream(
+            "GET", next_url, access_token, params=params, headers=headers or {}, mailbox=mailbox, tenant=tenant,
+        ) as resp:
+            if resp.status_code != 200:
+                await resp.aread()
+                raise_for_graph_status(resp)
+
+            graph_seconds = time.perf_counter() - started
+            received = 0
+            parser = _PageParser()
+            pending: List[Dict[str, Any]] = []
+            body = resp.aiter_bytes()
+            while True:
+                read_started = time.perf_counter()
+                try:
+                    data = await body.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    graph_seconds += time.perf_counter() - read_started
+                received += len(data)
+                for item in parser.feed(data):
+                    pending.append(item)
+                    if len(pending) >= chunk_items:
+                        yield PageChunk(pending)
+                        pending = []
+            pending.extend(parser.close())
+
+        if metrics is not None:
+            metrics["graph_requests"] = metrics.get("graph_requests", 0) + 1
+            metrics["graph_seconds"] = metrics.get("graph_seconds", 0.0) + graph_seconds
+            metrics["bytes_downloaded"] = metrics.get("bytes_downloaded", 0) + received
+        yield PageChunk(pending, parser.links)
+
+        if parser.links.get("@odata.deltaLink"):
+            break
+        next_url = parser.links.get("@odata.nextLink")
+        params = None
+
+
+async def iter_graph_chunks(
+    url: str,
+    access_token: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    chunk_items: Optional[int] = None,
+    mailbox: Optional[str] = None,
+    tenant: Optional[str] = None,
+    metrics: Optional[Dict[str, float]] = None,
+) -> AsyncIterator[PageChunk]:
+    """
+    Follow a paged Graph collection like iter_graph_pages, in chunks of items.
+
+    With settings.GRAPH_STREAM_JSON each response body is parsed while it
+    downloads, so a page of large HTML bodies never exists as one decoded JSON
+    tree: at most `chunk_items` (default settings.GRAPH_STREAM_CHUNK_ITEMS)
+    items are held at a time. The connection and its limiter slots stay in
+    use until the page is fully read. Without it, each page is one chunk.
+
+    Args:
+        chunk_items: items per chunk (the last chunk of a page may be shorter or empty)
+        other args: see iter_graph_pages
+
+    Yields:
+        PageChunk; the last chunk of each page carries the page's links
+    """
+    if settings.GRAPH_STREAM_JSON:
+        chunks = _iter_streamed_chunks(
+            url, access_token, params=params, headers=headers,
+            chunk_items=chunk_items or settings.GRAPH_STREAM_CHUNK_ITEMS,
+            mailbox=mailbox, tenant=tenant, metrics=metrics,
+        )
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    async for page in iter_graph_pages(
+        url, access_token, params=params, headers=headers, mailbox=mailbox, tenant=tenant, metrics=metrics,
+    ):
+        yield PageChunk(page.pop("value", []), page)
+
+
+async def prefetch(source: AsyncIterator[T], depth: int = 1) -> AsyncIterator[T]:
+    """
+    Read `source` ahead in a background task, buffering at most `depth` items.
+
+    Lets the caller process page N (e.g. write it to the DB) while page N+1
+    is being downloaded. Errors from the source are re-raised to the caller;
+    the reader task is cancelled if the caller stops early.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+
+    async def _produce() -> None:
+        try:
+            async for item in source:
+                await queue.put((item, None))
+        except Exception as e:
+            await queue.put((_END_OF_STREAM, e))
+            return
+        await queue.put((_END_OF_STREAM, None))
+
+    reader = asyncio.create_task(_produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _END_OF_STREAM:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        reader.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reader
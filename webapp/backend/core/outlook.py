@@ -29,6 +29,8 @@ import httpx
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 
+from core.graph_client import MS_GRAPH_BASE_URL
+
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -38,9 +40,6 @@ logging.basicConfig(level=logging.INFO)
 # Directories for tokens
 # ------------------------------------------------------------
 
-## Microsoft Graph - API Base Endpoint
-MS_GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
-
 # Default token file location (project-root relative). 
 DEFAULT_TOKEN_DIR = Path(__file__).resolve().parents[2] / ".tokens"
 DEFAULT_TOKEN_DIR.mkdir(parents=True, exist_ok=True)
@@ -489,7 +488,7 @@ if __name__ == "__main__":
     """
     Typical manual flow:
     1) Run this file once to generate initial refresh token:
-         python webapp/backend/core/outlook.py
+         cd webapp/backend && python -m core.outlook
        Follow the prompts, that stores the refresh token in .tokens/ms_refresh_token.txt
     2) From your FastAPI code, create an OutlookClient instance and call fetch_messages()
     """
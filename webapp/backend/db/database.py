@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -21,11 +21,31 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 # Create engine with appropriate settings
 # SQLite needs check_same_thread=False for FastAPI
 # PostgreSQL doesn't need this parameter
+def pool_options() -> dict:
+    """
+    Connection pool sized for concurrent syncs (server databases only).
+
+    Every account syncing in a process holds one connection for its advisory
+    lock (sync/coordinator.py) and one session per folder syncing at once:
+    max(accounts synced at once) x (SYNC_MAX_CONCURRENT_FOLDERS + 1) may be
+    checked out on top of the DB_POOL_SIZE kept for API requests.
+    """
+    if not DATABASE_URL or "sqlite" in DATABASE_URL:
+        return {}
+    accounts = max(settings.SYNC_MAX_CONCURRENT_ACCOUNTS, settings.SYNC_WORKER_CONCURRENCY)
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": accounts * (settings.SYNC_MAX_CONCURRENT_FOLDERS + 1),
+        "pool_pre_ping": True,
+    }
+
+
 print("🔍 [DATABASE] Creating SQLAlchemy engine...")
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if DATABASE_URL and "sqlite" in DATABASE_URL else {},
-    echo=False  # Set to True to see SQL queries (useful for debugging)
+    echo=False,  # Set to True to see SQL queries (useful for debugging)
+    **pool_options(),
 )
 print("✅ [DATABASE] Engine created successfully")
 
@@ -46,6 +66,24 @@ def get_db():
         db.close()
 
 
+def register_entities():
+    """
+    Imports every entity module so all tables are on Base.metadata.
+
+    create_tables() calls it, so no entry point (API, sync worker, benchmark)
+    depends on having imported the right entities first.
+    """
+    # Deferred: the entity modules import Base from here
+    import entities.users  # noqa: F401
+    import entities.email_account  # noqa: F401
+    import entities.email  # noqa: F401
+    import entities.delta_token  # noqa: F401
+    import entities.graph_subscription  # noqa: F401
+    import entities.sync_run  # noqa: F401
+    import entities.account_sync_state  # noqa: F401
+    import entities.conversation  # noqa: F401
+
+
 def create_tables():
     """
     Creates all tables defined in entity models.
@@ -53,5 +91,42 @@ def create_tables():
     Note: This is for MVP/development convenience.
     In production, you should use Alembic migrations instead.
     """
+    register_entities()
     Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created/verified")
\ No newline at end of file
+    add_missing_columns()
+    print("✅ Database tables created/verified")
+
+
+def add_missing_columns():
+    """
+    Adds columns and indexes that exist on the models but not yet in the database.
+
+    create_all() only creates missing *tables*, so new (nullable) columns on
+    existing tables would otherwise never appear. MVP convenience until Alembic.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    print(f"⚠️ Cannot add NOT NULL column {table.name}.{column.name} automatically")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                ))
+                print(f"✅ Added column {table.name}.{column.name}")
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn, checkfirst=True)
+                    print(f"✅ Added index {index.name}")
\ No newline at end of file
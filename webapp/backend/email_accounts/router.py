@@ -23,6 +23,9 @@ from email_accounts.schemas import (
     OAuthCallbackParams
 )
 from core.config import settings
+from sync.scheduler import request_account_sync
+from sync.backfill import start_backfill
+from sync.subscriptions import delete_account_subscriptions
 
 
 logger = logging.getLogger(__name__)
@@ -133,7 +136,7 @@ async def oauth_callback(
         expires_in = token_response.get("expires_in", 3600)
         expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
         
-        service.create_email_account(
+        account = service.create_email_account(
             db=db,
             user_id=user_id,
             email_address=email_address,
@@ -141,6 +144,11 @@ async def oauth_callback(
             refresh_token=token_response["refresh_token"],
             access_token_expires_at=expires_at
         )
+
+        # Start the newest-first backfill (recent mail first, then the full delta in the background)
+        ## The access token from the code exchange is reused instead of refreshing right away
+        service.access_token_cache.put(account.id, access_token, expires_at)
+        start_backfill(account.id, user_id)
         
         # Redirect to frontend success page
         success_url = f"{settings.FRONTEND_URL}/accounts/oauth-callback?success=true"
@@ -178,7 +186,10 @@ async def delete_email_account(
 ):
     """
     Delete an email account (cascade deletes all associated emails).
+    Its Graph subscriptions are deleted first, so Graph stops notifying for it.
     """
+    if service.get_email_account(db, account_id, current_user.get_uuid()):
+        await delete_account_subscriptions(account_id)
     deleted = service.delete_email_account(db, account_id, current_user.get_uuid())
     
     if not deleted:
@@ -194,18 +205,20 @@ async def sync_email_account(
     db: Session = Depends(get_db)
 ):
     """
-    Trigger email sync for a specific account.
-    (Placeholder - actual sync logic to be implemented)
+    Trigger a background email sync for a specific account.
+    Returns immediately; the sync runs on the background scheduler's worker pool
+    (or on a sync worker when SYNC_SCHEDULER_ENABLED is off).
     """
     account = service.get_email_account(db, account_id, current_user.get_uuid())
     
     if not account:
         raise HTTPException(status_code=404, detail="Email account not found")
+    if account.provider != ProviderEnum.outlook:
+        raise HTTPException(status_code=400, detail="Only Outlook accounts supported")
     
-    # TODO: Implement actual sync logic
-    # For now, just return success
+    started = await request_account_sync(account.id, account.user_id)
     return {
-        "message": "Sync initiated",
+        "message": "Sync initiated" if started else "Sync already running",
         "account_id": str(account_id),
         "email_address": account.email_address
     }
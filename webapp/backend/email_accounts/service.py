@@ -4,17 +4,21 @@ Email Accounts Service
 Business logic for email account management, OAuth2 flow, and token encryption.
 """
 
+import asyncio
 import json
 import secrets
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple
 from uuid import UUID
 
 import msal
 from cryptography.fernet import Fernet
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from core.config import settings
+from core.graph_client import set_token_refresher
+from db.database import SessionLocal
 from entities.email_account import EmailAccount, ProviderEnum
 from email_accounts.schemas import EmailAccountResponse, OAuthStateData
 
@@ -187,6 +191,154 @@ def refresh_access_token(encrypted_refresh_token: str) -> Tuple[str, Optional[st
     return access_token, new_refresh_token, expires_at
 
 
+def get_account_access_token(db: Session, account: EmailAccount) -> str:
+    """
+    Get a fresh Graph access token for an Outlook account.
+
+    Refreshes through MSAL and persists the new expiry (and the rotated
+    refresh token, if Microsoft returned one). Blocking: call it from the
+    threadpool in async code.
+    
+    Args:
+        db: Database session the account is attached to
+        account: Outlook EmailAccount
+        
+    Returns:
+        Access token
+        
+    Raises:
+        ValueError: If the account has no stored refresh token
+        RuntimeError: If token refresh fails
+    """
+    if not account.ms_refresh_token_encrypted:
+        raise ValueError("No refresh token found for this account")
+
+    access_token, new_refresh_token, expires_at = refresh_access_token(
+        account.ms_refresh_token_encrypted
+    )
+
+    # Update token expiration in database
+    account.access_token_expires_at = expires_at
+    if new_refresh_token:
+        # Microsoft returned a new refresh token, update it
+        account.ms_refresh_token_encrypted = encrypt_token(new_refresh_token)
+    db.commit()
+
+    return access_token
+
+
+# ============================================================================
+# Access Token Cache
+# ============================================================================
+
+# Tokens are refreshed this long before Microsoft's expiry,
+# so a token handed out never dies in the middle of a sync
+ACCESS_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def _refresh_account_token(account_id: UUID) -> Tuple[str, datetime]:
+    """Refresh an account's token in a short-lived session. Returns (access_token, expires_at)."""
+    db = SessionLocal()
+    try:
+        account = db.get(EmailAccount, account_id)
+        if account is None:
+            raise LookupError(f"Email account {account_id} not found")
+        access_token = get_account_access_token(db, account)
+        expires_at = account.access_token_expires_at
+        # SQLite hands DateTime(timezone=True) back naive
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return access_token, expires_at
+    finally:
+        db.close()
+
+
+class AccessTokenCache:
+    """
+    In-process cache of Graph access tokens, keyed by EmailAccount id.
+
+    - A cached token is reused until ACCESS_TOKEN_REFRESH_MARGIN before it expires
+      (no MSAL round trip, Fernet decrypt/encrypt or DB commit per sync)
+    - Concurrent callers for the same account share one in-flight refresh (single-flight)
+    - One instance lives for the whole process, so API requests and background
+      jobs reuse each other's tokens
+    """
+
+    def __init__(self, refresh_margin: timedelta = ACCESS_TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[UUID, Tuple[str, datetime]] = {}
+        self._inflight: Dict[UUID, asyncio.Future] = {}
+
+    def peek(self, account_id: UUID) -> Optional[str]:
+        """Return the cached token if it is still comfortably valid, else None."""
+        cached = self._tokens.get(account_id)
+        if cached is None:
+            return None
+        access_token, expires_at = cached
+        if datetime.now(timezone.utc) >= expires_at - self.refresh_margin:
+            return None
+        return access_token
+
+    async def get(self, account_id: UUID) -> str:
+        """
+        Get a valid access token for the account, refreshing at most once at a time.
+
+        Raises:
+            LookupError: If the account does not exist
+            ValueError: If the account has no stored refresh token
+            RuntimeError: If token refresh fails
+        """
+        access_token = self.peek(account_id)
+        if access_token:
+            return access_token
+
+        refresh = self._inflight.get(account_id)
+        if refresh is None:
+            refresh = asyncio.ensure_future(self._refresh(account_id))
+            self._inflight[account_id] = refresh
+            refresh.add_done_callback(lambda _: self._inflight.pop(account_id, None))
+
+        # shield: a cancelled caller must not cancel the refresh other callers wait on
+        return await asyncio.shield(refresh)
+
+    def put(self, account_id: UUID, access_token: str, expires_at: datetime) -> None:
+        """Seed the cache with a token obtained elsewhere (e.g. an OAuth code exchange)."""
+        self._tokens[account_id] = (access_token, expires_at)
+
+    def invalidate(self, account_id: UUID) -> None:
+        """Drop a cached token (e.g. Graph answered 401, or the account was deleted)."""
+        self._tokens.pop(account_id, None)
+
+    async def replace_rejected(self, account_id: UUID, rejected_token: str) -> str:
+        """
+        Get a token to retry with after Graph answered 401 for `rejected_token`.
+
+        Only the first caller holding the rejected token invalidates it; callers
+        that arrive after the refresh reuse the new token.
+        """
+        cached = self._tokens.get(account_id)
+        if cached is not None and cached[0] == rejected_token:
+            self.invalidate(account_id)
+        return await self.get(account_id)
+
+    async def _refresh(self, account_id: UUID) -> str:
+        access_token, expires_at = await run_in_threadpool(_refresh_account_token, account_id)
+        self.put(account_id, access_token, expires_at)
+        return access_token
+
+
+# Process-wide cache (shared by API requests and background sync jobs)
+access_token_cache = AccessTokenCache()
+
+
+async def _replace_rejected_token(mailbox: str, rejected_token: str) -> str:
+    # Graph calls key their mailbox limiter by EmailAccount id
+    return await access_token_cache.replace_rejected(UUID(mailbox), rejected_token)
+
+
+set_token_refresher(_replace_rejected_token)
+
+
 # ============================================================================
 # Email Account CRUD
 # ============================================================================
@@ -266,6 +418,7 @@ def delete_email_account(db: Session, account_id: UUID, user_id: UUID) -> bool:
     
     db.delete(account)
     db.commit()
+    access_token_cache.invalidate(account_id)
     return True
 
 
@@ -0,0 +1,396 @@
+"""
+Conversation Views
+
+Backs GET /emails/conversations with the Conversation summary table
+(entities/conversation.py): listing is an indexed scan of one row per
+conversation, however many emails the account holds, paged by keyset on
+(last_message_at, latest_email_id) (emails.pagination).
+
+Summaries are maintained incrementally. Every write path reports the
+conversations it touched and refresh_conversations() recomputes just
+those, in the caller's transaction. On PostgreSQL each conversation is
+locked first (transaction-level advisory lock): two folder syncs writing
+to one conversation recompute it one after the other, the second one
+seeing the first one's committed emails, instead of the last writer
+storing a summary computed from a stale snapshot.
+
+- emails.service: upsert_email, bulk_upsert_emails, delete_email, bulk_delete_by_ids
+- sync.state: read / flag updates
+- emails.router: classification writes
+
+A summary is computed in SQL: a window function ranks each email inside its
+conversation, one GROUP BY turns that into a row per conversation (message
+count, participants, unread / flagged, id of the latest message), then the
+latest message is joined by primary key and its latest classification is
+read through the email_id index. No HTML body is read, and the preview is
+cut to CONVERSATION_PREVIEW_LENGTH characters in SQL.
+
+Emails without a conversation_id are their own conversation ("single_<id>").
+backfill_conversations() builds the table for accounts that have emails
+but no summaries yet (run on startup).
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import String, and_, bindparam, case, cast, distinct, func, literal, literal_column, or_, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, BIGINT
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from entities.conversation import Conversation
+from entities.email import Email, EmailClassification
+from entities.email_account import EmailAccount
+from emails.pagination import CursorKey, after_key
+
+
+logger = logging.getLogger(__name__)
+
+
+# Characters of the latest message's text kept as preview
+CONVERSATION_PREVIEW_LENGTH = 500
+
+# Key prefix of emails without a conversation_id
+SINGLE_KEY_PREFIX = "single_"
+
+# Conversations recomputed per statement
+REFRESH_CHUNK_SIZE = 500
+
+# Columns rewritten when a summary is refreshed
+SUMMARY_COLUMNS = (
+    "conversation_id",
+    "latest_email_id",
+    "last_message_at",
+    "subject",
+    "preview_text",
+    "classification",
+    "message_count",
+    "participants",
+    "unread_count",
+    "is_flagged",
+)
+
+ConversationKey = Tuple[UUID, str]
+
+
+def conversation_key(email_account_id: UUID, conversation_id: Optional[str], email_id: int) -> ConversationKey:
+    return email_account_id, conversation_id or f"{SINGLE_KEY_PREFIX}{email_id}"
+
+
+def _participants_agg(db: Session, expr):
+    """Distinct values of `expr` joined with commas (string_agg on PostgreSQL, group_concat elsewhere)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.string_agg(distinct(expr), literal_column("','"))
+    return func.group_concat(distinct(expr))
+
+
+def split_participants(value: Optional[str]) -> List[str]:
+    """Unique addresses from an aggregated "author,to,to,..." string."""
+    seen: Set[str] = set()
+    participants = []
+    for address in (value or "").split(","):
+        address = address.strip()
+        if address and address not in seen:
+            seen.add(address)
+            participants.append(address)
+    return participants
+
+
+# ============================================================================
+# Summaries computed from the emails
+# ============================================================================
+
+def _summary_rows(db: Session, filters: List[Any]) -> List[Any]:
+    """One summary row per conversation of the emails matching `filters`."""
+    conv_key = func.coalesce(Email.conversation_id, literal(SINGLE_KEY_PREFIX).concat(cast(Email.id, String)))
+    sort_date = func.coalesce(Email.received_at, Email.created_at)
+
+    # Every matching email with its rank inside its conversation (1 = latest)
+    scoped = select(
+        Email.id,
+        Email.email_account_id,
+        conv_key.label("conv_key"),
+        sort_date.label("sort_date"),
+        Email.author,
+        Email.to,
+        Email.is_read,
+        Email.is_flagged,
+        func.row_number().over(
+            partition_by=(Email.email_account_id, conv_key),
+            order_by=(sort_date.desc(), Email.id.desc()),
+        ).label("rn"),
+    ).where(*filters).subquery("scoped")
+
+    # One row per conversation; the latest message is carried as its id (joined by primary key below)
+    groups = select(
+        scoped.c.email_account_id,
+        scoped.c.conv_key,
+        func.max(case((scoped.c.rn == 1, scoped.c.id))).label("latest_id"),
+        func.max(case((scoped.c.rn == 1, scoped.c.sort_date))).label("sort_date"),
+        func.count().label("message_count"),
+        _participants_agg(db, scoped.c.author.concat(",").concat(scoped.c.to)).label("participants"),
+        func.sum(case((scoped.c.is_read.is_(False), 1), else_=0)).label("unread_count"),
+        func.max(case((scoped.c.is_flagged.is_(True), 1), else_=0)).label("is_flagged"),
+    ).group_by(scoped.c.email_account_id, scoped.c.conv_key).subquery("groups")
+
+    # Latest classification of the latest message (index lookup per conversation)
+    latest_classification = select(EmailClassification.classification).where(
+        EmailClassification.email_id == groups.c.latest_id
+    ).order_by(
+        EmailClassification.created_at.desc(), EmailClassification.id.desc()
+    ).limit(1).correlate(groups).scalar_subquery()
+
+    return db.execute(
+        select(
+            groups.c.email_account_id,
+            groups.c.conv_key,
+            Email.id,
+            Email.conversation_id,
+            Email.subject,
+            func.substr(Email.email_thread_text, 1, CONVERSATION_PREVIEW_LENGTH).label("preview_text"),
+            groups.c.sort_date,
+            groups.c.message_count,
+            groups.c.participants,
+            groups.c.unread_count,
+            groups.c.is_flagged,
+            latest_classification.label("classification"),
+        ).select_from(groups).join(Email, Email.id == groups.c.latest_id)
+    ).all()
+
+
+def _summary_values(row: Any) -> Dict[str, Any]:
+    return {
+        "email_account_id": row.email_account_id,
+        "conversation_key": row.conv_key,
+        "conversation_id": row.conversation_id,
+        "latest_email_id": row.id,
+        "last_message_at": row.sort_date,
+        "subject": row.subject,
+        "preview_text": row.preview_text,
+        "classification": row.classification,
+        "message_count": row.message_count,
+        "participants": split_participants(row.participants),
+        "unread_count": row.unread_count or 0,
+        "is_flagged": bool(row.is_flagged),
+    }
+
+
+# ============================================================================
+# Incremental maintenance (no commit: runs in the writer's transaction)
+# ============================================================================
+
+def conversation_keys(db: Session, *criteria: Any) -> Set[ConversationKey]:
+    """Conversations of the emails matching `criteria` (e.g. Email.message_id.in_(...))."""
+    return {
+        conversation_key(account_id, conversation_id, email_id)
+        for account_id, conversation_id, email_id in db.execute(
+            select(Email.email_account_id, Email.conversation_id, Email.id).where(*criteria)
+        )
+        if account_id is not None
+    }
+
+
+def refresh_conversations(db: Session, keys: Iterable[ConversationKey]) -> None:
+    """
+    Recompute the summaries of `keys` from their emails (no commit).
+
+    Conversations without emails left lose their row.
+    """
+    keys = list(set(keys))
+    for i in range(0, len(keys), REFRESH_CHUNK_SIZE):
+        _refresh_chunk(db, keys[i:i + REFRESH_CHUNK_SIZE])
+
+
+def conversation_lock_key(key: ConversationKey) -> int:
+    """Stable signed 64-bit key for pg_advisory_xact_lock."""
+    account_id, conv_key = key
+    digest = hashlib.blake2b(f"conversation:{account_id}:{conv_key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _lock_conversations(db: Session, keys: List[ConversationKey]) -> None:
+    """
+    Lock the conversations until the caller's transaction ends (PostgreSQL only).
+
+    Locks are taken in key order, so concurrent writers cannot deadlock on them.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    lock_keys = sorted({conversation_lock_key(key) for key in keys})
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(k) FROM unnest(:keys) AS k").bindparams(
+            bindparam("keys", type_=ARRAY(BIGINT))
+        ),
+        {"keys": lock_keys},
+    )
+
+
+def _refresh_chunk(db: Session, keys: List[ConversationKey]) -> None:
+    # Before reading: the summary must be computed from what the lock holder committed
+    _lock_conversations(db, keys)
+
+    by_account: Dict[UUID, List[str]] = {}
+    single_ids: List[int] = []
+    for account_id, key in keys:
+        if key.startswith(SINGLE_KEY_PREFIX) and key[len(SINGLE_KEY_PREFIX):].isdigit():
+            single_ids.append(int(key[len(SINGLE_KEY_PREFIX):]))
+        else:
+            by_account.setdefault(account_id, []).append(key)
+
+    email_filters = [
+        and_(Email.email_account_id == account_id, Email.conversation_id.in_(conversation_ids))
+        for account_id, conversation_ids in by_account.items()
+    ]
+    if single_ids:
+        email_filters.append(and_(Email.id.in_(single_ids), Email.conversation_id.is_(None)))
+    summaries = {
+        (row.email_account_id, row.conv_key): _summary_values(row)
+        for row in _summary_rows(db, [or_(*email_filters)])
+    }
+
+    # Conversations without emails left
+    gone: Dict[UUID, List[str]] = {}
+    for account_id, key in keys:
+        if (account_id, key) not in summaries:
+            gone.setdefault(account_id, []).append(key)
+    for account_id, gone_keys in gone.items():
+        db.query(Conversation).filter(
+            Conversation.email_account_id == account_id,
+            Conversation.conversation_key.in_(gone_keys),
+        ).delete(synchronize_session=False)
+
+    if summaries:
+        # Sorted: concurrent writers touch shared rows in the same order
+        _upsert_summaries(db, [summaries[key] for key in sorted(summaries, key=lambda k: (str(k[0]), k[1]))])
+
+
+def _upsert_summaries(db: Session, values: List[Dict[str, Any]]) -> None:
+    """INSERT ... ON CONFLICT (email_account_id, conversation_key) DO UPDATE (ORM fallback elsewhere)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for summary in values:
+            row = db.query(Conversation).filter(
+                Conversation.email_account_id == summary["email_account_id"],
+                Conversation.conversation_key == summary["conversation_key"],
+            ).first()
+            if row is None:
+                db.add(Conversation(**summary))
+            else:
+                for column, value in summary.items():
+                    setattr(row, column, value)
+        db.flush()
+        return
+
+    now = datetime.now(timezone.utc)
+    stmt = insert(Conversation).values([{**summary, "updated_at": now} for summary in values])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Conversation.email_account_id, Conversation.conversation_key],
+        set_={column: stmt.excluded[column] for column in SUMMARY_COLUMNS + ("updated_at",)},
+    )
+    db.execute(stmt)
+
+
+# ============================================================================
+# Full rebuild / startup backfill
+# ============================================================================
+
+def rebuild_conversations(db: Session, account_id: UUID) -> int:
+    """
+    Replace every summary of an account with freshly computed ones (no commit).
+
+    Returns:
+        Number of conversations
+    """
+    db.query(Conversation).filter(Conversation.email_account_id == account_id).delete(synchronize_session=False)
+    values = [_summary_values(row) for row in _summary_rows(db, [Email.email_account_id == account_id])]
+    if values:
+        db.bulk_insert_mappings(Conversation, values)
+    return len(values)
+
+
+def backfill_conversations() -> None:
+    """Build the summaries of accounts that have emails but none yet (one transaction per account)."""
+    db = SessionLocal()
+    try:
+        summarized = select(Conversation.email_account_id).distinct()
+        pending = [
+            account_id for (account_id,) in db.query(Email.email_account_id).filter(
+                Email.email_account_id.isnot(None),
+                Email.email_account_id.notin_(summarized),
+            ).distinct()
+        ]
+        for account_id in pending:
+            count = rebuild_conversations(db, account_id)
+            db.commit()
+            logger.info("Built %d conversation summaries for account %s", count, account_id)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ============================================================================
+# Listing
+# ============================================================================
+
+def list_conversation_summaries(
+    db: Session,
+    user_id: UUID,
+    account_id: Optional[UUID] = None,
+    limit: Optional[int] = None,
+    after: Optional[CursorKey] = None,
+) -> List[Dict[str, Any]]:
+    """
+    The user's conversations, newest first (ConversationGroupResponse fields).
+
+    Args:
+        user_id: owner of the email accounts
+        account_id: only this account (must belong to the user)
+        limit: at most this many conversations
+        after: only conversations after this (last_message_at, latest_email_id) key (emails.pagination)
+    """
+    stmt = select(
+        Conversation.conversation_id,
+        Conversation.subject,
+        Conversation.message_count,
+        Conversation.latest_email_id,
+        Conversation.last_message_at,
+        Conversation.participants,
+        Conversation.preview_text,
+        Conversation.classification,
+        Conversation.unread_count,
+        Conversation.is_flagged,
+        EmailAccount.email_address,
+    ).join(
+        EmailAccount, Conversation.email_account_id == EmailAccount.id
+    ).where(EmailAccount.user_id == user_id)
+    if account_id is not None:
+        stmt = stmt.where(Conversation.email_account_id == account_id)
+    if after is not None:
+        stmt = stmt.where(after_key(Conversation.last_message_at, Conversation.latest_email_id, after))
+    stmt = stmt.order_by(Conversation.last_message_at.desc(), Conversation.latest_email_id.desc()).limit(limit)
+
+    return [
+        {
+            "conversation_id": row.conversation_id,
+            "subject": row.subject,
+            "message_count": row.message_count,
+            "most_recent_email_id": row.latest_email_id,
+            "most_recent_date": row.last_message_at,
+            "participants": row.participants or [],
+            "preview_text": row.preview_text,
+            "classification": row.classification,
+            "account_email": row.email_address,
+            "unread_count": row.unread_count,
+            "is_flagged": row.is_flagged,
+        }
+        for row in db.execute(stmt)
+    ]
@@ -0,0 +1,79 @@
+"""
+Keyset Pagination
+
+List endpoints page through their rows by position in the sort order, not
+by OFFSET: a cursor carries the sort key of the last row returned and the
+next page starts strictly after it. Every page is an index range scan of
+`limit` rows, however deep into the list it is.
+
+- GET /emails/               (received_at, id) newest first
+- GET /emails/conversations  (last_message_at, latest_email_id) newest first
+
+Every response is one page: ?limit=N rows (API_PAGE_SIZE by default,
+capped at API_MAX_PAGE_SIZE), then ?cursor=... for the following pages.
+The response body stays a plain list; when more rows follow, the opaque
+cursor of the next page is sent in the X-Next-Cursor header. Without
+?limit and ?cursor the response is still only the first page: clients that
+need the whole list follow the header until it is absent.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from core.config import settings
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# (sort date, id) of the last row of a page; the date is None for rows without one
+CursorKey = Tuple[Optional[datetime], int]
+
+
+def encode_cursor(key: CursorKey) -> str:
+    date, row_id = key
+    payload = json.dumps([date.isoformat() if date else None, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> CursorKey:
+    """
+    Sort key carried by a cursor from encode_cursor().
+
+    Raises:
+        HTTPException: 400 for a malformed cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(date) if date is not None else None), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Rows per page for ?limit (API_PAGE_SIZE when omitted, at most API_MAX_PAGE_SIZE)."""
+    return min(limit or settings.API_PAGE_SIZE, settings.API_MAX_PAGE_SIZE)
+
+
+def after_key(date_column: Any, id_column: Any, key: CursorKey) -> Any:
+    """
+    Rows after `key` in (date DESC NULLS LAST, id DESC) order, as a range the composite index can seek.
+
+    A dated key only matches dated rows (callers list undated rows separately);
+    an undated key matches the undated rows after its id.
+    """
+    date, row_id = key
+    if date is None:
+        return date_column.is_(None) & (id_column < row_id)
+    return (date_column < date) | ((date_column == date) & (id_column < row_id))
+
+
+def split_page(rows: List[Any], size: int) -> Tuple[List[Any], bool]:
+    """(rows of the page, whether more follow) from a query run with LIMIT size + 1."""
+    if len(rows) <= size:
+        return rows, False
+    return rows[:size], True
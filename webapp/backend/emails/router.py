@@ -5,13 +5,15 @@ Router (API Layer)
 '''
 
 from typing import Annotated
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import inspect
 from db.database import get_db, engine, Base
 
 from entities.email import Email, EmailClassification # SQLAlchemy model
 from emails.schemas import EmailResponse, EmailClassificationResponse, ConversationGroupResponse  # Pydantic Schema
+from emails.conversations import conversation_key, list_conversation_summaries, refresh_conversations
+from emails.pagination import NEXT_CURSOR_HEADER, after_key, decode_cursor, encode_cursor, page_size, split_page
 
 from email_mock import MOCK_EMAILS
 import os
@@ -32,12 +34,11 @@ from core.outlook import OutlookClient, transform_graph_message_to_email_record
 from dotenv import load_dotenv
 
 # ---
-from emails.service import upsert_email, bulk_delete_by_ids
-from entities.delta_token import DeltaToken
-
-# ---
-from dateutil import parser
-import httpx
+from sync.service import sync_account, sync_user_accounts
+from sync.state import sync_account_state
+from sync.coordinator import SyncInProgressError
+from core.graph_client import GraphThrottledError
+from sync.hydrator import hydrate_email_bodies
 
 
 # Auth imports
@@ -54,20 +55,28 @@ router = APIRouter(prefix="/emails", tags=["Emails"])
 # 1. When the first time /emails/ is hit:
 # 	•	SQLAlchemy checks if the table exists → creates it if not.
 # 	•	Checks if the table has data → populates it from MOCK_EMAILS if empty.  -- DEPRECATED
-# 2. Returns all emails from the database.
+# 2. Returns the user's emails from the database, newest first, one keyset page at a time (?limit / ?cursor).
 # 3. Subsequent calls just query the database.
 @router.get("/", response_model=list[EmailResponse])
 def list_emails(
     current_user: CurrentUser,
+    response: Response,
     account_id: str = Query(None, description="Optional email account ID to filter by"),
+    limit: int = Query(None, ge=1, description="Page size (default API_PAGE_SIZE, capped at API_MAX_PAGE_SIZE)"),
+    cursor: str = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db)
 ):
     """
     List emails for the current user, optionally filtered by account.
     
+    Ordered by (received_at, id), newest first; emails without received_at come last.
+    Returns one page and sets X-Next-Cursor when more follow (see emails.pagination).
+    
     Args:
         current_user: Authenticated user (from JWT)
         account_id: Optional UUID of email account to filter by
+        limit: Optional page size (default API_PAGE_SIZE, capped at API_MAX_PAGE_SIZE)
+        cursor: Optional cursor of the page to return
         db: Database session
         
     Returns:
@@ -93,9 +102,27 @@ def list_emails(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid account_id format")
     
-    # Order by created_at descending (newest first)
-    emails = query.order_by(Email.created_at.desc()).all()
-
+    size = page_size(limit)
+    after = decode_cursor(cursor) if cursor else None
+    fetch = size + 1
+
+    # Two index ranges, so each stays a plain (received_at, id) seek:
+    # dated emails newest first, then the undated ones by id
+    emails = []
+    if after is None or after[0] is not None:
+        dated = query.filter(Email.received_at.isnot(None))
+        if after is not None:
+            dated = dated.filter(after_key(Email.received_at, Email.id, after))
+        emails = dated.order_by(Email.received_at.desc(), Email.id.desc()).limit(fetch).all()
+    if len(emails) < fetch:
+        undated = query.filter(Email.received_at.is_(None))
+        if after is not None and after[0] is None:
+            undated = undated.filter(after_key(Email.received_at, Email.id, after))
+        emails += undated.order_by(Email.id.desc()).limit(fetch - len(emails)).all()
+
+    emails, has_more = split_page(emails, size)
+    if has_more:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor((emails[-1].received_at, emails[-1].id))
     return emails
 
 
@@ -106,7 +133,10 @@ def list_emails(
 @router.get("/conversations", response_model=list[ConversationGroupResponse])
 def list_conversations(
     current_user: CurrentUser,
+    response: Response,
     account_id: str = Query(None, description="Optional email account ID to filter by"),
+    limit: int = Query(None, ge=1, description="Page size (default API_PAGE_SIZE, capped at API_MAX_PAGE_SIZE)"),
+    cursor: str = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db)
 ):
     """
@@ -114,103 +144,41 @@ def list_conversations(
     
     Groups emails by their conversation_id and returns aggregated metadata for each conversation.
     Emails without a conversation_id are treated as individual conversations.
+    Reads the Conversation summary table (kept up to date on every email write, see
+    emails.conversations): one indexed query, no email rows loaded.
+    Returns one page and sets X-Next-Cursor when more follow (see emails.pagination).
     
     Args:
         current_user: Authenticated user (from JWT)
         account_id: Optional UUID of email account to filter by
+        limit: Optional page size (default API_PAGE_SIZE, capped at API_MAX_PAGE_SIZE)
+        cursor: Optional cursor of the page to return
         db: Database session
         
     Returns:
-        List of conversation groups with metadata (subject, participants, message count, etc.)
+        List of conversation groups with metadata (subject, participants, message count, etc.),
+        newest first
     """
     from uuid import UUID
-    from collections import defaultdict
-    from entities.email_account import EmailAccount
-    
-    # Start with base query - JOIN with EmailAccount to filter by user
-    query = db.query(Email).join(
-        EmailAccount,
-        Email.email_account_id == EmailAccount.id
-    ).filter(
-        EmailAccount.user_id == current_user.get_uuid()
-    )
     
-    # Apply account filter if provided
+    account_uuid = None
     if account_id:
         try:
             account_uuid = UUID(account_id)
-            # Verify account belongs to user (implicit via join + user filter)
-            query = query.filter(Email.email_account_id == account_uuid)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid account_id format")
     
-    # Get all emails (now filtered by user)
-    emails = query.all()
-    
-    # Group emails by conversation_id
-    conversations = defaultdict(list)
-    for email in emails:
-        # Use conversation_id if available, otherwise use email.id as unique key
-        conv_key = email.conversation_id if email.conversation_id else f"single_{email.id}"
-        conversations[conv_key].append(email)
-    
-    # Build response for each conversation
-    result = []
-    for conv_id, conv_emails in conversations.items():
-        # Sort by received_at or created_at (most recent first)
-        conv_emails.sort(
-            key=lambda e: e.received_at or e.created_at,
-            reverse=True
-        )
-        
-        ## Get the most recent email
-        most_recent = conv_emails[0]
-
-        ## Get the email account - all emails in a conversation belong to the same account
-        ## Use the first email that has an account (should be all of them, but this is defensive)
-        account_email = "Unknown"
-        for email in conv_emails:
-            if email.email_account:
-                account_email = email.email_account.email_address
-                break
-        
-        # Collect unique participants (from author and to fields)
-        participants = set()
-        for email in conv_emails:
-            participants.add(email.author)
-            # Parse 'to' field which may contain multiple comma-separated addresses
-            if email.to:
-                to_addresses = [addr.strip() for addr in email.to.split(',')]
-                participants.update(to_addresses)
-        
-        # Get classification if available
-        classification = None
-        if most_recent.classifications:
-            # Get the most recent classification
-            latest_classification = max(
-                most_recent.classifications,
-                key=lambda c: c.created_at
-            )
-            classification = latest_classification.classification
-        
-        # Build conversation group response
-        conversation_group = ConversationGroupResponse(
-            conversation_id=most_recent.conversation_id,
-            subject=most_recent.subject,
-            message_count=len(conv_emails),
-            most_recent_email_id=most_recent.id,
-            most_recent_date=most_recent.received_at or most_recent.created_at,
-            participants=list(participants),
-            preview_text=most_recent.email_thread_text,
-            classification=classification,
-            account_email=account_email
-        )
-        result.append(conversation_group)
-    
-    # Sort by most recent date (newest first)
-    result.sort(key=lambda c: c.most_recent_date, reverse=True)
-    
-    return result
+    size = page_size(limit)
+    groups = list_conversation_summaries(
+        db, current_user.get_uuid(), account_uuid,
+        limit=size + 1,
+        after=decode_cursor(cursor) if cursor else None,
+    )
+    groups, has_more = split_page(groups, size)
+    if has_more:
+        last = groups[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor((last["most_recent_date"], last["most_recent_email_id"]))
+    return [ConversationGroupResponse(**group) for group in groups]
 
 
 
@@ -227,8 +195,34 @@ def list_conversations(
 #         raise HTTPException(status_code=404, detail="Email not found")
 #     return email
 
+def _get_user_email(db: Session, email_id: int, user_id) -> Email:
+    """The email if it belongs to one of the user's accounts, else None."""
+    from entities.email_account import EmailAccount
+
+    return db.query(Email).join(
+        EmailAccount,
+        Email.email_account_id == EmailAccount.id
+    ).filter(
+        Email.id == email_id,
+        EmailAccount.user_id == user_id
+    ).first()
+
+
+def _get_user_thread(db: Session, conversation_id: str, user_id) -> list[Email]:
+    """The user's emails of one conversation, oldest first."""
+    from entities.email_account import EmailAccount
+
+    return db.query(Email).join(
+        EmailAccount,
+        Email.email_account_id == EmailAccount.id
+    ).filter(
+        Email.conversation_id == conversation_id,
+        EmailAccount.user_id == user_id
+    ).order_by(Email.received_at.asc()).all()
+
+
 @router.get("/{email_id}", response_model=EmailResponse)
-def get_email(
+async def get_email(
     email_id: int,
     current_user: CurrentUser,
     db: Session = Depends(get_db)
@@ -237,6 +231,7 @@ def get_email(
     Get a specific email by ID.
     
     Verifies that the email belongs to one of the current user's accounts.
+    The body is fetched from Graph first if the metadata-only sync hasn't hydrated it yet.
     
     Args:
         email_id: ID of the email to retrieve
@@ -246,24 +241,19 @@ def get_email(
     Returns:
         Email details
     """
-    from entities.email_account import EmailAccount
-    
-    # Query email with JOIN to verify ownership
-    email = db.query(Email).join(
-        EmailAccount,
-        Email.email_account_id == EmailAccount.id
-    ).filter(
-        Email.id == email_id,
-        EmailAccount.user_id == current_user.get_uuid()
-    ).first()
+    # Query email with JOIN to verify ownership (sync session: in the threadpool)
+    email = await run_in_threadpool(_get_user_email, db, email_id, current_user.get_uuid())
     
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
+
+    # Lazy body hydration (metadata-first sync)
+    await hydrate_email_bodies(db, [email])
     return email
 
 
 @router.get("/{email_id}/thread", response_model=list[EmailResponse])
-def get_email_thread(
+async def get_email_thread(
     email_id: int,
     current_user: CurrentUser,
     db: Session = Depends(get_db)
@@ -283,33 +273,24 @@ def get_email_thread(
     Returns:
         List of emails in the conversation thread
     """
-    from entities.email_account import EmailAccount
-    
-    # 1. Get the email from DB and verify ownership
-    email = db.query(Email).join(
-        EmailAccount,
-        Email.email_account_id == EmailAccount.id
-    ).filter(
-        Email.id == email_id,
-        EmailAccount.user_id == current_user.get_uuid()
-    ).first()
+    # 1. Get the email from DB and verify ownership (sync session: in the threadpool)
+    email = await run_in_threadpool(_get_user_email, db, email_id, current_user.get_uuid())
     
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     
     # 2. If no conversation_id, return just this email
     if not email.conversation_id:
+        await hydrate_email_bodies(db, [email])
         return [email]
     
     # 3. Fetch all messages with same conversation_id (filtered by user)
-    thread_messages = db.query(Email).join(
-        EmailAccount,
-        Email.email_account_id == EmailAccount.id
-    ).filter(
-        Email.conversation_id == email.conversation_id,
-        EmailAccount.user_id == current_user.get_uuid()
-    ).order_by(Email.received_at.asc()).all()
-    
+    thread_messages = await run_in_threadpool(
+        _get_user_thread, db, email.conversation_id, current_user.get_uuid()
+    )
+
+    # Lazy body hydration (metadata-first sync): one $batch for the whole thread
+    await hydrate_email_bodies(db, thread_messages)
     return thread_messages
 
 
@@ -403,6 +384,8 @@ async def classify_email_stream(email_id: int, db: Session = Depends(get_db)):
                     ai_draft=classification_data.get("ai_draft")
                 )
                 db.add(new_classification)
+                db.flush()
+                refresh_conversations(db, [conversation_key(email.email_account_id, email.conversation_id, email.id)])
                 db.commit()
                 print(f"✅ Stored classification for email {email_id}")
         
@@ -727,7 +710,8 @@ async def classify_email_stream(email_id: int, db: Session = Depends(get_db)):
 async def sync_outlook(
     account_id: str,
     current_user: Annotated[schemas.TokenData, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    state_only: bool = Query(False, description="Only refresh read / flag / importance / categories"),
 ):
     """
     Sync emails from a specific Outlook account using delta sync.
@@ -742,6 +726,7 @@ async def sync_outlook(
         account_id: UUID of the email account to sync
         current_user: Authenticated user (from JWT)
         db: Database session
+        state_only: run only the narrow state delta (no message content is fetched)
     
     Returns:
         Sync statistics (inserted, updated, deleted counts)
@@ -749,7 +734,7 @@ async def sync_outlook(
     from uuid import UUID
     from datetime import datetime, timezone, timedelta
     from entities.email_account import ProviderEnum
-    from email_accounts.service import get_email_account, get_decrypted_refresh_token, refresh_access_token, encrypt_token
+    from email_accounts.service import get_email_account, get_decrypted_refresh_token, access_token_cache
     
     # Convert account_id to UUID
     try:
@@ -769,130 +754,64 @@ async def sync_outlook(
     if not refresh_token:
         raise HTTPException(400, "No refresh token found for this account")
     
-    # 3. Get fresh access token (always refresh to be safe)
-    # Note: We always refresh because it's safer and Microsoft handles caching
-    access_token, new_refresh_token, new_expires_at = refresh_access_token(
-        account.ms_refresh_token_encrypted
-    )
-    
-    # Update token expiration in database
-    account.access_token_expires_at = new_expires_at
-    if new_refresh_token:
-        # Microsoft returned a new refresh token, update it
-            account.ms_refresh_token_encrypted = encrypt_token(new_refresh_token)
-    db.commit()
-    
-    # 4. Sync both Inbox and SentItems folders for complete conversation threads
-    
-    folders_to_sync = [
-        ("inbox", "https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages/delta"),
-        ("sentitems", "https://graph.microsoft.com/v1.0/me/mailFolders/sentitems/messages/delta")
-    ]
-    
-    total_inserted = 0
-    total_updated = 0
-    total_deleted = 0
-    
-    for folder_name, base_delta_url in folders_to_sync:
-        # Load or create delta token for this folder
-        token_row = db.query(DeltaToken).filter(
-            DeltaToken.email_account_id == account_uuid,
-            DeltaToken.folder == folder_name
-        ).first()
-        
-        if token_row is None:
-            token_row = DeltaToken(
-                email_account_id=account_uuid,
-                folder=folder_name,
-                delta_token=None
-            )
-            db.add(token_row)
-            db.commit()
-            db.refresh(token_row)
-        
-        # Build delta URL (use stored token if available)
-        delta_url = token_row.delta_token if token_row.delta_token else base_delta_url
-        
-        all_changes = []
-        new_delta_link = None
-        
-        # Perform delta sync for this folder
-        try:
-            with httpx.Client(timeout=60.0) as client:
-                next_url = delta_url
-                
-                while next_url:
-                    headers = {
-                        "Authorization": f"Bearer {access_token}",
-                        "Accept": "application/json"
-                    }
-                    
-                    resp = client.get(next_url, headers=headers)
-                    
-                    if resp.status_code != 200:
-                        raise HTTPException(500, f"Microsoft Graph API error for {folder_name}: {resp.text}")
-                    
-                    data = resp.json()
-                    all_changes.extend(data.get("value", []))
-                    
-                    # Check for next page or delta link
-                    next_url = data.get("@odata.nextLink")
-                    
-                    if data.get("@odata.deltaLink"):
-                        new_delta_link = data["@odata.deltaLink"]
-                        break
-        except Exception as e:
-            raise HTTPException(500, f"Delta sync failed for {folder_name}: {str(e)}")
-        
-        # Process changes for this folder
-        inserted = 0
-        updated = 0
-        deleted_ids = []
-        
-        for item in all_changes:
-            # Handle deleted messages
-            if "@removed" in item:
-                deleted_ids.append(item["id"])
-                continue
-            
-            # Parse received datetime
-            received_str = item.get("receivedDateTime")
-            received_dt = parser.isoparse(received_str) if received_str else None
-            item["received_at"] = received_dt
-            
-            # Check if email exists
-            existing = db.query(Email).filter(Email.message_id == item["id"]).first()
-            if existing:
-                updated += 1
-            else:
-                inserted += 1
-            
-            # Upsert with email_account_id
-            upsert_email(db, item, email_account_id=account_uuid)
-        
-        # Bulk delete removed emails
-        deleted = bulk_delete_by_ids(db, deleted_ids) if deleted_ids else 0
-        
-        # Update delta token for this folder
-        if new_delta_link:
-            token_row.delta_token = new_delta_link
-        
-        # Accumulate statistics
-        total_inserted += inserted
-        total_updated += updated
-        total_deleted += deleted
-    
-    # Commit all changes atomically
-    db.commit()
+    # 3. Get a valid access token
+    ## Served from the in-process cache until shortly before expiry;
+    ## concurrent syncs of the same account share a single MSAL refresh
+    try:
+        access_token = await access_token_cache.get(account_uuid)
+    except Exception as e:
+        raise HTTPException(500, f"Failed to refresh access token: {e}")
+    
+    # 4. Sync every discovered folder that is due (inbox first) concurrently
+    ## sync_account awaits Graph on the shared AsyncClient, so other requests
+    ## (SSE streams included) keep being served while the mailbox syncs
+    ## A second click / tab joins the sync already running for this account
+    try:
+        if state_only:
+            stats = await sync_account_state(account_uuid, access_token)
+        else:
+            stats = await sync_account(account_uuid, access_token)
+    except SyncInProgressError as e:
+        ## Another process (API node or sync worker) is syncing this account right now;
+        ## its run is not joined across processes: the client retries once it finishes
+        raise HTTPException(409, str(e))
+    except Exception as e:
+        ## Still throttled after the transport's retries -> tell the client when to come back
+        if isinstance(e.__cause__, GraphThrottledError):
+            retry_after = int(e.__cause__.retry_after or 30)
+            raise HTTPException(503, str(e), headers={"Retry-After": str(retry_after)})
+        raise HTTPException(500, str(e))
     
     # Return statistics
     return {
         "status": "ok",
         "account_id": str(account_uuid),
         "email_address": account.email_address,
-        "inserted": total_inserted,
-        "updated": total_updated,
-        "deleted": total_deleted,
-        "folders_synced": ["inbox", "sentitems"],
+        "inserted": stats["inserted"],
+        "updated": stats["updated"],
+        "deleted": stats["deleted"],
+        "folders_synced": stats["folders_synced"],
         "new_delta_token_saved": True,
     }
+
+
+@router.post("/sync_outlook_all")
+async def sync_outlook_all(current_user: CurrentUser):
+    """
+    Sync every connected Outlook account of the current user concurrently.
+
+    Streams Server-Sent Events as accounts progress (see sync.service.sync_user_accounts):
+    - "start" with the list of accounts
+    - "account_started" / "folder_synced" / "account_complete" / "account_error" per account
+    - "complete" with totals
+
+    The refresh takes about as long as the slowest account, not the sum of all of them.
+    """
+    async def event_generator():
+        async for event in sync_user_accounts(current_user.get_uuid()):
+            yield {
+                "event": event["event"],
+                "data": json.dumps(event["data"])
+            }
+
+    return EventSourceResponse(event_generator())
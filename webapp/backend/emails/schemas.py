@@ -54,6 +54,12 @@ class EmailResponse(BaseModel):
     message_id: Optional[str]
     conversation_id: Optional[str]
 
+    # Mailbox state (None until the message was synced with it)
+    is_read: Optional[bool] = None
+    is_flagged: Optional[bool] = None
+    importance: Optional[str] = None
+    categories: Optional[List[str]] = None
+
     class Config:
         orm_mode = True
 
@@ -80,6 +86,8 @@ class ConversationGroupResponse(BaseModel):
     preview_text: Optional[str]
     classification: Optional[Literal["ignore", "respond", "notify"]] = None
     account_email: str  # Email account this conversation belongs to
+    unread_count: int = 0  # Messages not read yet
+    is_flagged: bool = False  # Any message flagged
     
     class Config:
         orm_mode = True
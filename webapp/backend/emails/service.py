@@ -3,9 +3,11 @@
 ## SERVICES
 ## backend/services/email_ingest.py
 
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 from entities.email import Email
-from typing import Iterable
+from emails.conversations import conversation_key, conversation_keys, refresh_conversations
+from typing import Dict, Iterable, Optional, Tuple
 from dateutil import parser
 from datetime import datetime
 import logging
@@ -17,7 +19,98 @@ logger = logging.getLogger(__name__)
 # - Insert if message doesn't exist
 # - Update if message already exists
 
-def upsert_email(db: Session, outlook_msg: dict, email_account_id=None) -> Email:
+# Columns rewritten when an existing message is upserted again
+## (email_account_id / message_id identify the row and are never overwritten)
+UPSERT_UPDATE_COLUMNS = (
+    "author",
+    "to",
+    "subject",
+    "conversation_id",
+    "received_at",
+    "email_thread_text",
+    "email_thread_html",
+    "created_at",
+    "change_key",
+    "is_read",
+    "is_flagged",
+    "importance",
+    "categories",
+)
+
+# Columns a payload may leave out ($select): missing (None) keeps the stored value
+## email_thread_html is handled apart: a body-less payload keeps the stored body only
+## while the changeKey is unchanged, otherwise the body is cleared for sync.hydrator
+PRESERVED_WHEN_MISSING = (
+    "is_read",
+    "is_flagged",
+    "importance",
+    "categories",
+)
+
+# Rows per statement in the bulk path
+## Keeps multi-row INSERTs / IN lists well under SQLite's bound-parameter limit
+BULK_UPSERT_CHUNK_SIZE = 500
+
+
+def state_values_from_graph(outlook_msg: dict) -> dict:
+    """
+    Map the mailbox-state fields of a Graph message (read / flag / importance / categories).
+
+    Fields missing from the payload map to None (= leave the column alone).
+    """
+    flag = outlook_msg.get("flag")
+    return {
+        "is_read": outlook_msg.get("isRead"),
+        "is_flagged": flag.get("flagStatus") == "flagged" if flag else None,
+        "importance": outlook_msg.get("importance"),
+        "categories": outlook_msg.get("categories"),
+    }
+
+
+def email_values_from_graph(outlook_msg: dict) -> dict:
+    """
+    Map & normalize a Microsoft Graph message into Email column values.
+
+    Shared by upsert_email (ORM, one row) and bulk_upsert_emails (Core, one page).
+    """
+    sender = outlook_msg.get("from", {}).get("emailAddress", {}).get("address")
+    to = ", ".join(
+        [t["emailAddress"]["address"] for t in outlook_msg.get("toRecipients", [])]
+    )
+
+    # Ensure received_at is a datetime
+    received_dt = outlook_msg.get("received_at")
+    if not isinstance(received_dt, datetime):
+        received_str = outlook_msg.get("receivedDateTime")
+        if received_str:
+            received_dt = parser.isoparse(received_str)
+        else:
+            received_dt = None
+
+    # Outlook timestamp → stored in created_at (must be datetime)
+    created_dt = outlook_msg.get("created_at") or outlook_msg.get("receivedDateTime")
+    if not isinstance(created_dt, datetime) and created_dt:
+        created_dt = parser.isoparse(created_dt)
+
+    return {
+        "author": sender or "unknown",
+        "to": to or "",
+        "subject": outlook_msg.get("subject", ""),
+        # Conversation ID for threading
+        "conversation_id": outlook_msg.get("conversationId"),
+        "received_at": received_dt,
+        # Text fallback logic
+        "email_thread_text": outlook_msg.get("bodyPreview", ""),
+        # Full HTML (None = not hydrated yet: metadata-only sync doesn't $select body)
+        "email_thread_html": outlook_msg["body"].get("content", "") if "body" in outlook_msg else None,
+        "created_at": created_dt,
+        # Version stamp: an unchanged changeKey means nothing to rewrite
+        "change_key": outlook_msg.get("changeKey"),
+        **state_values_from_graph(outlook_msg),
+    }
+
+
+def upsert_email(db: Session, outlook_msg: dict, email_account_id=None, folder: Optional[str] = None) -> Email:
     """
     Insert or update an Email record based on Microsoft Graph message JSON.
 
@@ -27,12 +120,16 @@ def upsert_email(db: Session, outlook_msg: dict, email_account_id=None) -> Email
         db: Database session
         outlook_msg: Message data from Microsoft Graph
         email_account_id: Optional UUID of the email account this email belongs to
+        folder: Optional folder the message was synced from
     """
 
     message_id = outlook_msg["id"]
 
     # Lookup existing record
     email = db.query(Email).filter(Email.message_id == message_id).first()
+    touched = set()
+    if email is not None:
+        touched.add(conversation_key(email.email_account_id, email.conversation_id, email.id))
 
     # Create new record if not found
     if email is None:
@@ -45,41 +142,124 @@ def upsert_email(db: Session, outlook_msg: dict, email_account_id=None) -> Email
     # -----------------------------
     # Map & normalize fields
     # -----------------------------
-    sender = outlook_msg.get("from", {}).get("emailAddress", {}).get("address")
-    to = ", ".join(
-        [t["emailAddress"]["address"] for t in outlook_msg.get("toRecipients", [])]
-    )
+    values = email_values_from_graph(outlook_msg)
+    if values["email_thread_html"] is None and values["change_key"] == email.change_key:
+        # Same version, body just not $selected: keep the hydrated one
+        del values["email_thread_html"]
+    for column, value in values.items():
+        # A narrower payload must not wipe stored state
+        if column in PRESERVED_WHEN_MISSING and value is None:
+            continue
+        setattr(email, column, value)
+    if folder is not None:
+        email.folder = folder
 
-    email.author = sender or "unknown"
-    email.to = to or ""
-    email.subject = outlook_msg.get("subject", "")
-    
-    # Conversation ID for threading
-    email.conversation_id = outlook_msg.get("conversationId")
+    # Keep the conversation summaries in step (old one too, should the conversation change)
+    db.flush()
+    touched.add(conversation_key(email.email_account_id, email.conversation_id, email.id))
+    refresh_conversations(db, touched)
 
-    # Ensure received_at is a datetime
-    received_dt = outlook_msg.get("received_at")
-    if not isinstance(received_dt, datetime):
-        received_str = outlook_msg.get("receivedDateTime")
-        if received_str:
-            received_dt = parser.isoparse(received_str)
-        else:
-            received_dt = None
-    email.received_at = received_dt
+    return email
 
-    # Text fallback logic
-    email.email_thread_text = outlook_msg.get("bodyPreview", "")
 
-    # Full HTML
-    email.email_thread_html = outlook_msg.get("body", {}).get("content", "")
+def _chunks(items: list, size: int = BULK_UPSERT_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
-    # Outlook timestamp → stored in created_at (must be datetime)
-    created_dt = outlook_msg.get("created_at") or outlook_msg.get("receivedDateTime")
-    if not isinstance(created_dt, datetime) and created_dt:
-        created_dt = parser.isoparse(created_dt)
-    email.created_at = created_dt
 
-    return email
+def bulk_upsert_emails(
+    db: Session,
+    outlook_msgs: Iterable[dict],
+    email_account_id=None,
+    folder: Optional[str] = None,
+) -> Tuple[int, int]:
+    """
+    Upsert a whole page of Graph messages with set-based SQL.
+
+    - One `SELECT message_id, change_key, folder ... WHERE message_id IN (...)` resolves which rows exist
+    - Rows whose stored changeKey (and folder, when given) equal the incoming
+      ones are skipped (Graph re-sends unchanged messages, e.g. on a delta
+      baseline after a bulk load)
+    - Rows are written with the dialect-native
+      `INSERT ... ON CONFLICT (message_id) DO UPDATE` (PostgreSQL and SQLite)
+    - Other dialects fall back to the per-row ORM upsert_email
+    - Summaries of the conversations written to are refreshed (emails.conversations)
+
+    Duplicate ids inside the page collapse to the last occurrence (Graph order).
+    Does not commit.
+
+    Returns:
+        (inserted, updated) - unchanged rows count as neither
+    """
+    rows: Dict[str, dict] = {}
+    for msg in outlook_msgs:
+        rows[msg["id"]] = msg
+    if not rows:
+        return 0, 0
+
+    existing: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for chunk in _chunks(list(rows)):
+        for message_id, change_key, stored_folder in db.execute(
+            select(Email.message_id, Email.change_key, Email.folder).where(Email.message_id.in_(chunk))
+        ):
+            existing[message_id] = (change_key, stored_folder)
+
+    # Drop rows Graph reports with the changeKey we already stored
+    for message_id, (change_key, stored_folder) in existing.items():
+        incoming = rows[message_id].get("changeKey")
+        if incoming is not None and incoming == change_key and folder in (None, stored_folder):
+            del rows[message_id]
+    if not rows:
+        return 0, 0
+
+    inserted = sum(1 for message_id in rows if message_id not in existing)
+    updated = len(rows) - inserted
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for msg in rows.values():
+            upsert_email(db, msg, email_account_id=email_account_id, folder=folder)
+        db.flush()
+        return inserted, updated
+
+    values = [
+        {
+            "message_id": message_id,
+            "email_account_id": email_account_id,
+            "folder": folder,
+            **email_values_from_graph(msg),
+        }
+        for message_id, msg in rows.items()
+    ]
+
+    for chunk in _chunks(values):
+        stmt = insert(Email).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Email.message_id],
+            set_={
+                column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS
+            } | {
+                # Metadata-only pages carry no state for some columns: keep the stored one
+                column: func.coalesce(stmt.excluded[column], getattr(Email, column))
+                for column in PRESERVED_WHEN_MISSING + ("folder",)
+            } | {
+                # ...nor a body: the stored one is kept only if it is the same version
+                # (a new changeKey leaves NULL, which queues the row for sync.hydrator)
+                "email_thread_html": func.coalesce(
+                    stmt.excluded.email_thread_html,
+                    case((stmt.excluded.change_key == Email.change_key, Email.email_thread_html)),
+                ),
+            },
+        )
+        db.execute(stmt)
+        refresh_conversations(db, conversation_keys(db, Email.message_id.in_([row["message_id"] for row in chunk])))
+
+    logger.info("Bulk upserted %d emails (inserted=%d, updated=%d).", len(values), inserted, updated)
+    return inserted, updated
 
 
 def delete_email(db: Session, message_id: str, soft_delete: bool = False) -> bool:
@@ -105,7 +285,9 @@ def delete_email(db: Session, message_id: str, soft_delete: bool = False) -> boo
         logger.info("Soft-deleted email message_id=%s (id=%s)", message_id, email.id)
         return True
 
+    touched = conversation_key(email.email_account_id, email.conversation_id, email.id)
     db.query(Email).filter(Email.message_id == message_id).delete(synchronize_session=False)
+    refresh_conversations(db, [touched])
     logger.info("Hard-deleted email message_id=%s", message_id)
     return True
 
@@ -120,7 +302,8 @@ def bulk_delete_by_ids(db: Session, message_ids: Iterable[str], soft_delete: boo
     Efficiently delete many emails at once.
 
     - If soft_delete=True and model supports `is_deleted`, performs a single UPDATE.
-    - Otherwise performs a single bulk DELETE.
+    - Otherwise performs a single bulk DELETE, then refreshes the summaries
+      of the affected conversations (emails.conversations).
 
     Returns:
         Number of rows affected (int).
@@ -136,7 +319,9 @@ def bulk_delete_by_ids(db: Session, message_ids: Iterable[str], soft_delete: boo
         logger.info("Soft-deleted %d emails (bulk).", updated_count)
         return updated_count
 
+    touched = conversation_keys(db, Email.message_id.in_(ids))
     deleted_count = db.query(Email).filter(Email.message_id.in_(ids)).delete(synchronize_session=False)
+    refresh_conversations(db, touched)
     logger.info("Hard-deleted %d emails (bulk).", deleted_count)
     return deleted_count
 
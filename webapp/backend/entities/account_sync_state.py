@@ -0,0 +1,39 @@
+'''
+Adaptive sync cadence of one EmailAccount (see sync/cadence.py).
+
+The arrival rate is kept as an exponentially decayed change counter:
+every incremental sync adds the changes it saw, and the counter decays
+with time constant SYNC_RATE_TIME_CONSTANT_SECONDS, so
+arrival_score / time constant is the recent changes-per-second rate.
+'''
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, String
+from sqlalchemy.dialects.postgresql import UUID
+from db.database import Base
+
+
+class AccountSyncState(Base):
+    __tablename__ = "account_sync_states"
+
+    email_account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("email_accounts.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    # Decayed change counter and when it was last decayed / incremented
+    arrival_score = Column(Float, nullable=False, default=0.0)
+    score_updated_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Schedule chosen after the last scheduled sync (survives restarts)
+    interval_seconds = Column(Float, nullable=True)
+    next_sync_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Lease of a sync worker (sync_worker.py) on this account; expired = free to claim
+    ## Renewed by the owner's heartbeat, so a dead worker's accounts fail over after one lease
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+    # A run asked for by the API (notification, manual sync, new account) while workers own syncing
+    ## Cleared when a worker claims the account; still set when that run ends = run again right away
+    requested_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,54 @@
+'''
+Conversation summary of one EmailAccount (see emails/conversations.py).
+
+One row per conversation, kept up to date by the email write paths
+(upsert, delete, state sync, classification) instead of being rebuilt from
+the emails on every GET /emails/conversations.
+
+conversation_key is the Graph conversationId, or "single_<email id>" for
+an email without one.
+'''
+
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from db.database import Base
+
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("email_account_id", "conversation_key", name="uq_conversations_account_key"),
+        ## Newest-first keyset pages of an account (emails.pagination)
+        Index("ix_conversations_account_recency", "email_account_id", "last_message_at", "latest_email_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    email_account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("email_accounts.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    conversation_key = Column(String, nullable=False)
+    conversation_id = Column(String, nullable=True)  # Graph conversationId (None for single emails)
+
+    # Latest message (no FK: the row is refreshed whenever that email changes or goes away)
+    latest_email_id = Column(Integer, nullable=False)
+    last_message_at = Column(DateTime, nullable=False)
+    subject = Column(String, nullable=False)
+    preview_text = Column(Text, nullable=True)
+    classification = Column(String, nullable=True)  # Latest classification of the latest message
+
+    # Aggregates over every message of the conversation
+    message_count = Column(Integer, nullable=False, default=0)
+    participants = Column(JSON, nullable=False, default=list)
+    unread_count = Column(Integer, nullable=False, default=0)
+    is_flagged = Column(Boolean, nullable=False, default=False)
+
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
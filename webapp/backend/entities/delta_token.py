@@ -2,7 +2,7 @@
 The delta token is always treated as its own independent persistence object.
 '''
 
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, DateTime, Integer, String, ForeignKey, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from db.database import Base  
@@ -17,6 +17,22 @@ class DeltaToken(Base):
     email_account_id = Column(UUID(as_uuid=True), ForeignKey('email_accounts.id'), nullable=False)
     folder = Column(String, index=True)  # e.g. "inbox"
     delta_token = Column(String, nullable=True)
+
+    # In-progress @odata.nextLink, checkpointed after every committed page.
+    ## A restarted sync resumes from here instead of re-enumerating from the base delta URL.
+    ## Cleared (None) once the folder reaches its @odata.deltaLink.
+    next_link = Column(String, nullable=True)
+
+    # deltaLink of the state channel (sync/state.py): narrow $select of read / flag state,
+    ## independent of delta_token so state changes never re-download message content
+    state_delta_token = Column(String, nullable=True)
+
+    # Folder discovery (sync/folders.py): one row per synced mail folder.
+    ## `folder` is the well-known name (inbox, sentitems, archive) or the Graph folder id
+    display_name = Column(String, nullable=True)
+    priority = Column(Integer, nullable=True)  # lower syncs first: 0 inbox ... 3 archive
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)  # last completed delta round
+    last_changed_at = Column(DateTime(timezone=True), nullable=True)  # last round that changed anything
     
     # Relationship back to EmailAccount
     email_account = relationship("EmailAccount", back_populates="delta_tokens")
\ No newline at end of file
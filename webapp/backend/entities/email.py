@@ -8,7 +8,7 @@
 These two belong together because they form a logical parent/child pair, are always used together, and are only separated by a relationship.
 '''
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime, timezone
 from db.database import Base
@@ -17,6 +17,12 @@ from sqlalchemy.orm import relationship
 
 class Email(Base):
     __tablename__ = "emails"
+    __table_args__ = (
+        ## Emails of one conversation (conversation summary refreshes, emails.conversations)
+        Index("ix_emails_account_conversation", "email_account_id", "conversation_id"),
+        ## Newest-first keyset pages of an account (emails.pagination)
+        Index("ix_emails_account_received", "email_account_id", "received_at", "id"),
+    )
     
     ## Integers id for high-volume internal data 
     id = Column(Integer, primary_key=True, index=True)
@@ -74,6 +80,15 @@ class Email(Base):
     received_at = Column(DateTime, nullable=True, index=True)  # When email was received in Outlook
     email_thread_text = Column(Text, nullable=True)   # Clean text for LLM + preview
     email_thread_html = Column(Text, nullable=True)   # Raw HTML for full viewer
+    change_key = Column(String, nullable=True)  # Graph changeKey: changes whenever the message does
+    folder = Column(String, nullable=True, index=True)  # Synced folder (inbox / sentitems); scopes a resync
+
+    ## Mailbox state (read / flag / importance / categories), kept fresh by the
+    ## narrow state delta in sync/state.py without touching the columns above
+    is_read = Column(Boolean, nullable=True)
+    is_flagged = Column(Boolean, nullable=True)
+    importance = Column(String, nullable=True)  # low / normal / high
+    categories = Column(JSON(none_as_null=True), nullable=True)  # Outlook category names
 
 
 ## Child model to Email
@@ -81,7 +96,7 @@ class EmailClassification(Base):
     __tablename__ = "email_classifications"
 
     id = Column(Integer, primary_key=True, index=True)
-    email_id = Column(Integer, ForeignKey("emails.id"), nullable=False)
+    email_id = Column(Integer, ForeignKey("emails.id"), nullable=False, index=True)
     classification = Column(String, nullable=True)
     reasoning = Column(Text, nullable=True)
     ai_draft = Column(Text, nullable=True)
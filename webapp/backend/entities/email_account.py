@@ -75,6 +75,14 @@ class EmailAccount(Base):
 
     ## Relationship ------------- ------------- ------------- -------------
 
+    # One EmailAccount → Many GraphSubscriptions (one per synced folder)
+    graph_subscriptions = relationship(
+        "GraphSubscription",
+        back_populates="email_account",
+        cascade="all, delete-orphan",
+    )
+
+
     # One EmailAccount → Many Emails
     emails = relationship(
         "Email",
@@ -0,0 +1,43 @@
+'''
+A Microsoft Graph change-notification subscription for one (EmailAccount, folder).
+
+Graph pushes a notification to our webhook whenever a message in the folder
+is created, updated or deleted; the webhook then runs a delta sync of that
+folder only. Subscriptions expire (< 3 days for Outlook messages) and are
+renewed by sync.subscriptions.
+'''
+
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from db.database import Base
+
+
+class GraphSubscription(Base):
+    __tablename__ = "graph_subscriptions"
+    __table_args__ = (
+        UniqueConstraint('email_account_id', 'folder', name='uq_subscription_account_folder'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey('email_accounts.id', ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    folder = Column(String, nullable=False)  # e.g. "inbox"
+
+    # Graph's subscription id (notifications carry it as subscriptionId)
+    subscription_id = Column(String, unique=True, nullable=False, index=True)
+
+    # Secret echoed back in every notification; proves the POST came from Graph
+    client_state = Column(String, nullable=False)
+
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    # Relationship back to EmailAccount
+    email_account = relationship("EmailAccount", back_populates="graph_subscriptions")
@@ -0,0 +1,52 @@
+'''
+One delta sync of one folder of one EmailAccount (telemetry).
+
+Written at the end of every sync_folder run, successful or not, so slow
+accounts and regressions show up in history instead of vanishing with the
+HTTP response.
+'''
+
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, String, DateTime, Float, BigInteger, Boolean, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from db.database import Base
+
+
+class SyncRun(Base):
+    __tablename__ = "sync_runs"
+    __table_args__ = (
+        # "latest runs of this account" / per-account stats windows
+        Index("ix_sync_runs_account_started", "email_account_id", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("email_accounts.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    folder = Column(String, nullable=False)
+
+    started_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+
+    # Volume
+    pages = Column(Integer, nullable=False, default=0)
+    graph_requests = Column(Integer, nullable=False, default=0)
+    bytes_downloaded = Column(BigInteger, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    resumed = Column(Boolean, nullable=False, default=False)
+
+    # Where the time went (Graph includes throttling waits; the two overlap thanks to prefetch)
+    graph_seconds = Column(Float, nullable=False, default=0.0)
+    db_seconds = Column(Float, nullable=False, default=0.0)
+    items_per_second = Column(Float, nullable=True)
+
+    # Outcome
+    status = Column(String, nullable=False, default="ok")  # "ok" | "error"
+    error_class = Column(String, nullable=True)  # e.g. "GraphThrottledError", "HTTPStatusError"
+    error_message = Column(String, nullable=True)
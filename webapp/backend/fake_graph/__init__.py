@@ -0,0 +1,14 @@
+"""
+Fake Microsoft Graph
+
+Local stand-in for the parts of Graph the sync path uses, for load tests
+and benchmarks without a Microsoft tenant.
+
+- generator.py  -> synthetic mailboxes scaled up from email_mock.MOCK_EMAILS
+- app.py        -> ASGI app serving messages/delta, $batch and message GETs
+- benchmark.py  -> messages/sec of POST /emails/sync_outlook at 1k / 10k / 100k
+
+Run standalone:
+    cd webapp/backend && uvicorn fake_graph.app:app --port 8001
+    GRAPH_BASE_URL=http://localhost:8001/v1.0 uvicorn main:app
+"""
@@ -0,0 +1,523 @@
+"""
+Fake Microsoft Graph ASGI app
+
+Serves the Graph endpoints the sync path calls, backed by an in-memory
+mailbox with a change log:
+
+- GET  /v1.0/me/mailFolders                            top-level folders (well-known + custom)
+- GET  /v1.0/me/mailFolders/{folder}[/childFolders]   one folder / its child folders
+- GET  /v1.0/me/mailFolders/{folder}/messages/delta   paging, deltaLinks, @removed tombstones, $select
+  (410 SyncStateNotFound for expired delta tokens, see FakeMailbox.expire_delta_tokens)
+- GET  /v1.0/me/mailFolders/{folder}/messages         list: receivedDateTime $filter / $orderby, $top, $skip
+- GET  /v1.0/me/messages/{id}                         single message ($select)
+- POST /v1.0/$batch                                   GET / PATCH sub-requests on messages, GET on folders
+- POST/PATCH/DELETE /v1.0/subscriptions               change-notification subscriptions
+  (the webhook is validated with ?validationToken=... like real Graph)
+- POST /_fake/messages/{folder}?count=N               test hook: add new mail and push notifications
+
+Knobs (create_app arguments): page size, per-request latency, and 429
+throttling on every Nth request (with Retry-After).
+
+In-process use (no sockets):
+    app = create_app(FakeMailbox.seeded(10_000))
+    graph_client._graph_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+
+Standalone:
+    FAKE_GRAPH_MESSAGES=10000 uvicorn fake_graph.app:app --port 8001
+"""
+
+import asyncio
+import bisect
+import itertools
+import os
+import re
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from fake_graph.generator import iter_messages
+
+
+# Fields every projection keeps (Graph always returns id)
+ALWAYS_SELECTED = ("id",)
+
+_MAXPAGESIZE_RE = re.compile(r"odata\.maxpagesize=(\d+)")
+_RESOURCE_FOLDER_RE = re.compile(r"mailFolders\('?([^')/]+)'?\)")
+_RECEIVED_FILTER_RE = re.compile(r"receivedDateTime\s+(ge|gt|le|lt)\s+([0-9T:\-.Z+]+)")
+
+# Well-known folders every mailbox has: name -> displayName
+WELL_KNOWN_FOLDERS = {
+    "inbox": "Inbox",
+    "sentitems": "Sent Items",
+    "drafts": "Drafts",
+    "deleteditems": "Deleted Items",
+    "junkemail": "Junk Email",
+    "outbox": "Outbox",
+    "archive": "Archive",
+}
+
+# Folder ids are this prefix + the folder's name (the API accepts both)
+FOLDER_ID_PREFIX = "AAMkFolder-"
+
+
+def project(msg: Dict[str, Any], select: Optional[List[str]]) -> Dict[str, Any]:
+    """Apply a $select projection to a message."""
+    if not select:
+        return dict(msg)
+    return {k: v for k, v in msg.items() if k in select or k in ALWAYS_SELECTED}
+
+
+def parse_select(value: Optional[str]) -> Optional[List[str]]:
+    return [field.strip() for field in value.split(",") if field.strip()] if value else None
+
+
+def _graph_timestamp(value: str) -> str:
+    """Normalize an OData datetime literal to the generator's fixed-width UTC format."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# ============================================================================
+# Mailbox state
+# ============================================================================
+
+class FakeMailbox:
+    """
+    In-memory mailbox: folder -> messages, plus a sequence-numbered change log.
+
+    A delta round started "since" sequence N returns every message changed
+    after N (current version, or an @removed tombstone if it is gone).
+    """
+
+    def __init__(self):
+        self.folders: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        # Folder tree: name -> (displayName, parent name or None for top level)
+        self.folder_tree: Dict[str, Tuple[str, Optional[str]]] = {
+            name: (display_name, None) for name, display_name in WELL_KNOWN_FOLDERS.items()
+        }
+        self.log: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        self.seq = 0
+        # Delta tokens issued before this sequence are expired (410)
+        self.min_delta_seq = 0
+        # Open delta rounds: cursor -> (folder, ids, select, end_seq)
+        self.cursors: Dict[str, Tuple[str, List[str], Optional[List[str]], int]] = {}
+        # Per folder: (seq it was built at, sorted receivedDateTime keys, messages in that order)
+        self._received_index: Dict[str, Tuple[int, List[str], List[Dict[str, Any]]]] = {}
+
+    @classmethod
+    def seeded(cls, count: int, folders: Iterable[str] = ("inbox",), seed: int = 0, mailbox: str = "mbx") -> "FakeMailbox":
+        """Mailbox with `count` synthetic messages in each folder."""
+        fake = cls()
+        for folder in folders:
+            fake.add_messages(folder, iter_messages(count, folder=folder, seed=seed, mailbox=mailbox))
+        return fake
+
+    # ------------------------------------------------------------
+    # Folders
+    # ------------------------------------------------------------
+    def add_folder(self, name: str, display_name: Optional[str] = None, parent: Optional[str] = None) -> str:
+        """Create a (child) folder; returns its id."""
+        self.folder_tree[name] = (display_name or name, parent)
+        return FOLDER_ID_PREFIX + name
+
+    def resolve_folder(self, key: str) -> str:
+        """Folder name for a folder id or well-known name."""
+        if key.startswith(FOLDER_ID_PREFIX):
+            return key[len(FOLDER_ID_PREFIX):]
+        return key.lower() if key.lower() in WELL_KNOWN_FOLDERS else key
+
+    def folder_resource(self, name: str) -> Optional[Dict[str, Any]]:
+        """Graph mailFolder JSON (None for unknown folders)."""
+        if name not in self.folder_tree:
+            return None
+        display_name, parent = self.folder_tree[name]
+        return {
+            "id": FOLDER_ID_PREFIX + name,
+            "displayName": display_name,
+            "parentFolderId": FOLDER_ID_PREFIX + parent if parent else "AAMkFolder-msgfolderroot",
+            "childFolderCount": len(self.child_folders(name)),
+            "totalItemCount": len(self.folders.get(name, ())),
+        }
+
+    def child_folders(self, parent: Optional[str]) -> List[str]:
+        return [name for name, (_, folder_parent) in self.folder_tree.items() if folder_parent == parent]
+
+    # ------------------------------------------------------------
+    # Mutations (each one is a delta change)
+    # ------------------------------------------------------------
+    def _record(self, folder: str, message_id: str) -> None:
+        self.seq += 1
+        self.log[folder].append((self.seq, message_id))
+
+    def add_messages(self, folder: str, messages: Iterable[Dict[str, Any]]) -> None:
+        self.folder_tree.setdefault(folder, (folder, None))
+        for msg in messages:
+            self.folders[folder][msg["id"]] = msg
+            self._record(folder, msg["id"])
+
+    def update_message(self, folder: str, message_id: str, **fields: Any) -> None:
+        msg = self.folders[folder][message_id]
+        msg.update(fields)
+        msg["changeKey"] = f"CQAA{uuid.uuid4().hex[:16]}"
+        self._record(folder, message_id)
+
+    def remove_message(self, folder: str, message_id: str) -> None:
+        self.folders[folder].pop(message_id, None)
+        self._record(folder, message_id)
+
+    def expire_delta_tokens(self) -> None:
+        """Forget the sync state behind every delta token issued so far."""
+        self.seq += 1
+        self.min_delta_seq = self.seq
+
+    def by_received(self, folder: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Messages of a folder sorted by receivedDateTime (rebuilt only after changes)."""
+        cached = self._received_index.get(folder)
+        if cached is None or cached[0] != self.seq:
+            messages = sorted(self.folders[folder].values(), key=lambda m: m["receivedDateTime"])
+            cached = (self.seq, [m["receivedDateTime"] for m in messages], messages)
+            self._received_index[folder] = cached
+        return cached[1], cached[2]
+
+    def folder_of(self, message_id: str) -> Optional[str]:
+        for folder, messages in self.folders.items():
+            if message_id in messages:
+                return folder
+        return None
+
+    def find(self, message_id: str) -> Optional[Dict[str, Any]]:
+        for messages in self.folders.values():
+            if message_id in messages:
+                return messages[message_id]
+        return None
+
+    # ------------------------------------------------------------
+    # Delta rounds
+    # ------------------------------------------------------------
+    def start_round(self, folder: str, since: Optional[int], select: Optional[List[str]]) -> str:
+        """Freeze the ids of a delta round; returns its cursor."""
+        if since is None:
+            ids = list(self.folders[folder])
+        else:
+            # Collapse the log: one entry per message changed after `since`
+            ids = list(dict.fromkeys(mid for seq, mid in self.log[folder] if seq > since))
+        cursor = uuid.uuid4().hex
+        self.cursors[cursor] = (folder, ids, select, self.seq)
+        return cursor
+
+    def page(self, cursor: str, offset: int, size: int) -> Tuple[List[Dict[str, Any]], Optional[int], int]:
+        """
+        Returns:
+            (items, next_offset or None on the last page, end_seq of the round)
+        """
+        folder, ids, select, end_seq = self.cursors[cursor]
+        items = []
+        for message_id in ids[offset:offset + size]:
+            msg = self.folders[folder].get(message_id)
+            if msg is None:
+                items.append({"id": message_id, "@removed": {"reason": "deleted"}})
+            else:
+                items.append(project(msg, select))
+
+        next_offset = offset + size
+        if next_offset >= len(ids):
+            self.cursors.pop(cursor, None)
+            return items, None, end_seq
+        return items, next_offset, end_seq
+
+
+# ============================================================================
+# Change notifications
+# ============================================================================
+
+async def deliver_notifications(
+    app: FastAPI,
+    folder: str,
+    message_ids: Iterable[str],
+    change_type: str = "created",
+) -> int:
+    """
+    POST Graph change notifications for `message_ids` to every subscription on `folder`.
+
+    Returns:
+        Number of webhook POSTs that were acknowledged (2xx)
+    """
+    message_ids = list(message_ids)
+    delivered = 0
+    for sub in list(app.state.subscriptions.values()):
+        if sub["folder"] != folder or change_type not in sub["changeType"].split(","):
+            continue
+        payload = {"value": [
+            {
+                "subscriptionId": sub["id"],
+                "clientState": sub.get("clientState"),
+                "changeType": change_type,
+                "resource": f"Users/me/Messages/{message_id}",
+                "subscriptionExpirationDateTime": sub["expirationDateTime"],
+                "resourceData": {"@odata.type": "#Microsoft.Graph.Message", "id": message_id},
+            }
+            for message_id in message_ids
+        ]}
+        resp = await app.state.notification_client.post(sub["notificationUrl"], json=payload)
+        app.state.stats["notifications"] += 1
+        if resp.is_success:
+            delivered += 1
+    return delivered
+
+
+# ============================================================================
+# App
+# ============================================================================
+
+def create_app(
+    mailbox: Optional[FakeMailbox] = None,
+    page_size: int = 100,
+    latency_seconds: float = 0.0,
+    throttle_every: int = 0,
+    retry_after_seconds: int = 1,
+    notification_client: Optional[httpx.AsyncClient] = None,
+) -> FastAPI:
+    """
+    Build a fake Graph app around `mailbox`.
+
+    Args:
+        mailbox: mailbox state (empty if omitted); all bearer tokens see it as /me
+        page_size: default delta page size (Prefer: odata.maxpagesize overrides it)
+        latency_seconds: added to every request
+        throttle_every: answer every Nth request with 429 (0 = never)
+        retry_after_seconds: Retry-After sent with those 429s
+        notification_client: client used to call webhooks (e.g. an ASGITransport
+                             client on the backend app for in-process tests)
+    """
+    app = FastAPI(title="Fake Microsoft Graph")
+    app.state.mailbox = mailbox or FakeMailbox()
+    app.state.stats = defaultdict(int)
+    app.state.subscriptions = {}
+    app.state.notification_client = notification_client or httpx.AsyncClient(timeout=10.0)
+    counter = itertools.count(1)
+
+    @app.middleware("http")
+    async def graph_behaviour(request: Request, call_next):
+        if request.url.path.startswith("/_fake/"):
+            return await call_next(request)
+        app.state.stats["requests"] += 1
+        if latency_seconds:
+            await asyncio.sleep(latency_seconds)
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"error": {"code": "InvalidAuthenticationToken"}}, status_code=401)
+        if throttle_every and next(counter) % throttle_every == 0:
+            app.state.stats["throttled"] += 1
+            return JSONResponse(
+                {"error": {"code": "ApplicationThrottled", "message": "Too many requests"}},
+                status_code=429,
+                headers={"Retry-After": str(retry_after_seconds)},
+            )
+        return await call_next(request)
+
+    def _folder_page(names: List[str]) -> Dict[str, Any]:
+        fake: FakeMailbox = app.state.mailbox
+        return {"value": [fake.folder_resource(name) for name in names]}
+
+    @app.get("/v1.0/me/mailFolders")
+    async def list_folders():
+        return _folder_page(app.state.mailbox.child_folders(None))
+
+    @app.get("/v1.0/me/mailFolders/{folder}")
+    async def get_folder(folder: str):
+        resource = app.state.mailbox.folder_resource(app.state.mailbox.resolve_folder(folder))
+        if resource is None:
+            return JSONResponse({"error": {"code": "ErrorFolderNotFound"}}, status_code=404)
+        return resource
+
+    @app.get("/v1.0/me/mailFolders/{folder}/childFolders")
+    async def list_child_folders(folder: str):
+        return _folder_page(app.state.mailbox.child_folders(app.state.mailbox.resolve_folder(folder)))
+
+    @app.get("/v1.0/me/mailFolders/{folder}/messages/delta")
+    async def messages_delta(request: Request, folder: str):
+        fake: FakeMailbox = app.state.mailbox
+        folder = fake.resolve_folder(folder)
+        params = request.query_params
+        size = page_size
+        prefer = _MAXPAGESIZE_RE.search(request.headers.get("prefer", ""))
+        if prefer:
+            size = int(prefer.group(1))
+
+        select = parse_select(params.get("$select"))
+        skiptoken = params.get("$skiptoken")
+        if skiptoken:
+            cursor, _, offset = skiptoken.partition(".")
+            if cursor not in fake.cursors:
+                return JSONResponse({"error": {"code": "SyncStateNotFound"}}, status_code=410)
+            offset = int(offset)
+        else:
+            deltatoken = params.get("$deltatoken")
+            if deltatoken and int(deltatoken) < fake.min_delta_seq:
+                return JSONResponse({"error": {"code": "SyncStateNotFound"}}, status_code=410)
+            cursor = fake.start_round(folder, int(deltatoken) if deltatoken else None, select)
+            offset = 0
+
+        items, next_offset, end_seq = fake.page(cursor, offset, size)
+        app.state.stats["pages"] += 1
+        app.state.stats["items"] += len(items)
+
+        base = str(request.url.remove_query_params(["$skiptoken", "$deltatoken", "$select"]))
+        suffix = f"&$select={','.join(select)}" if select else ""
+        body: Dict[str, Any] = {"value": items}
+        if next_offset is None:
+            body["@odata.deltaLink"] = f"{base}?$deltatoken={end_seq}{suffix}"
+        else:
+            body["@odata.nextLink"] = f"{base}?$skiptoken={cursor}.{next_offset}{suffix}"
+        return body
+
+    @app.get("/v1.0/me/mailFolders/{folder}/messages")
+    async def list_messages(request: Request, folder: str):
+        """Supports the receivedDateTime filters / ordering the backfill uses."""
+        params = request.query_params
+        keys, messages = app.state.mailbox.by_received(app.state.mailbox.resolve_folder(folder))
+
+        lo, hi = 0, len(keys)
+        for op, value in _RECEIVED_FILTER_RE.findall(params.get("$filter", "")):
+            bound = _graph_timestamp(value)
+            if op == "ge":
+                lo = max(lo, bisect.bisect_left(keys, bound))
+            elif op == "gt":
+                lo = max(lo, bisect.bisect_right(keys, bound))
+            elif op == "le":
+                hi = min(hi, bisect.bisect_right(keys, bound))
+            else:
+                hi = min(hi, bisect.bisect_left(keys, bound))
+        window = messages[lo:hi] if lo < hi else []
+        if params.get("$orderby", "").endswith("desc"):
+            window = window[::-1]
+
+        top = int(params.get("$top", 10))
+        skip = int(params.get("$skip", 0))
+        select = parse_select(params.get("$select"))
+        page = window[skip:skip + top]
+        app.state.stats["pages"] += 1
+        app.state.stats["items"] += len(page)
+
+        body: Dict[str, Any] = {"value": [project(m, select) for m in page]}
+        if skip + top < len(window):
+            body["@odata.nextLink"] = str(request.url.include_query_params(**{"$skip": skip + top}))
+        return body
+
+    def _message_response(message_id: str, select: Optional[List[str]]) -> Tuple[int, Dict[str, Any]]:
+        msg = app.state.mailbox.find(message_id)
+        if msg is None:
+            return 404, {"error": {"code": "ErrorItemNotFound"}}
+        return 200, project(msg, select)
+
+    @app.get("/v1.0/me/messages/{message_id}")
+    async def get_message(request: Request, message_id: str):
+        status, body = _message_response(message_id, parse_select(request.query_params.get("$select")))
+        return JSONResponse(body, status_code=status)
+
+    @app.post("/v1.0/$batch")
+    async def batch(request: Request):
+        payload = await request.json()
+        responses = []
+        for sub in payload.get("requests", []):
+            app.state.stats["batch_subrequests"] += 1
+            method = sub.get("method", "GET").upper()
+            path, _, query = sub["url"].partition("?")
+            match = re.fullmatch(r"/me/messages/([^/]+)", path)
+            folder_match = re.fullmatch(r"/me/mailFolders/([^/]+)", path)
+            select = parse_select(dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("$select"))
+
+            if folder_match and method == "GET":
+                resource = app.state.mailbox.folder_resource(app.state.mailbox.resolve_folder(folder_match.group(1)))
+                status, body = (200, project(resource, select)) if resource else (404, {"error": {"code": "ErrorFolderNotFound"}})
+            elif match and method == "GET":
+                status, body = _message_response(match.group(1), select)
+            elif match and method == "PATCH":
+                folder = app.state.mailbox.folder_of(match.group(1))
+                if folder is None:
+                    status, body = 404, {"error": {"code": "ErrorItemNotFound"}}
+                else:
+                    # A real change: new changeKey, shows up in delta rounds
+                    app.state.mailbox.update_message(folder, match.group(1), **(sub.get("body") or {}))
+                    status, body = 200, project(app.state.mailbox.folders[folder][match.group(1)], None)
+            else:
+                status, body = 501, {"error": {"code": "NotImplemented", "message": f"{method} {path}"}}
+            responses.append({"id": sub["id"], "status": status, "headers": {}, "body": body})
+        return {"responses": responses}
+
+    @app.post("/v1.0/subscriptions")
+    async def create_subscription(request: Request):
+        body = await request.json()
+        match = _RESOURCE_FOLDER_RE.search(body.get("resource", ""))
+        if not match:
+            return JSONResponse({"error": {"code": "InvalidRequest", "message": "Unsupported resource"}}, status_code=400)
+
+        # Webhook handshake: the endpoint must echo the validation token
+        validation_token = uuid.uuid4().hex
+        try:
+            resp = await app.state.notification_client.post(
+                body["notificationUrl"], params={"validationToken": validation_token}
+            )
+            valid = resp.status_code == 200 and resp.text == validation_token
+        except httpx.HTTPError:
+            valid = False
+        if not valid:
+            return JSONResponse(
+                {"error": {"code": "InvalidRequest", "message": "Subscription validation request failed."}},
+                status_code=400,
+            )
+
+        sub = {
+            "id": str(uuid.uuid4()),
+            "resource": body["resource"],
+            "changeType": body.get("changeType", "created"),
+            "notificationUrl": body["notificationUrl"],
+            "clientState": body.get("clientState"),
+            "expirationDateTime": body.get("expirationDateTime"),
+            "folder": app.state.mailbox.resolve_folder(match.group(1)),
+        }
+        app.state.subscriptions[sub["id"]] = sub
+        return JSONResponse({k: v for k, v in sub.items() if k != "folder"}, status_code=201)
+
+    @app.patch("/v1.0/subscriptions/{subscription_id}")
+    async def renew_subscription(request: Request, subscription_id: str):
+        sub = app.state.subscriptions.get(subscription_id)
+        if sub is None:
+            return JSONResponse({"error": {"code": "ResourceNotFound"}}, status_code=404)
+        sub["expirationDateTime"] = (await request.json()).get("expirationDateTime", sub["expirationDateTime"])
+        return {k: v for k, v in sub.items() if k != "folder"}
+
+    @app.delete("/v1.0/subscriptions/{subscription_id}")
+    async def delete_subscription(subscription_id: str):
+        if app.state.subscriptions.pop(subscription_id, None) is None:
+            return JSONResponse({"error": {"code": "ResourceNotFound"}}, status_code=404)
+        return Response(status_code=204)
+
+    @app.post("/_fake/messages/{folder}")
+    async def add_fake_messages(folder: str, count: int = 1):
+        """Test hook: deliver `count` new messages to `folder` and notify subscribers."""
+        fake: FakeMailbox = app.state.mailbox
+        start = len(fake.folders[folder])
+        new = [
+            {**msg, "id": f"{msg['id']}-{uuid.uuid4().hex[:8]}",
+             "receivedDateTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+            for msg in iter_messages(count, folder=folder, seed=start)
+        ]
+        fake.add_messages(folder, new)
+        delivered = await deliver_notifications(app, folder, [msg["id"] for msg in new])
+        return {"added": [msg["id"] for msg in new], "notifications_delivered": delivered}
+
+    return app
+
+
+# Standalone server: uvicorn fake_graph.app:app
+app = create_app(
+    FakeMailbox.seeded(int(os.getenv("FAKE_GRAPH_MESSAGES", "1000")), folders=("inbox", "sentitems")),
+    page_size=int(os.getenv("FAKE_GRAPH_PAGE_SIZE", "100")),
+    latency_seconds=float(os.getenv("FAKE_GRAPH_LATENCY_SECONDS", "0")),
+    throttle_every=int(os.getenv("FAKE_GRAPH_THROTTLE_EVERY", "0")),
+)
@@ -0,0 +1,157 @@
+"""
+Sync benchmark against the fake Graph
+
+Drives the real POST /api/emails/sync_outlook/{account_id} endpoint
+in-process (httpx.ASGITransport for both the API and the fake Graph, no
+sockets) and reports messages/sec for a cold full sync at each size.
+
+Usage (from webapp/backend, against the configured DATABASE_URL):
+    python -m fake_graph.benchmark
+    python -m fake_graph.benchmark --sizes 1000 10000 --page-size 50 --latency 0.02 --throttle-every 25
+
+Every run creates its own throwaway user + Outlook account and removes
+them afterwards (--keep to inspect the synced rows).
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+import httpx
+
+import core.graph_client as graph_client
+from auth.service import create_access_token
+from db.database import SessionLocal, create_tables
+from email_accounts.service import access_token_cache, encrypt_token
+from entities.account_sync_state import AccountSyncState
+from entities.conversation import Conversation
+from entities.delta_token import DeltaToken
+from entities.email import Email
+from entities.email_account import EmailAccount, ProviderEnum
+from entities.sync_run import SyncRun
+from entities.users import User
+from fake_graph.app import FakeMailbox, create_app
+from fake_graph.generator import iter_messages
+
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# Share of the generated messages placed in Inbox (the rest go to Sent Items)
+INBOX_SHARE = 0.8
+
+
+def _create_account(run_id: str) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        user = User(
+            id=uuid.uuid4(), email=f"bench-{run_id}@example.com",
+            first_name="Bench", last_name="Mark", password_hash="!",
+        )
+        account = EmailAccount(
+            id=uuid.uuid4(), user_id=user.id, provider=ProviderEnum.outlook,
+            email_address=f"bench-{run_id}@outlook.example.com",
+            ms_refresh_token_encrypted=encrypt_token("fake-refresh-token"),
+        )
+        db.add_all([user, account])
+        db.commit()
+        return {"user_id": user.id, "email": user.email, "account_id": account.id}
+    finally:
+        db.close()
+
+
+def _drop_account(ids: Dict[str, Any]) -> None:
+    db = SessionLocal()
+    try:
+        # Everything keyed by the account (bulk deletes skip the ORM cascades)
+        for entity in (Email, Conversation, DeltaToken, SyncRun, AccountSyncState):
+            db.query(entity).filter(entity.email_account_id == ids["account_id"]).delete(synchronize_session=False)
+        db.query(EmailAccount).filter(EmailAccount.id == ids["account_id"]).delete(synchronize_session=False)
+        db.query(User).filter(User.id == ids["user_id"]).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_size(count: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Cold-sync a fake mailbox of `count` messages through the API."""
+    import main  # deferred: importing the app wires routers / settings
+
+    run_id = uuid.uuid4().hex[:8]
+    inbox_count = int(count * INBOX_SHARE)
+    mailbox = FakeMailbox()
+    mailbox.add_messages("inbox", iter_messages(inbox_count, folder="inbox", mailbox=run_id))
+    mailbox.add_messages("sentitems", iter_messages(count - inbox_count, folder="sentitems", mailbox=run_id))
+    fake_app = create_app(
+        mailbox,
+        page_size=args.page_size,
+        latency_seconds=args.latency,
+        throttle_every=args.throttle_every,
+        retry_after_seconds=0,
+    )
+
+    ids = await asyncio.to_thread(_create_account, run_id)
+    access_token_cache.put(ids["account_id"], "fake-access-token", datetime.now(timezone.utc) + timedelta(hours=1))
+    jwt = create_access_token(ids["email"], ids["user_id"], timedelta(hours=1))
+
+    await graph_client.close_graph_client()
+    graph_client._graph_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=fake_app),
+        limits=graph_client.GRAPH_HTTP_LIMITS,
+        timeout=graph_client.GRAPH_HTTP_TIMEOUT,
+    )
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark", timeout=None,
+        ) as api:
+            started = time.perf_counter()
+            resp = await api.post(
+                f"/api/emails/sync_outlook/{ids['account_id']}",
+                headers={"Authorization": f"Bearer {jwt}"},
+            )
+            elapsed = time.perf_counter() - started
+        resp.raise_for_status()
+        result = resp.json()
+    finally:
+        await graph_client.close_graph_client()
+        access_token_cache.invalidate(ids["account_id"])
+        if not args.keep:
+            await asyncio.to_thread(_drop_account, ids)
+
+    stats = fake_app.state.stats
+    return {
+        "messages": count,
+        "inserted": result["inserted"],
+        "seconds": elapsed,
+        "msgs_per_sec": result["inserted"] / elapsed if elapsed else 0.0,
+        "graph_requests": stats["requests"],
+        "pages": stats["pages"],
+        "throttled": stats["throttled"],
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    create_tables()
+    print(f"{'messages':>10} {'inserted':>10} {'seconds':>9} {'msgs/sec':>10} {'requests':>9} {'pages':>7} {'429s':>6}")
+    for count in args.sizes:
+        r = await run_size(count, args)
+        print(
+            f"{r['messages']:>10} {r['inserted']:>10} {r['seconds']:>9.2f} {r['msgs_per_sec']:>10.0f} "
+            f"{r['graph_requests']:>9} {r['pages']:>7} {r['throttled']:>6}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark sync_outlook against the fake Graph server")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--page-size", type=int, default=100, help="messages per delta page")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every Graph request")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer every Nth Graph request with 429")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark accounts and their emails")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
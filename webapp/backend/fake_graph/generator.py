@@ -0,0 +1,104 @@
+"""
+Synthetic mailbox generator
+
+Scales email_mock.MOCK_EMAILS up to any size as Microsoft Graph message
+payloads (the shape returned by /me/mailFolders/{folder}/messages/delta).
+
+- Deterministic for a given seed (benchmarks are comparable run to run)
+- Messages are grouped into conversations of 1-6 messages
+- receivedDateTime walks backwards from `newest`, so ids and dates are unique
+"""
+
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from email_mock import MOCK_EMAILS
+
+
+# Graph caps bodyPreview at 255 characters
+BODY_PREVIEW_LENGTH = 255
+
+_ADDRESS_RE = re.compile(r"^\s*(?P<name>.*?)\s*<(?P<address>[^>]+)>\s*$")
+
+
+def _recipient(value: str) -> Dict[str, Dict[str, str]]:
+    """'Name <addr>' -> Graph recipient object."""
+    match = _ADDRESS_RE.match(value)
+    if match:
+        return {"emailAddress": {"name": match["name"], "address": match["address"]}}
+    return {"emailAddress": {"name": value, "address": value}}
+
+
+def _html(text: str) -> str:
+    paragraphs = "".join(f"<p>{line}</p>" for line in text.split("\n") if line)
+    return f"<html><body>{paragraphs}</body></html>"
+
+
+def make_message(
+    template: Dict[str, Any],
+    index: int,
+    conversation_id: str,
+    received: datetime,
+    folder: str = "inbox",
+    mailbox: str = "mbx",
+    rng: Optional[random.Random] = None,
+) -> Dict[str, Any]:
+    """Build one Graph message from a MOCK_EMAILS template."""
+    rng = rng or random.Random(index)
+    text = template["email_thread"]
+    subject = template["subject"] if index % 7 else f"RE: {template['subject']}"
+    sender, recipient = template["author"], template["to"]
+    if folder == "sentitems":
+        sender, recipient = recipient, sender
+
+    return {
+        "id": f"AAMk-{mailbox}-{folder}-{index:08d}",
+        "changeKey": f"CQAA{rng.getrandbits(64):016x}",
+        "subject": f"{subject} #{index}",
+        "from": _recipient(sender),
+        "toRecipients": [_recipient(recipient)],
+        "receivedDateTime": received.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "conversationId": conversation_id,
+        "bodyPreview": text[:BODY_PREVIEW_LENGTH],
+        "body": {"contentType": "html", "content": _html(text)},
+        "isRead": index % 3 == 0,
+        "flag": {"flagStatus": "flagged" if index % 11 == 0 else "notFlagged"},
+        "importance": "high" if index % 13 == 0 else "normal",
+        "categories": ["Blue category"] if index % 5 == 0 else [],
+    }
+
+
+def iter_messages(
+    count: int,
+    folder: str = "inbox",
+    seed: int = 0,
+    mailbox: str = "mbx",
+    newest: Optional[datetime] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield `count` synthetic Graph messages, newest first.
+
+    Ids are unique per (mailbox, folder, index): use a distinct `mailbox`
+    for every fake account that shares a database.
+    """
+    rng = random.Random(seed)
+    newest = newest or datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    received = newest
+    conversation_id, remaining_in_conversation = None, 0
+    for index in range(count):
+        if remaining_in_conversation == 0:
+            conversation_id = f"AAQk-{mailbox}-{folder}-{index:08d}"
+            remaining_in_conversation = rng.randint(1, 6)
+        remaining_in_conversation -= 1
+
+        received -= timedelta(seconds=rng.randint(30, 3600))
+        template = MOCK_EMAILS[rng.randrange(len(MOCK_EMAILS))]
+        yield make_message(template, index, conversation_id, received, folder=folder, mailbox=mailbox, rng=rng)
+
+
+def generate_messages(count: int, folder: str = "inbox", seed: int = 0, mailbox: str = "mbx") -> List[Dict[str, Any]]:
+    """List version of iter_messages."""
+    return list(iter_messages(count, folder=folder, seed=seed, mailbox=mailbox))
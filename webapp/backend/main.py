@@ -5,7 +5,14 @@ from emails import router as email
 from auth import router as auth
 from users import router as users
 from email_accounts import router as email_accounts
+from sync import router as sync
 from db.database import engine, create_tables
+from core.graph_client import close_graph_client
+from sync.scheduler import sync_scheduler
+from sync.hydrator import body_hydrator
+from sync.subscriptions import subscription_manager
+from emails.conversations import backfill_conversations
+from emails.pagination import NEXT_CURSOR_HEADER
 from sqlalchemy import inspect, text
 
 # Import all entity models so SQLAlchemy can resolve relationships
@@ -13,6 +20,10 @@ from entities.users import User
 from entities.email_account import EmailAccount
 from entities.email import Email, EmailClassification
 from entities.delta_token import DeltaToken
+from entities.graph_subscription import GraphSubscription
+from entities.sync_run import SyncRun
+from entities.account_sync_state import AccountSyncState
+from entities.conversation import Conversation
 
 
 app = FastAPI(
@@ -45,6 +56,46 @@ def ensure_tables_exist():
     create_tables()
     print("✅ Tables ensured (for MVP). Will Switch to Alembic at Production.")
 
+
+@app.on_event("startup")
+def ensure_conversation_summaries():
+    """
+    On app startup:
+    - Build the Conversation summaries of accounts that have emails but none yet
+      (first start after the table was added); they are maintained incrementally afterwards
+    """
+    backfill_conversations()
+
+
+@app.on_event("startup")
+async def start_background_sync():
+    """
+    On app startup:
+    - Start the background sync scheduler (periodic delta sync for every Outlook account)
+    - Start the low-priority body hydrator (fills bodies left out by metadata-only sync)
+    - Start the Graph subscription manager when a public webhook URL is configured
+    """
+    if settings.SYNC_SCHEDULER_ENABLED:
+        sync_scheduler.start()
+    if settings.BODY_HYDRATOR_ENABLED:
+        body_hydrator.start()
+    if settings.GRAPH_NOTIFICATION_URL:
+        subscription_manager.start()
+
+
+@app.on_event("shutdown")
+async def close_shared_clients():
+    """
+    On app shutdown:
+    - Stop the background sync scheduler (in-flight syncs resume from their page checkpoint)
+    - Stop the body hydrator and the subscription manager
+    - Close the pooled Microsoft Graph AsyncClient (drains keep-alive connections)
+    """
+    await sync_scheduler.stop()
+    await body_hydrator.stop()
+    await subscription_manager.stop()
+    await close_graph_client()
+
 # ✅ Add CORS middleware BEFORE registering routers
 app.add_middleware(
     CORSMiddleware,
@@ -52,6 +103,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # ✅ Register routers
@@ -59,6 +111,7 @@ app.include_router(email.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")  # ← Added users router
 app.include_router(email_accounts.router, prefix="/api")  # ← Added email_accounts router
+app.include_router(sync.router, prefix="/api")  # ← Graph change-notification webhooks
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+"""
+Sync Module
+
+Outlook → DB delta sync engine (asyncio, shared Graph transport).
+"""
@@ -0,0 +1,309 @@
+"""
+Account Backfill
+
+Initial load for a newly connected Outlook account:
+
+1. Recent window: the last BACKFILL_RECENT_DAYS days of each folder, newest
+   first ($filter + $orderby=receivedDateTime desc), every page committed as
+   it arrives -> the inbox fills in from the top within seconds
+2. Partitioned load of older mail: the rest of each folder is split into
+   BACKFILL_WINDOW_DAYS receivedDateTime windows, fetched concurrently by a
+   pool of BACKFILL_MAX_WORKERS workers (a single nextLink chain is bound by
+   round-trip latency; independent windows are not)
+3. Delta baseline in the background (the sync scheduler's worker pool, or
+   the sync workers when SYNC_SCHEDULER_ENABLED is off) -> the DeltaToken for incremental syncs. Messages already loaded come
+   back with an unchanged changeKey and are skipped by bulk_upsert_emails, so
+   this pass only writes what changed while phases 1-2 ran
+
+Phases 1-2 hold the account against scheduled syncs (hold_for_backfill): a
+full delta round started next to them would download the same mail again.
+The hold ends once phase 3 has been requested.
+
+Every folder the account syncs is covered: the folder tree is discovered
+first (sync.folders.plan_folders). Started from email_accounts/router.py::oauth_callback.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.graph_client import MS_GRAPH_BASE_URL, graph_request, iter_graph_chunks, prefetch, raise_for_graph_status
+from db.database import SessionLocal
+from email_accounts.service import access_token_cache
+from emails.service import bulk_upsert_emails
+from sync.scheduler import request_account_sync, sync_scheduler
+from sync.folders import plan_folders, synced_folder_keys
+from sync.leases import claim_account, release_lease, renew_leases
+from sync.service import METADATA_SELECT_FIELDS
+
+
+logger = logging.getLogger(__name__)
+
+# Keeps fire-and-forget backfills referenced until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def folder_messages_url(folder: str) -> str:
+    return f"{MS_GRAPH_BASE_URL}/me/mailFolders/{folder}/messages"
+
+
+def select_fields() -> Optional[str]:
+    """$select for list queries: same columns as the delta sync mode."""
+    return ",".join(METADATA_SELECT_FIELDS) if settings.SYNC_METADATA_ONLY else None
+
+
+def _graph_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_graph_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _commit_messages(account_id: UUID, folder: str, messages: List[Dict[str, Any]]) -> Tuple[int, int]:
+    db = SessionLocal()
+    try:
+        counts = bulk_upsert_emails(db, messages, email_account_id=account_id, folder=folder)
+        db.commit()
+        return counts
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ============================================================================
+# Phase 1: recent window, newest first
+# ============================================================================
+
+async def backfill_folder_range(
+    account_id: UUID,
+    folder: str,
+    access_token: str,
+    since: datetime,
+    until: Optional[datetime] = None,
+) -> int:
+    """
+    Fetch a folder's messages received in [since, until), newest first, committing each chunk of a page.
+
+    Returns:
+        Number of messages written
+    """
+    received_filter = f"receivedDateTime ge {_graph_time(since)}"
+    if until is not None:
+        received_filter += f" and receivedDateTime lt {_graph_time(until)}"
+    params = {
+        "$filter": received_filter,
+        "$orderby": "receivedDateTime desc",
+        "$top": settings.BACKFILL_PAGE_SIZE,
+    }
+    if select_fields():
+        params["$select"] = select_fields()
+
+    chunks = iter_graph_chunks(
+        folder_messages_url(folder), access_token, params=params,
+        mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+    )
+    written = 0
+    async for chunk in prefetch(chunks, depth=2):
+        if not chunk.items:
+            continue
+        inserted, updated = await run_in_threadpool(_commit_messages, account_id, folder, chunk.items)
+        written += inserted + updated
+    return written
+
+
+async def backfill_recent(
+    account_id: UUID,
+    access_token: str,
+    since: datetime,
+    folders: Optional[Iterable[str]] = None,
+) -> Dict[str, int]:
+    """
+    Phase 1 for every folder concurrently.
+
+    Returns:
+        {folder: messages written}
+    """
+    folders = tuple(folders or await run_in_threadpool(synced_folder_keys, account_id))
+    counts = await asyncio.gather(
+        *(backfill_folder_range(account_id, folder, access_token, since) for folder in folders)
+    )
+    return dict(zip(folders, counts))
+
+
+# ============================================================================
+# Phase 2: older mail, receivedDateTime windows in parallel
+# ============================================================================
+
+async def oldest_received(account_id: UUID, folder: str, access_token: str) -> Optional[datetime]:
+    """receivedDateTime of the folder's oldest message (None for an empty folder)."""
+    resp = await graph_request(
+        "GET", folder_messages_url(folder), access_token,
+        params={"$orderby": "receivedDateTime asc", "$top": 1, "$select": "receivedDateTime"},
+        mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+    )
+    raise_for_graph_status(resp)
+    messages = resp.json().get("value", [])
+    return _parse_graph_time(messages[0]["receivedDateTime"]) if messages else None
+
+
+def partition_windows(start: datetime, end: datetime, window: timedelta) -> List[Tuple[datetime, datetime]]:
+    """
+    Split [start, end) into consecutive windows of `window`, newest first.
+
+    The oldest window is widened to `start` rather than left as a sliver.
+    """
+    windows: List[Tuple[datetime, datetime]] = []
+    hi = end
+    while hi > start:
+        lo = hi - window
+        if lo - window / 2 < start:
+            lo = start
+        windows.append((lo, hi))
+        hi = lo
+    return windows
+
+
+async def backfill_partitioned(
+    account_id: UUID,
+    access_token: str,
+    until: datetime,
+    folders: Optional[Iterable[str]] = None,
+    window_days: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Phase 2: load every message received before `until`, window by window.
+
+    All folders' windows go into one queue (newest windows first) drained by
+    a bounded pool of workers, each paging its window into bulk_upsert_emails.
+    The per-mailbox limiter in graph_request still caps concurrent requests.
+
+    Returns:
+        {folder: messages written}
+    """
+    folders = tuple(folders or await run_in_threadpool(synced_folder_keys, account_id))
+    window = timedelta(days=window_days or settings.BACKFILL_WINDOW_DAYS)
+
+    oldest = await asyncio.gather(*(oldest_received(account_id, folder, access_token) for folder in folders))
+    jobs: List[Tuple[datetime, str, datetime]] = []
+    for folder, start in zip(folders, oldest):
+        if start is not None and start < until:
+            jobs.extend((hi, folder, lo) for lo, hi in partition_windows(start, until, window))
+    jobs.sort(reverse=True)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    counts = dict.fromkeys(folders, 0)
+
+    async def worker() -> None:
+        while True:
+            try:
+                hi, folder, lo = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            written = await backfill_folder_range(account_id, folder, access_token, lo, until=hi)
+            counts[folder] += written
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max_workers or settings.BACKFILL_MAX_WORKERS, len(jobs)))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    return counts
+
+
+# ============================================================================
+# Orchestration
+# ============================================================================
+
+@contextlib.asynccontextmanager
+async def hold_for_backfill(account_id: UUID) -> AsyncIterator[bool]:
+    """
+    Keep scheduled syncs off the account while the block runs.
+
+    - In-process scheduler: the current task counts as the account's running
+      sync (SyncScheduler.hold) until it finishes
+    - Sync workers (SYNC_SCHEDULER_ENABLED off): this process leases the
+      account (sync.leases.claim_account) and renews the lease until the block exits
+
+    Yields:
+        False if a sync of the account is already running (nothing is held)
+    """
+    if settings.SYNC_SCHEDULER_ENABLED:
+        yield sync_scheduler.hold(account_id, asyncio.current_task())
+        return
+
+    owner = f"backfill:{socket.gethostname()}:{os.getpid()}"
+    if not await run_in_threadpool(claim_account, owner, account_id, settings.SYNC_LEASE_SECONDS):
+        yield False
+        return
+
+    async def _heartbeat() -> None:
+        while True:
+            await asyncio.sleep(settings.SYNC_LEASE_SECONDS / 3)
+            try:
+                held = await run_in_threadpool(renew_leases, owner, [account_id], settings.SYNC_LEASE_SECONDS)
+            except Exception:
+                logger.exception("Backfill lease heartbeat failed for %s", account_id)
+                continue
+            if account_id not in held:
+                logger.warning("Backfill lease on %s lost; a sync worker may run next to the backfill", account_id)
+                return
+
+    heartbeat = asyncio.create_task(_heartbeat())
+    try:
+        yield True
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        await run_in_threadpool(release_lease, owner, account_id)
+
+
+async def backfill_new_account(account_id: UUID, user_id: UUID) -> None:
+    """
+    Run all phases for a freshly connected account.
+
+    Phases 1-2 failing is not fatal: the delta baseline (phase 3) enumerates
+    the whole folder and writes whatever is still missing. If the account is
+    already syncing, phases 1-2 are skipped: that full round loads everything.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=settings.BACKFILL_RECENT_DAYS)
+    async with hold_for_backfill(account_id) as held:
+        if not held:
+            logger.info("Account %s is already syncing; skipping its backfill", account_id)
+        else:
+            try:
+                access_token = await access_token_cache.get(account_id)
+                # Discovers the folder tree first: every folder is backfilled, inbox first
+                folders = await plan_folders(account_id, access_token)
+                counts = await backfill_recent(account_id, access_token, since, folders=folders)
+                logger.info("Recent backfill for %s done: %s", account_id, counts)
+                if settings.BACKFILL_PARTITIONED:
+                    counts = await backfill_partitioned(account_id, access_token, until=since, folders=folders)
+                    logger.info("Partitioned backfill for %s done: %s", account_id, counts)
+            except Exception as e:
+                logger.warning("Backfill for %s failed (%s); continuing with full sync", account_id, e)
+
+        # Phase 3: delta baseline -> DeltaToken, queued to run once the hold ends
+        await request_account_sync(account_id, user_id, follow_up=True)
+
+
+def start_backfill(account_id: UUID, user_id: UUID) -> asyncio.Task:
+    """Run backfill_new_account in the background (returns immediately)."""
+    task = asyncio.create_task(backfill_new_account(account_id, user_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
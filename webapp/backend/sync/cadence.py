@@ -0,0 +1,193 @@
+"""
+Adaptive Sync Cadence
+
+Learns how busy each Outlook account is and spaces its scheduled syncs
+accordingly, instead of polling every account at one fixed interval:
+
+- Every incremental folder sync reports the changes it applied
+  (record_changes, called from sync.service.sync_folder)
+- The per-account arrival rate is an exponentially weighted estimate: a
+  change counter decaying with time constant SYNC_RATE_TIME_CONSTANT_SECONDS
+- The next scheduled sync comes after about SYNC_TARGET_CHANGES_PER_SYNC
+  expected changes, clamped to [SYNC_MIN_INTERVAL_SECONDS, SYNC_MAX_INTERVAL_SECONDS]
+
+Quiet accounts drift towards the max interval and leave the scheduler's
+worker slots to busy ones, which drift towards the min.
+"""
+
+import logging
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import SessionLocal
+from entities.account_sync_state import AccountSyncState
+
+
+logger = logging.getLogger(__name__)
+
+# Serializes read-modify-write of the counters inside this process
+## (folders of one account finish concurrently); rows are also locked FOR UPDATE
+_state_lock = threading.Lock()
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes
+    return value if value is None or value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def decayed_score(score: float, updated_at: Optional[datetime], now: datetime) -> float:
+    """The change counter decayed from `updated_at` to `now`."""
+    if updated_at is None:
+        return score
+    elapsed = max(0.0, (now - _as_utc(updated_at)).total_seconds())
+    return score * math.exp(-elapsed / settings.SYNC_RATE_TIME_CONSTANT_SECONDS)
+
+
+def arrival_rate(state: Optional[AccountSyncState], now: Optional[datetime] = None) -> float:
+    """Estimated changes per second (0 for an account without history)."""
+    if state is None:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    return decayed_score(state.arrival_score or 0.0, state.score_updated_at, now) / settings.SYNC_RATE_TIME_CONSTANT_SECONDS
+
+
+def interval_for_rate(rate: float) -> float:
+    """Seconds until the next sync for an account changing `rate` times per second."""
+    if not settings.SYNC_ADAPTIVE_CADENCE:
+        return float(settings.SYNC_INTERVAL_SECONDS)
+    if rate <= 0:
+        return float(settings.SYNC_MAX_INTERVAL_SECONDS)
+    interval = settings.SYNC_TARGET_CHANGES_PER_SYNC / rate
+    return min(max(interval, settings.SYNC_MIN_INTERVAL_SECONDS), settings.SYNC_MAX_INTERVAL_SECONDS)
+
+
+def _get_state_for_update(db: Session, account_id: UUID) -> AccountSyncState:
+    state = db.query(AccountSyncState).filter(
+        AccountSyncState.email_account_id == account_id
+    ).with_for_update().first()
+    if state is None:
+        state = AccountSyncState(email_account_id=account_id, arrival_score=0.0)
+        db.add(state)
+    return state
+
+
+def _update_state(account_id: UUID, update) -> Optional[AccountSyncState]:
+    """Run `update(state)` on the account's row in its own transaction (one retry on an insert race)."""
+    for attempt in range(2):
+        db = SessionLocal()
+        try:
+            with _state_lock:
+                state = _get_state_for_update(db, account_id)
+                update(state)
+                db.commit()
+                db.refresh(state)
+                db.expunge(state)
+                return state
+        except IntegrityError:
+            # Another process created the row first: it exists now
+            db.rollback()
+            if attempt:
+                raise
+        finally:
+            db.close()
+    return None
+
+
+# ============================================================================
+# Public API (run in the threadpool)
+# ============================================================================
+
+def record_changes(account_id: UUID, changes: int) -> None:
+    """
+    Add the changes of one incremental folder sync to the account's arrival rate.
+
+    Never raises: cadence bookkeeping must not fail a sync.
+    """
+    now = datetime.now(timezone.utc)
+
+    def _add(state: AccountSyncState) -> None:
+        state.arrival_score = decayed_score(state.arrival_score or 0.0, state.score_updated_at, now) + changes
+        state.score_updated_at = now
+
+    try:
+        _update_state(account_id, _add)
+    except Exception:
+        logger.exception("Could not record sync changes for %s", account_id)
+
+
+def schedule_next_sync(account_id: UUID, min_delay: Optional[float] = None, owner: Optional[str] = None) -> float:
+    """
+    Choose and store when the account should sync next.
+
+    A run requested while the account was syncing (request_sync) makes it
+    due again right away.
+
+    Args:
+        min_delay: not before this many seconds (e.g. Graph's Retry-After)
+        owner: only if this sync worker still holds the account's lease
+               (otherwise the new owner's schedule is left alone)
+
+    Returns:
+        Seconds until then
+    """
+    now = datetime.now(timezone.utc)
+    chosen: Dict[str, float] = {}
+
+    def _schedule(state: AccountSyncState) -> None:
+        if owner is not None and state.lease_owner != owner:
+            logger.info("Not rescheduling %s: its lease moved to %s", account_id, state.lease_owner)
+            return
+        if state.requested_at is not None:
+            interval = min_delay or 0.0
+        else:
+            interval = max(interval_for_rate(arrival_rate(state, now)), min_delay or 0)
+        state.interval_seconds = interval
+        state.next_sync_at = now + timedelta(seconds=interval)
+        chosen["interval"] = interval
+
+    try:
+        _update_state(account_id, _schedule)
+    except Exception:
+        logger.exception("Could not store the sync schedule of %s", account_id)
+    return chosen.get("interval", float(settings.SYNC_INTERVAL_SECONDS))
+
+
+def request_sync(account_id: UUID) -> None:
+    """
+    Ask the sync workers for a run of the account as soon as possible.
+
+    Used instead of the in-process scheduler when SYNC_SCHEDULER_ENABLED is
+    off: the account becomes due now, and if a worker is syncing it already,
+    it is due again when that run ends. Never raises.
+    """
+    now = datetime.now(timezone.utc)
+
+    def _request(state: AccountSyncState) -> None:
+        state.requested_at = now
+        if state.next_sync_at is None or _as_utc(state.next_sync_at) > now:
+            state.next_sync_at = now
+
+    try:
+        _update_state(account_id, _request)
+    except Exception:
+        logger.exception("Could not request a sync of %s", account_id)
+
+
+def load_schedules() -> Dict[UUID, Tuple[float, Optional[datetime]]]:
+    """{account_id: (arrival rate per second, persisted next_sync_at)} of every account with state."""
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        return {
+            state.email_account_id: (arrival_rate(state, now), _as_utc(state.next_sync_at))
+            for state in db.query(AccountSyncState).all()
+        }
+    finally:
+        db.close()
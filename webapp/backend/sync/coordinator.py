@@ -0,0 +1,198 @@
+"""
+Sync Coordinator
+
+Makes sure each (account, folder) has at most one delta sync running.
+Two syncs of the same folder would read the same DeltaToken row, download
+the same pages and race each other's upserts on the unique message_id.
+
+- In-process: a second caller joins the sync already running and gets its
+  result (two browser tabs, a button click during a scheduled run, ...)
+- Across processes (PostgreSQL): a session-level advisory lock per account,
+  held on one dedicated connection while any folder of the account syncs
+  in this process (folder syncs of the account share it). If another
+  process holds it, SyncInProgressError is raised: the caller does not
+  wait for or join that run. The sync endpoint answers 409 Conflict, the
+  scheduler and sync workers skip the account until its next round.
+
+A process syncing N accounts therefore needs N lock connections on top of
+the sessions of their folder syncs; db/database.py sizes the pool for it.
+
+Other databases (SQLite in development) are single-process: the in-process
+coordination is all they need.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.database import engine
+
+
+logger = logging.getLogger(__name__)
+
+
+class SyncInProgressError(RuntimeError):
+    """Another process is already syncing this folder of the account."""
+
+
+def advisory_lock_key(account_id: UUID) -> int:
+    """Stable signed 64-bit key for pg_try_advisory_lock."""
+    digest = hashlib.blake2b(f"sync:{account_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+# ============================================================================
+# Advisory lock (runs in the threadpool)
+# ============================================================================
+
+def _try_lock(key: int) -> Optional[Connection]:
+    """
+    Take the advisory lock on its own connection.
+
+    Returns:
+        The connection holding the lock (None when the database has no advisory locks)
+
+    Raises:
+        SyncInProgressError: if another session holds the lock
+    """
+    if engine.dialect.name != "postgresql":
+        return None
+    conn = engine.connect()
+    try:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+        conn.commit()
+    except Exception:
+        conn.close()
+        raise
+    if not acquired:
+        conn.close()
+        raise SyncInProgressError("A sync of this account is already running in another process")
+    return conn
+
+
+def _unlock(conn: Connection, key: int) -> None:
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        conn.commit()
+    finally:
+        # Closing also ends the session (and its locks) if the unlock failed
+        conn.close()
+
+
+# ============================================================================
+# Coordinator
+# ============================================================================
+
+class SyncCoordinator:
+    """
+    One in-flight sync per (account, folder); later callers join it.
+
+    The sync runs in its own task so callers can come and go: it is only
+    cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[UUID, str], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[UUID, str], int] = {}
+        # account_id -> [lock connection (None without advisory locks), folder syncs holding it]
+        self._account_locks: Dict[UUID, List[Any]] = {}
+        # account_id -> [asyncio.Lock, callers holding / waiting for it]: serializes taking and
+        # giving back one account's lock, so connecting for one account never blocks another
+        self._account_guards: Dict[UUID, List[Any]] = {}
+
+    def is_running(self, account_id: UUID, folder: str) -> bool:
+        return (account_id, folder) in self._inflight
+
+    async def run(
+        self,
+        account_id: UUID,
+        folder: str,
+        sync: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Run `sync` for (account, folder), or join the run already in flight.
+
+        Returns:
+            The folder sync result (shared by every joined caller)
+
+        Raises:
+            SyncInProgressError: another process holds the account's lock
+            Whatever `sync` raises (every joined caller sees the same error)
+        """
+        key = (account_id, folder)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._locked(account_id, folder, sync))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Joining the running sync of %s/%s", account_id, folder)
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                # Last interested caller is gone (cancelled): stop the sync too
+                if not task.done():
+                    task.cancel()
+
+    async def _locked(
+        self,
+        account_id: UUID,
+        folder: str,
+        sync: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        await self._acquire_account(account_id)
+        try:
+            return await sync()
+        finally:
+            await self._release_account(account_id)
+
+    @contextlib.asynccontextmanager
+    async def _account_guard(self, account_id: UUID) -> AsyncIterator[None]:
+        """Hold the account's guard; it is dropped once no caller holds or waits for it."""
+        entry = self._account_guards.get(account_id)
+        if entry is None:
+            entry = self._account_guards[account_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._account_guards[account_id]
+
+    async def _acquire_account(self, account_id: UUID) -> None:
+        """Take the account's advisory lock, or share it if a folder sync of this process holds it."""
+        async with self._account_guard(account_id):
+            held = self._account_locks.get(account_id)
+            if held is None:
+                conn = await run_in_threadpool(_try_lock, advisory_lock_key(account_id))
+                held = self._account_locks[account_id] = [conn, 0]
+            held[1] += 1
+
+    async def _release_account(self, account_id: UUID) -> None:
+        """Give the lock back once the account's last folder sync in this process is done."""
+        async with self._account_guard(account_id):
+            held = self._account_locks[account_id]
+            held[1] -= 1
+            if held[1]:
+                return
+            del self._account_locks[account_id]
+            if held[0] is not None:
+                await run_in_threadpool(_unlock, held[0], advisory_lock_key(account_id))
+
+
+# Process-wide coordinator (used by sync.service.sync_account)
+sync_coordinator = SyncCoordinator()
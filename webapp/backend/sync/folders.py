@@ -0,0 +1,253 @@
+"""
+Mail Folder Discovery
+
+Finds every mail folder of an Outlook account (/me/mailFolders, child
+folders included) so mail that server-side rules file away is synced too.
+
+- Each synced folder has its own DeltaToken row (folder = well-known name
+  like "inbox", or the Graph folder id for user folders)
+- Folders are ranked: inbox, sent items, user folders, archive
+- Deleted items, junk, drafts and outbox (and their subfolders) are skipped
+- Cold folders (archive, or nothing changed for SYNC_COLD_FOLDER_AFTER_DAYS)
+  sync at most every SYNC_COLD_FOLDER_INTERVAL_SECONDS; the rest every round
+
+plan_folders() is what sync_account calls when no folders are given.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.graph_client import MS_GRAPH_BASE_URL, graph_batch, iter_graph_pages
+from db.database import SessionLocal
+from emails.service import bulk_delete_by_ids
+from entities.delta_token import DeltaToken
+from entities.email import Email
+
+
+logger = logging.getLogger(__name__)
+
+
+# Sync order (lower first)
+PRIORITY_INBOX = 0
+PRIORITY_SENT = 1
+PRIORITY_FOLDER = 2
+PRIORITY_ARCHIVE = 3
+
+# Folders synced even when discovery is off or fails
+DEFAULT_FOLDERS: Tuple[str, ...] = ("inbox", "sentitems")
+
+# Well-known folders never synced (with their subfolders)
+SKIPPED_FOLDERS: Tuple[str, ...] = ("deleteditems", "junkemail", "drafts", "outbox", "conversationhistory")
+
+# Well-known names resolved to folder ids during discovery
+## v1.0 mailFolder has no wellKnownName property: GET /me/mailFolders/{name} returns the id
+WELL_KNOWN_FOLDERS: Tuple[str, ...] = ("inbox", "sentitems", "archive") + SKIPPED_FOLDERS
+
+FOLDER_SELECT_FIELDS = "id,displayName,parentFolderId,childFolderCount"
+
+# account_id -> monotonic time of the last successful discovery (in-process)
+_discovered_at: Dict[UUID, float] = {}
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes
+    return value if value is None or value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# ============================================================================
+# Discovery (Graph)
+# ============================================================================
+
+async def _list_folders(url: str, account_id: UUID, access_token: str) -> List[Dict[str, Any]]:
+    folders = []
+    async for page in iter_graph_pages(
+        url, access_token, params={"$top": 100, "$select": FOLDER_SELECT_FIELDS},
+        mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+    ):
+        folders.extend(page.get("value", []))
+    return folders
+
+
+async def discover_folders(account_id: UUID, access_token: str) -> List[Dict[str, Any]]:
+    """
+    Walk the account's folder tree.
+
+    Well-known folders are resolved in one $batch round trip; each level of
+    child folders is fetched concurrently.
+
+    Returns:
+        [{"folder", "display_name", "priority"}] of every folder to sync
+
+    Raises:
+        RuntimeError: a well-known name could not be resolved (other than 404)
+    """
+    results = await graph_batch(
+        [{"id": name, "method": "GET", "url": f"/me/mailFolders/{name}?$select=id"} for name in WELL_KNOWN_FOLDERS],
+        access_token, mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+    )
+    well_known: Dict[str, str] = {}
+    for name, result in results.items():
+        status = result.get("status")
+        if status == 200:
+            well_known[result["body"]["id"]] = name
+        elif status != 404:
+            # Unresolved: the folder would be registered under its raw id (a second
+            # inbox, emails flipping folder every sync). 404 = the mailbox has none.
+            raise RuntimeError(f"Could not resolve well-known folder {name!r} (HTTP {status})")
+
+    discovered: List[Dict[str, Any]] = []
+    level = [(folder, None) for folder in await _list_folders(f"{MS_GRAPH_BASE_URL}/me/mailFolders", account_id, access_token)]
+    while level:
+        parents = []
+        for folder, parent_priority in level:
+            name = well_known.get(folder["id"])
+            if name in SKIPPED_FOLDERS:
+                continue
+            if name == "inbox":
+                priority = PRIORITY_INBOX
+            elif name == "sentitems":
+                priority = PRIORITY_SENT
+            elif name == "archive" or parent_priority == PRIORITY_ARCHIVE:
+                priority = PRIORITY_ARCHIVE
+            else:
+                priority = PRIORITY_FOLDER
+            discovered.append({"folder": name or folder["id"], "display_name": folder.get("displayName"), "priority": priority})
+            if folder.get("childFolderCount"):
+                parents.append((folder["id"], priority))
+
+        children = await asyncio.gather(*(
+            _list_folders(f"{MS_GRAPH_BASE_URL}/me/mailFolders/{folder_id}/childFolders", account_id, access_token)
+            for folder_id, _ in parents
+        ))
+        level = [(child, priority) for (_, priority), found in zip(parents, children) for child in found]
+
+    return discovered
+
+
+# ============================================================================
+# DB helpers (run in the threadpool)
+# ============================================================================
+
+def save_folders(account_id: UUID, discovered: List[Dict[str, Any]]) -> List[str]:
+    """
+    Store discovered folders as DeltaToken rows; forget folders that are gone.
+
+    Emails of a vanished folder are deleted with it (its delta token would
+    only answer 404 from now on).
+
+    Returns:
+        Folder keys removed
+    """
+    db = SessionLocal()
+    try:
+        rows = {row.folder: row for row in db.query(DeltaToken).filter(DeltaToken.email_account_id == account_id)}
+        for folder in discovered:
+            row = rows.pop(folder["folder"], None)
+            if row is None:
+                row = DeltaToken(email_account_id=account_id, folder=folder["folder"])
+                db.add(row)
+            row.display_name = folder["display_name"]
+            row.priority = folder["priority"]
+
+        removed = [key for key in rows if key not in DEFAULT_FOLDERS]
+        for key in removed:
+            message_ids = [
+                message_id for (message_id,) in db.query(Email.message_id).filter(
+                    Email.email_account_id == account_id, Email.folder == key,
+                )
+            ]
+            bulk_delete_by_ids(db, message_ids)
+            db.delete(rows[key])
+        db.commit()
+        return removed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_folder_rows(account_id: UUID) -> List[DeltaToken]:
+    db = SessionLocal()
+    try:
+        return db.query(DeltaToken).filter(DeltaToken.email_account_id == account_id).all()
+    finally:
+        db.close()
+
+
+def synced_folder_keys(account_id: UUID) -> List[str]:
+    """
+    Every folder the account syncs, highest priority first (cold ones included).
+
+    DEFAULT_FOLDERS until discovery has stored the folder tree, or when it is off.
+    Used by the state channel, subscriptions and backfill.
+    """
+    if not settings.FOLDER_DISCOVERY_ENABLED:
+        return list(DEFAULT_FOLDERS)
+    rows = load_folder_rows(account_id)
+    rows.sort(key=lambda row: (row.priority if row.priority is not None else PRIORITY_FOLDER, row.folder))
+    return [row.folder for row in rows] or list(DEFAULT_FOLDERS)
+
+
+# ============================================================================
+# Planning
+# ============================================================================
+
+def is_cold(row: DeltaToken, now: datetime) -> bool:
+    """Archive folders, and folders nothing happened in for a while (never inbox / sent)."""
+    if row.folder in DEFAULT_FOLDERS:
+        return False
+    if row.priority == PRIORITY_ARCHIVE:
+        return True
+    changed = _as_utc(row.last_changed_at) or _as_utc(row.last_synced_at)
+    return changed is not None and now - changed > timedelta(days=settings.SYNC_COLD_FOLDER_AFTER_DAYS)
+
+
+def due_folders(rows: List[DeltaToken], now: Optional[datetime] = None) -> List[str]:
+    """
+    Folders to sync this round, highest priority first.
+
+    Cold folders are due once SYNC_COLD_FOLDER_INTERVAL_SECONDS passed since
+    their last completed round; every other folder is always due.
+    """
+    now = now or datetime.now(timezone.utc)
+    cold_interval = timedelta(seconds=settings.SYNC_COLD_FOLDER_INTERVAL_SECONDS)
+    due = []
+    for row in rows:
+        last_synced = _as_utc(row.last_synced_at)
+        if is_cold(row, now) and last_synced is not None and now - last_synced < cold_interval:
+            continue
+        due.append(row)
+    due.sort(key=lambda row: (row.priority if row.priority is not None else PRIORITY_FOLDER, row.folder))
+    return [row.folder for row in due]
+
+
+async def plan_folders(account_id: UUID, access_token: str) -> List[str]:
+    """
+    Folders a full sync of the account should cover now, in priority order.
+
+    Rediscovers the folder tree every FOLDER_DISCOVERY_INTERVAL_SECONDS; a
+    failed discovery falls back to the folders already known.
+    """
+    if not settings.FOLDER_DISCOVERY_ENABLED:
+        return list(DEFAULT_FOLDERS)
+
+    last = _discovered_at.get(account_id)
+    if last is None or time.monotonic() - last >= settings.FOLDER_DISCOVERY_INTERVAL_SECONDS:
+        try:
+            discovered = await discover_folders(account_id, access_token)
+            removed = await run_in_threadpool(save_folders, account_id, discovered)
+            _discovered_at[account_id] = time.monotonic()
+            logger.info("Discovered %d folders for %s (removed: %s)", len(discovered), account_id, removed or "none")
+        except Exception as e:
+            logger.warning("Folder discovery failed for %s: %s", account_id, e)
+
+    rows = await run_in_threadpool(load_folder_rows, account_id)
+    return due_folders(rows) if rows else list(DEFAULT_FOLDERS)
@@ -0,0 +1,251 @@
+"""
+Body Hydrator
+
+Metadata-first sync stores messages without their HTML body
+(Email.email_thread_html IS NULL = "not hydrated yet"). Bodies are fetched:
+
+- on demand, when a reader opens an email or thread (emails/router.py)
+- in the background, newest first, by a low-priority loop started in main.py
+
+Bodies are fetched through Graph JSON $batch (20 messages per round trip).
+A new changeKey clears the stored body (emails.service), so edited messages
+are hydrated again.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Collection, Dict, List, Optional, Set
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.graph_client import graph_batch
+from db.database import SessionLocal
+from email_accounts.service import access_token_cache
+from entities.email import Email
+from entities.email_account import EmailAccount, ProviderEnum
+from sync.scheduler import sync_scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ids Graph answered 404 for are not asked for again this long (the next
+# delta round normally deletes their rows well before)
+NOT_FOUND_RETRY_SECONDS = 3600
+
+
+# ============================================================================
+# Hydration
+# ============================================================================
+
+async def fetch_bodies(
+    account_id: UUID,
+    message_ids: List[str],
+    not_found: Optional[Set[str]] = None,
+) -> Dict[str, str]:
+    """
+    Fetch the HTML body of many messages of one account via $batch.
+
+    Args:
+        not_found: if given, collects the ids Graph answered 404 for
+
+    Returns:
+        {message_id: html} for every message Graph returned (deleted ones are skipped)
+    """
+    access_token = await access_token_cache.get(account_id)
+    requests = [
+        {"id": str(i), "method": "GET", "url": f"/me/messages/{message_id}?$select=body"}
+        for i, message_id in enumerate(message_ids)
+    ]
+    results = await graph_batch(
+        requests, access_token, mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID
+    )
+
+    bodies = {}
+    for i, result in results.items():
+        message_id = message_ids[int(i)]
+        if result.get("status") == 200:
+            bodies[message_id] = (result.get("body") or {}).get("body", {}).get("content", "")
+        else:
+            # 404 = deleted since the last delta round; the next sync removes the row
+            if result.get("status") == 404 and not_found is not None:
+                not_found.add(message_id)
+            logger.debug("Body fetch for %s returned %s", message_id, result.get("status"))
+    return bodies
+
+
+async def hydrate_email_bodies(db: Session, emails: List[Email]) -> int:
+    """
+    Fill in missing bodies for the given Email rows (commits; the rows stay loaded).
+
+    Rows that already have a body, or no Graph message_id, are ignored.
+    Graph failures are logged and leave the row unhydrated, so callers can
+    still serve the metadata.
+
+    Returns:
+        Number of rows hydrated
+    """
+    by_account: Dict[UUID, List[Email]] = defaultdict(list)
+    for email in emails:
+        if email.email_thread_html is None and email.message_id:
+            by_account[email.email_account_id].append(email)
+    if not by_account:
+        return 0
+
+    async def _account(account_id: UUID, rows: List[Email]) -> int:
+        try:
+            bodies = await fetch_bodies(account_id, [row.message_id for row in rows])
+        except Exception as e:
+            logger.warning("Body hydration failed for account %s: %s", account_id, e)
+            return 0
+        for row in rows:
+            if row.message_id in bodies:
+                row.email_thread_html = bodies[row.message_id]
+        return sum(1 for row in rows if row.message_id in bodies)
+
+    counts = await asyncio.gather(*(_account(account_id, rows) for account_id, rows in by_account.items()))
+    hydrated = sum(counts)
+    if hydrated:
+        await run_in_threadpool(_commit_and_reload, db, emails)
+    return hydrated
+
+
+def _commit_and_reload(db: Session, emails: List[Email]) -> None:
+    """
+    Commit, then reload the rows the commit expired with one query.
+
+    Callers serialize the rows on the event loop: without the reload every
+    attribute access there would be a blocking lazy load.
+    """
+    db.commit()
+    db.query(Email).filter(Email.id.in_([email.id for email in emails])).all()
+
+
+# ============================================================================
+# Background hydrator
+# ============================================================================
+
+def _load_unhydrated(batch_size: int, skip: Dict[UUID, Collection[str]]) -> Dict[UUID, List[str]]:
+    """Newest unhydrated message ids, up to `batch_size` per Outlook account (minus `skip`)."""
+    db = SessionLocal()
+    try:
+        account_ids = [
+            row.id for row in db.query(EmailAccount.id).filter(
+                EmailAccount.provider == ProviderEnum.outlook,
+                EmailAccount.ms_refresh_token_encrypted.isnot(None),
+            )
+        ]
+        pending = {}
+        for account_id in account_ids:
+            query = db.query(Email.message_id).filter(
+                Email.email_account_id == account_id,
+                Email.email_thread_html.is_(None),
+                Email.message_id.isnot(None),
+            )
+            if skip.get(account_id):
+                query = query.filter(Email.message_id.notin_(list(skip[account_id])))
+            rows = query.order_by(Email.received_at.desc()).limit(batch_size).all()
+            if rows:
+                pending[account_id] = [row.message_id for row in rows]
+        return pending
+    finally:
+        db.close()
+
+
+def _store_bodies(account_id: UUID, bodies: Dict[str, str]) -> None:
+    db = SessionLocal()
+    try:
+        for message_id, html in bodies.items():
+            db.query(Email).filter(
+                Email.email_account_id == account_id,
+                Email.message_id == message_id,
+                Email.email_thread_html.is_(None),
+            ).update({Email.email_thread_html: html}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+class BodyHydrator:
+    """
+    Low-priority loop that back-fills bodies after a metadata-only sync.
+
+    Low priority by construction: one account at a time, one $batch per
+    account per tick, and accounts with a delta sync in flight are skipped
+    so hydration never competes with sync for the mailbox's Graph slots.
+    Ids Graph answered 404 for (deleted since the last delta round) are
+    skipped for NOT_FOUND_RETRY_SECONDS instead of being asked for every tick.
+    """
+
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._loop_task: Optional[asyncio.Task] = None
+        # account id -> {message id: monotonic time of the 404}
+        self._not_found: Dict[UUID, Dict[str, float]] = defaultdict(dict)
+
+    def start(self) -> None:
+        """Start the hydration loop on the running event loop."""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run_loop())
+            logger.info("Body hydrator started (interval=%ss)", self.interval_seconds)
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+            logger.info("Body hydrator stopped")
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Body hydrator tick failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> int:
+        """Hydrate one batch per idle account. Returns the number of bodies stored."""
+        self._forget_expired_not_found()
+        pending = await run_in_threadpool(_load_unhydrated, self.batch_size, self._not_found)
+        stored = 0
+        for account_id, message_ids in pending.items():
+            if sync_scheduler.is_running(account_id):
+                continue
+            not_found: Set[str] = set()
+            try:
+                bodies = await fetch_bodies(account_id, message_ids, not_found)
+            except Exception as e:
+                logger.warning("Background hydration failed for account %s: %s", account_id, e)
+                continue
+            now = time.monotonic()
+            self._not_found[account_id].update(dict.fromkeys(not_found, now))
+            await run_in_threadpool(_store_bodies, account_id, bodies)
+            stored += len(bodies)
+        if stored:
+            logger.info("Hydrated %d email bodies", stored)
+        return stored
+
+    def _forget_expired_not_found(self) -> None:
+        cutoff = time.monotonic() - NOT_FOUND_RETRY_SECONDS
+        for account_id in list(self._not_found):
+            ids = self._not_found[account_id]
+            for message_id in [m for m, at in ids.items() if at < cutoff]:
+                del ids[message_id]
+            if not ids:
+                del self._not_found[account_id]
+
+
+# Process-wide hydrator (started from main.py)
+body_hydrator = BodyHydrator(
+    interval_seconds=settings.BODY_HYDRATOR_INTERVAL_SECONDS,
+    batch_size=settings.BODY_HYDRATOR_BATCH_SIZE,
+)
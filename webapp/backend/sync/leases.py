@@ -0,0 +1,175 @@
+"""
+Sync Leases
+
+DB-backed ownership of accounts for a fleet of sync workers (sync_worker.py).
+A worker owns an account while AccountSyncState.lease_expires_at is in the
+future and lease_owner is its id:
+
+- claim_due_accounts() picks due, unleased accounts and leases them in one
+  transaction (SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL, so workers
+  polling at the same moment never claim the same row)
+- renew_leases() is the heartbeat; it reports which leases are still held
+- release_lease() frees an account after its sync
+- claim_account() leases one given account, due or not (the API process
+  holds a new account this way while its backfill runs, sync.backfill)
+
+A worker that dies stops renewing, and its accounts become claimable
+again once their lease expires.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from entities.account_sync_state import AccountSyncState
+from entities.email_account import EmailAccount, ProviderEnum
+
+
+logger = logging.getLogger(__name__)
+
+
+def _ensure_states(db: Session) -> None:
+    """Create the AccountSyncState row of syncable accounts that have none (commits)."""
+    missing = db.query(EmailAccount.id).outerjoin(
+        AccountSyncState, AccountSyncState.email_account_id == EmailAccount.id
+    ).filter(
+        AccountSyncState.email_account_id.is_(None),
+        EmailAccount.provider == ProviderEnum.outlook,
+        EmailAccount.ms_refresh_token_encrypted.isnot(None),
+    ).all()
+    if not missing:
+        return
+    for (account_id,) in missing:
+        db.add(AccountSyncState(email_account_id=account_id, arrival_score=0.0))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker created them first
+        db.rollback()
+
+
+def claim_due_accounts(worker_id: str, limit: int, lease_seconds: float) -> List[Tuple[UUID, UUID]]:
+    """
+    Lease up to `limit` accounts that are due (next_sync_at passed or never synced).
+
+    Accounts overdue the longest come first.
+
+    Returns:
+        (account_id, user_id) of every account now leased to `worker_id`
+    """
+    if limit <= 0:
+        return []
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        _ensure_states(db)
+        rows = db.query(AccountSyncState, EmailAccount.user_id).join(
+            EmailAccount, EmailAccount.id == AccountSyncState.email_account_id
+        ).filter(
+            EmailAccount.provider == ProviderEnum.outlook,
+            EmailAccount.ms_refresh_token_encrypted.isnot(None),
+            or_(AccountSyncState.next_sync_at.is_(None), AccountSyncState.next_sync_at <= now),
+            or_(AccountSyncState.lease_expires_at.is_(None), AccountSyncState.lease_expires_at < now),
+        ).order_by(
+            AccountSyncState.next_sync_at.asc().nullsfirst()
+        ).limit(limit).with_for_update(skip_locked=True, of=AccountSyncState).all()
+
+        expires_at = now + timedelta(seconds=lease_seconds)
+        for state, _ in rows:
+            state.lease_owner = worker_id
+            state.lease_expires_at = expires_at
+            # This run covers every request made so far (sync.cadence.request_sync)
+            state.requested_at = None
+        db.commit()
+        return [(state.email_account_id, user_id) for state, user_id in rows]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def claim_account(owner: str, account_id: UUID, lease_seconds: float) -> bool:
+    """
+    Lease one account to `owner` if no one else holds it (whether it is due or not).
+
+    Returns:
+        True if `owner` now holds the lease
+    """
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        if db.get(AccountSyncState, account_id) is None:
+            db.add(AccountSyncState(email_account_id=account_id, arrival_score=0.0))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        # Conditional UPDATE: at most one of several concurrent claimers matches
+        claimed = db.query(AccountSyncState).filter(
+            AccountSyncState.email_account_id == account_id,
+            or_(AccountSyncState.lease_expires_at.is_(None), AccountSyncState.lease_expires_at < now),
+        ).update(
+            {
+                AccountSyncState.lease_owner: owner,
+                AccountSyncState.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return claimed == 1
+    finally:
+        db.close()
+
+
+def renew_leases(worker_id: str, account_ids: Iterable[UUID], lease_seconds: float) -> Set[UUID]:
+    """
+    Heartbeat: extend this worker's leases on `account_ids`.
+
+    Returns:
+        The accounts still leased to this worker (a lease that expired and
+        was claimed by another worker is not in the set)
+    """
+    account_ids = list(account_ids)
+    if not account_ids:
+        return set()
+    db = SessionLocal()
+    try:
+        db.query(AccountSyncState).filter(
+            AccountSyncState.email_account_id.in_(account_ids),
+            AccountSyncState.lease_owner == worker_id,
+        ).update(
+            {AccountSyncState.lease_expires_at: datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)},
+            synchronize_session=False,
+        )
+        db.commit()
+        return {
+            account_id for (account_id,) in db.query(AccountSyncState.email_account_id).filter(
+                AccountSyncState.email_account_id.in_(account_ids),
+                AccountSyncState.lease_owner == worker_id,
+            )
+        }
+    finally:
+        db.close()
+
+
+def release_lease(worker_id: str, account_id: UUID) -> None:
+    """Give an account back (only if this worker still owns it)."""
+    db = SessionLocal()
+    try:
+        db.query(AccountSyncState).filter(
+            AccountSyncState.email_account_id == account_id,
+            AccountSyncState.lease_owner == worker_id,
+        ).update(
+            {AccountSyncState.lease_owner: None, AccountSyncState.lease_expires_at: None},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,150 @@
+"""
+Sync Router
+
+Webhooks Microsoft Graph calls for change notifications (push sync),
+and sync telemetry for the current user.
+
+- POST /sync/notifications  -> change notifications: delta-sync just the affected folder
+                               (state channel only for "updated")
+- POST /sync/lifecycle      -> lifecycle notifications: missed / removed / reauthorization
+- GET  /sync/runs           -> recent SyncRun rows (filter by account / folder / status)
+- GET  /sync/stats          -> per account/folder throughput over the last N days
+
+Graph first validates each URL by POSTing ?validationToken=...; the token
+must be echoed back as text/plain within 10 seconds. Notifications must be
+acknowledged within 3 seconds, so the sync itself runs in the background.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from auth.service import CurrentUser
+from db.database import get_db
+from sync.schemas import SyncRunResponse, SyncStatsResponse
+from sync.telemetry import list_sync_runs, throughput_stats
+from sync.scheduler import request_account_sync
+from sync.subscriptions import delete_subscription_row, ensure_account_subscriptions, resolve_notification
+
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+
+@router.post("/notifications")
+async def graph_notifications(
+    request: Request,
+    validation_token: Optional[str] = Query(None, alias="validationToken"),
+):
+    """
+    Graph change-notification webhook.
+
+    Each notification is checked against its subscription's clientState, then
+    a targeted delta sync of that folder is queued ("updated" notifications
+    only run the read / flag state channel). If the account is already
+    syncing, one follow-up run is queued (bursts collapse into it).
+
+    Returns:
+        The validation token (subscription handshake) or 202 Accepted
+    """
+    if validation_token is not None:
+        return PlainTextResponse(validation_token)
+
+    payload = await request.json()
+    for notification in payload.get("value", []):
+        target = await run_in_threadpool(
+            resolve_notification, notification.get("subscriptionId", ""), notification.get("clientState")
+        )
+        if target is None:
+            logger.warning("Ignoring notification for %s (unknown subscription or clientState mismatch)", notification.get("subscriptionId"))
+            continue
+
+        account_id, user_id, folder = target
+        ## "updated" is almost always a read / flag change: the narrow state channel covers it
+        state_only = notification.get("changeType") == "updated"
+        await request_account_sync(account_id, user_id, folders=[folder], follow_up=True, state_only=state_only)
+
+    return Response(status_code=202)
+
+
+@router.post("/lifecycle")
+async def graph_lifecycle_notifications(
+    request: Request,
+    validation_token: Optional[str] = Query(None, alias="validationToken"),
+):
+    """
+    Graph lifecycle-notification webhook.
+
+    - missed                    -> notifications were dropped: sync the folder now
+    - subscriptionRemoved       -> forget it and create a new one
+    - reauthorizationRequired   -> renew it (a PATCH reauthorizes the subscription)
+    """
+    if validation_token is not None:
+        return PlainTextResponse(validation_token)
+
+    payload = await request.json()
+    for notification in payload.get("value", []):
+        subscription_id = notification.get("subscriptionId", "")
+        target = await run_in_threadpool(resolve_notification, subscription_id, notification.get("clientState"))
+        if target is None:
+            continue
+
+        account_id, user_id, folder = target
+        event = notification.get("lifecycleEvent")
+        logger.info("Lifecycle event %s for subscription %s", event, subscription_id)
+        try:
+            if event == "missed":
+                await request_account_sync(account_id, user_id, folders=[folder], follow_up=True)
+            elif event == "subscriptionRemoved":
+                await run_in_threadpool(delete_subscription_row, subscription_id)
+                await ensure_account_subscriptions(account_id, folders=[folder])
+            elif event == "reauthorizationRequired":
+                await ensure_account_subscriptions(account_id, folders=[folder], force_renew=True)
+        except Exception as e:
+            logger.warning("Lifecycle handling failed for %s: %s", subscription_id, e)
+
+    return Response(status_code=202)
+
+
+# ============================================================================
+# Telemetry
+# ============================================================================
+
+@router.get("/runs", response_model=List[SyncRunResponse])
+def get_sync_runs(
+    current_user: CurrentUser,
+    account_id: Optional[UUID] = None,
+    folder: Optional[str] = None,
+    status: Optional[str] = Query(None, pattern="^(ok|error)$"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    Recent sync runs of the current user's accounts, newest first.
+
+    Args:
+        account_id / folder / status: optional filters
+        limit: max rows (1-500)
+    """
+    return list_sync_runs(db, current_user.get_uuid(), account_id=account_id, folder=folder, status=status, limit=limit)
+
+
+@router.get("/stats", response_model=SyncStatsResponse)
+def get_sync_stats(
+    current_user: CurrentUser,
+    days: int = Query(7, ge=1, le=90),
+    db: Session = Depends(get_db),
+):
+    """
+    Throughput per (account, folder) over the last `days` days.
+
+    Slowest accounts (lowest average items/sec) come first.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    return {"since": since, "accounts": throughput_stats(db, current_user.get_uuid(), since)}
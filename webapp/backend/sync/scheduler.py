@@ -0,0 +1,299 @@
+"""
+Sync Scheduler
+
+Runs delta syncs for every connected Outlook account in the background,
+so users never wait on a sync inside an HTTP request.
+
+- Each account is synced at its own cadence, learned from its arrival rate
+  (sync.cadence: between SYNC_MIN_INTERVAL_SECONDS and SYNC_MAX_INTERVAL_SECONDS,
+  ± SYNC_JITTER_SECONDS), or every SYNC_INTERVAL_SECONDS with adaptive cadence off
+- Schedules are persisted; accounts without one are spread randomly over one
+  interval on startup (no thundering herd)
+- Due accounts are started busiest first, so they get the free worker slots
+- A global semaphore caps concurrent account syncs; a per-user semaphore keeps
+  one user with many accounts from taking every slot
+- Started / stopped with the FastAPI app (see main.py)
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.graph_client import GraphThrottledError
+from db.database import SessionLocal
+from entities.email_account import EmailAccount, ProviderEnum
+from sync.cadence import load_schedules, request_sync, schedule_next_sync
+from sync.coordinator import SyncInProgressError
+from sync.service import sync_email_account
+from sync.state import sync_email_account_state
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_syncable_accounts() -> List[Tuple[UUID, UUID]]:
+    """(account_id, user_id) of every Outlook account with a stored refresh token."""
+    db = SessionLocal()
+    try:
+        rows = db.query(EmailAccount.id, EmailAccount.user_id).filter(
+            EmailAccount.provider == ProviderEnum.outlook,
+            EmailAccount.ms_refresh_token_encrypted.isnot(None),
+        ).all()
+        return [(row.id, row.user_id) for row in rows]
+    finally:
+        db.close()
+
+
+class SyncScheduler:
+    """
+    Interval scheduler with a bounded worker pool.
+
+    State is in-process: which accounts are due (monotonic timestamps) and
+    which are currently running (asyncio tasks).
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        jitter_seconds: float,
+        max_concurrency: int,
+        max_per_user: int,
+        tick_seconds: float = 5.0,
+    ):
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.max_per_user = max_per_user
+        self.tick_seconds = tick_seconds
+
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._user_slots: Dict[UUID, asyncio.Semaphore] = {}
+        self._next_run: Dict[UUID, float] = {}
+        self._running: Dict[UUID, asyncio.Task] = {}
+        # Runs requested while the account was busy: account -> (user_id, folders or None = all, state_only)
+        self._follow_ups: Dict[UUID, Tuple[UUID, Optional[Set[str]], bool]] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    def start(self) -> None:
+        """Start the scheduling loop on the running event loop."""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run_loop())
+            logger.info("Sync scheduler started (interval=%ss)", self.interval_seconds)
+
+    async def stop(self) -> None:
+        """Stop scheduling and cancel in-flight syncs (page checkpoints make this safe)."""
+        self._follow_ups.clear()
+        tasks = list(self._running.values())
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._running.clear()
+        logger.info("Sync scheduler stopped")
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def trigger(
+        self,
+        account_id: UUID,
+        user_id: UUID,
+        folders: Optional[Iterable[str]] = None,
+        follow_up: bool = False,
+        state_only: bool = False,
+    ) -> bool:
+        """
+        Run a sync for `account_id` as soon as a worker slot is free.
+
+        Args:
+            folders: sync only these folders (default: all)
+            follow_up: if a sync is already running, queue one more run after it.
+                       Used by change notifications: the running delta round may
+                       have started before the change happened. Bursts collapse
+                       into a single follow-up run.
+            state_only: only run the read / flag state channel (sync.state)
+
+        Returns:
+            False if a sync for the account is already running, True otherwise
+        """
+        folders = set(folders) if folders is not None else None
+        if account_id in self._running:
+            if follow_up:
+                _, queued, queued_state_only = self._follow_ups.get(account_id, (user_id, set(), True))
+                merged = None if queued is None or folders is None else queued | folders
+                ## A full run covers state changes too
+                self._follow_ups[account_id] = (user_id, merged, queued_state_only and state_only)
+            return False
+        self._spawn(account_id, user_id, folders, state_only)
+        return True
+
+    def is_running(self, account_id: UUID) -> bool:
+        return account_id in self._running
+
+    def hold(self, account_id: UUID, task: asyncio.Task) -> bool:
+        """
+        Count `task` as the account's running sync (e.g. its initial backfill).
+
+        Until the task finishes the account is not scheduled, and triggers
+        with follow_up queue their run behind it.
+
+        Returns:
+            False if a sync of the account is already running
+        """
+        if account_id in self._running:
+            return False
+        self._track(account_id, task)
+        return True
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+    def _jittered(self, interval: float) -> float:
+        # Jitter never exceeds a tenth of the interval (short intervals stay short)
+        jitter = min(self.jitter_seconds, interval / 10)
+        return max(0.0, interval + random.uniform(-jitter, jitter))
+
+    def _spawn(
+        self,
+        account_id: UUID,
+        user_id: UUID,
+        folders: Optional[Set[str]] = None,
+        state_only: bool = False,
+    ) -> None:
+        self._track(account_id, asyncio.create_task(self._run_account(account_id, user_id, folders, state_only)))
+
+    def _track(self, account_id: UUID, task: asyncio.Task) -> None:
+        self._running[account_id] = task
+        task.add_done_callback(lambda _: self._on_done(account_id))
+
+    def _on_done(self, account_id: UUID) -> None:
+        self._running.pop(account_id, None)
+        follow_up = self._follow_ups.pop(account_id, None)
+        if follow_up is not None:
+            user_id, folders, state_only = follow_up
+            self._spawn(account_id, user_id, folders, state_only)
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Sync scheduler tick failed")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def _tick(self) -> None:
+        accounts = await run_in_threadpool(load_syncable_accounts)
+        now = asyncio.get_running_loop().time()
+        schedules = await run_in_threadpool(load_schedules)
+
+        # Forget accounts that were disconnected
+        known = {account_id for account_id, _ in accounts}
+        for account_id in list(self._next_run):
+            if account_id not in known:
+                self._next_run.pop(account_id, None)
+
+        due = []
+        for account_id, user_id in accounts:
+            if account_id not in self._next_run:
+                self._next_run[account_id] = now + self._initial_delay(schedules.get(account_id))
+            if self._next_run[account_id] <= now and account_id not in self._running:
+                due.append((account_id, user_id))
+
+        # Busiest accounts first: they queue for the worker slots ahead of quiet ones
+        due.sort(key=lambda account: schedules.get(account[0], (0.0, None))[0], reverse=True)
+        for account_id, user_id in due:
+            self._spawn(account_id, user_id)
+
+    def _initial_delay(self, schedule: Optional[Tuple[float, Optional[datetime]]]) -> float:
+        """Delay of an account's first round in this process."""
+        if schedule is None or schedule[1] is None:
+            # Spread first rounds over one interval
+            return random.uniform(0, self.interval_seconds)
+        remaining = (schedule[1] - datetime.now(timezone.utc)).total_seconds()
+        if remaining > 0:
+            return remaining
+        # Overdue while the app was down: spread the catch-up over the shortest interval
+        return random.uniform(0, settings.SYNC_MIN_INTERVAL_SECONDS)
+
+    async def _run_account(
+        self,
+        account_id: UUID,
+        user_id: UUID,
+        folders: Optional[Set[str]] = None,
+        state_only: bool = False,
+    ) -> None:
+        user_slots = self._user_slots.setdefault(user_id, asyncio.Semaphore(self.max_per_user))
+        delay = None
+        try:
+            # Per-user slot first so a busy user never holds a global slot while waiting
+            async with user_slots, self._global_slots:
+                run = sync_email_account_state if state_only else sync_email_account
+                stats = await run(account_id, folders=sorted(folders) if folders else None)
+                logger.info(
+                    "Background %ssync %s: inserted=%d updated=%d deleted=%d",
+                    "state " if state_only else "", account_id, stats["inserted"], stats["updated"], stats["deleted"],
+                )
+        except asyncio.CancelledError:
+            raise
+        except SyncInProgressError:
+            # Another process is syncing it right now: just try again next round
+            logger.info("Background sync skipped for account %s: running elsewhere", account_id)
+        except Exception as e:
+            if isinstance(e.__cause__, GraphThrottledError):
+                # Graph asked us to back off: don't come back before it allows
+                interval = await run_in_threadpool(schedule_next_sync, account_id)
+                delay = max(self._jittered(interval), e.__cause__.retry_after or 0)
+                logger.warning("Background sync throttled for account %s; next try in %.0fs", account_id, delay)
+            else:
+                logger.exception("Background sync failed for account %s", account_id)
+
+        # A targeted (notification) or state-only run doesn't replace the periodic full round
+        if delay is None and folders is None and not state_only:
+            delay = self._jittered(await run_in_threadpool(schedule_next_sync, account_id))
+        if delay is not None:
+            self._next_run[account_id] = asyncio.get_running_loop().time() + delay
+
+
+# Process-wide scheduler (started from main.py)
+sync_scheduler = SyncScheduler(
+    interval_seconds=settings.SYNC_INTERVAL_SECONDS,
+    jitter_seconds=settings.SYNC_JITTER_SECONDS,
+    max_concurrency=settings.SYNC_MAX_CONCURRENT_ACCOUNTS,
+    max_per_user=settings.SYNC_MAX_CONCURRENT_PER_USER,
+)
+
+
+async def request_account_sync(
+    account_id: UUID,
+    user_id: UUID,
+    folders: Optional[Iterable[str]] = None,
+    follow_up: bool = False,
+    state_only: bool = False,
+) -> bool:
+    """
+    Start a sync from the API: on this process's scheduler, or through the sync workers.
+
+    With SYNC_SCHEDULER_ENABLED off, sync_worker.py processes own syncing;
+    the account is marked due in AccountSyncState instead (sync.cadence.request_sync)
+    so the API never syncs next to them. Workers run full account rounds,
+    so `folders` / `state_only` only narrow in-process runs.
+
+    Returns:
+        Like SyncScheduler.trigger (always True when requested from the workers)
+    """
+    if settings.SYNC_SCHEDULER_ENABLED:
+        return sync_scheduler.trigger(account_id, user_id, folders=folders, follow_up=follow_up, state_only=state_only)
+    await run_in_threadpool(request_sync, account_id)
+    return True
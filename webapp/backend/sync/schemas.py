@@ -0,0 +1,60 @@
+"""
+Sync Schemas
+
+Pydantic models for sync telemetry endpoints.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class SyncRunResponse(BaseModel):
+    """One folder sync (see entities.sync_run.SyncRun)"""
+    id: int
+    email_account_id: UUID
+    folder: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    pages: int
+    graph_requests: int
+    bytes_downloaded: int
+    inserted: int
+    updated: int
+    deleted: int
+    resumed: bool
+    graph_seconds: float
+    db_seconds: float
+    items_per_second: Optional[float] = None
+    status: str
+    error_class: Optional[str] = None
+    error_message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SyncThroughputStats(BaseModel):
+    """Aggregated sync runs of one (account, folder) over a time window"""
+    email_account_id: UUID
+    email_address: str
+    folder: str
+    runs: int
+    errors: int
+    avg_duration_seconds: Optional[float] = None
+    max_duration_seconds: Optional[float] = None
+    avg_items_per_second: Optional[float] = None
+    avg_graph_seconds: Optional[float] = None
+    avg_db_seconds: Optional[float] = None
+    total_bytes_downloaded: int
+    total_items: int
+    last_run_at: Optional[datetime] = None
+
+
+class SyncStatsResponse(BaseModel):
+    """Per-account throughput since `since`"""
+    since: datetime
+    accounts: List[SyncThroughputStats]
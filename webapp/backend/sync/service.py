@@ -0,0 +1,550 @@
+"""
+Sync Service
+
+Asyncio delta sync engine for Outlook accounts.
+
+- Graph pages are fetched with the shared pooled httpx.AsyncClient (core.graph_client),
+  so a long mailbox sync never blocks the event loop.
+- Folders of one account are synced concurrently (asyncio.gather, at most
+  SYNC_MAX_CONCURRENT_FOLDERS at a time, highest priority first); which
+  folders is decided by sync.folders (discovery + cold-folder cadence).
+- Every folder sync goes through sync.coordinator: concurrent callers for the
+  same (account, folder) join one run instead of racing each other.
+- Each folder streams page by page: the next page downloads while the
+  current one is written and committed (bounded memory). Pages are parsed
+  incrementally and written in chunks of items as they arrive, so a big page
+  of HTML bodies is never decoded as a whole.
+- DB work uses the regular (sync) SQLAlchemy session, one session per folder,
+  executed in the threadpool so it doesn't block other requests either.
+- An expired delta token (410 Gone) triggers a reconciliation resync that
+  only writes what differs from the local copy of the folder.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.graph_client import MS_GRAPH_BASE_URL, PageChunk, iter_graph_chunks, prefetch
+from db.database import SessionLocal
+from email_accounts.service import access_token_cache
+from emails.service import bulk_upsert_emails, bulk_delete_by_ids
+from entities.delta_token import DeltaToken
+from entities.email import Email
+from entities.email_account import EmailAccount, ProviderEnum
+from sync.cadence import record_changes
+from sync.coordinator import sync_coordinator
+from sync.folders import DEFAULT_FOLDERS, plan_folders
+from sync.telemetry import record_sync_run
+
+
+logger = logging.getLogger(__name__)
+
+
+# Graph statuses meaning a stored nextLink/skiptoken is no longer usable
+EXPIRED_LINK_STATUSES = (400, 404, 410)
+
+# Graph answers a delta token it no longer has sync state for with 410 Gone
+## (error code syncStateNotFound / resyncRequired): the folder must be re-enumerated
+EXPIRED_DELTA_STATUSES = (410,)
+
+
+# Fields needed by the inbox / conversation views (no body.content)
+## The $select is carried inside every nextLink / deltaLink Graph returns
+METADATA_SELECT_FIELDS: Tuple[str, ...] = (
+    "id",
+    "changeKey",
+    "subject",
+    "from",
+    "toRecipients",
+    "receivedDateTime",
+    "conversationId",
+    "bodyPreview",
+    "isRead",
+    "flag",
+    "importance",
+    "categories",
+)
+
+
+def base_delta_url(folder: str, metadata_only: Optional[bool] = None) -> str:
+    """
+    Delta endpoint used for the first (full) sync of a folder.
+
+    In metadata-only mode (settings.SYNC_METADATA_ONLY) bodies are left out;
+    they are fetched later by sync.hydrator.
+    """
+    if metadata_only is None:
+        metadata_only = settings.SYNC_METADATA_ONLY
+    url = f"{MS_GRAPH_BASE_URL}/me/mailFolders/{folder}/messages/delta"
+    if metadata_only:
+        url += "?$select=" + ",".join(METADATA_SELECT_FIELDS)
+    return url
+
+
+def delta_page_headers() -> Dict[str, str]:
+    """Prefer header asking Graph for SYNC_DELTA_PAGE_SIZE items per delta page (if set)."""
+    if not settings.SYNC_DELTA_PAGE_SIZE:
+        return {}
+    return {"Prefer": f"odata.maxpagesize={settings.SYNC_DELTA_PAGE_SIZE}"}
+
+
+def iter_delta_chunks(
+    delta_url: str,
+    account_id: UUID,
+    access_token: str,
+    metrics: Optional[Dict[str, float]] = None,
+) -> AsyncIterator[PageChunk]:
+    """Delta pages of a folder as incrementally parsed chunks (see core.graph_client.iter_graph_chunks)."""
+    return iter_graph_chunks(
+        delta_url, access_token, headers=delta_page_headers(),
+        mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID, metrics=metrics,
+    )
+
+
+# ============================================================================
+# DB helpers (run in the threadpool)
+# ============================================================================
+
+def get_or_create_delta_token(db: Session, account_id: UUID, folder: str) -> DeltaToken:
+    """Load the DeltaToken row for (account, folder), creating it on first sync."""
+    token_row = db.query(DeltaToken).filter(
+        DeltaToken.email_account_id == account_id,
+        DeltaToken.folder == folder
+    ).first()
+
+    if token_row is None:
+        token_row = DeltaToken(email_account_id=account_id, folder=folder, delta_token=None)
+        db.add(token_row)
+        db.commit()
+        db.refresh(token_row)
+
+    return token_row
+
+
+def apply_delta_changes(
+    db: Session,
+    account_id: UUID,
+    changes: List[Dict[str, Any]],
+    folder: Optional[str] = None,
+) -> Tuple[int, int, int]:
+    """
+    Apply a list of Graph delta items to the DB (no commit).
+
+    Items are collapsed per message id (last change wins), then written with
+    one bulk upsert and one bulk delete instead of per-row round trips.
+
+    Returns:
+        (inserted, updated, deleted)
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for item in changes:
+        latest.pop(item["id"], None)
+        latest[item["id"]] = item
+
+    # Handle deleted messages
+    deleted_ids = [item_id for item_id, item in latest.items() if "@removed" in item]
+    upserts = [item for item in latest.values() if "@removed" not in item]
+
+    # Upsert with email_account_id
+    inserted, updated = bulk_upsert_emails(db, upserts, email_account_id=account_id, folder=folder)
+
+    # Bulk delete removed emails
+    deleted = bulk_delete_by_ids(db, deleted_ids) if deleted_ids else 0
+
+    return inserted, updated, deleted
+
+
+def load_folder_snapshot(db: Session, account_id: UUID, folder: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    Local state of a folder for a resync: {message_id: (change_key, folder)}.
+
+    Rows synced before folders were recorded (folder IS NULL) are included so
+    the resync can claim them; they are never deleted by it.
+    """
+    rows = db.execute(
+        select(Email.message_id, Email.change_key, Email.folder).where(
+            Email.email_account_id == account_id,
+            or_(Email.folder == folder, Email.folder.is_(None)),
+        )
+    )
+    return {message_id: (change_key, row_folder) for message_id, change_key, row_folder in rows}
+
+
+def reconcile_page(
+    db: Session,
+    account_id: UUID,
+    folder: str,
+    snapshot: Dict[str, Tuple[Optional[str], Optional[str]]],
+    items: List[Dict[str, Any]],
+) -> Tuple[int, int]:
+    """
+    Write only the items of a resync page that differ from the snapshot (no commit).
+
+    Returns:
+        (inserted, updated)
+    """
+    changed = [
+        item for item in items
+        if "@removed" not in item and snapshot.get(item["id"]) != (item.get("changeKey"), folder)
+    ]
+    return bulk_upsert_emails(db, changed, email_account_id=account_id, folder=folder)
+
+
+def delete_missing(db: Session, folder: str, snapshot: Dict[str, Tuple[Optional[str], Optional[str]]], seen: Set[str]) -> int:
+    """Bulk-delete the folder's local messages Graph no longer lists (no commit)."""
+    missing = {message_id for message_id, (_, row_folder) in snapshot.items() if row_folder == folder} - seen
+    return bulk_delete_by_ids(db, missing) if missing else 0
+
+
+# ============================================================================
+# Async sync engine
+# ============================================================================
+
+async def sync_folder(account_id: UUID, folder: str, access_token: str) -> Dict[str, Any]:
+    """
+    Delta-sync a single folder of an account, one Graph page at a time.
+
+    Pipeline:
+      Graph download + incremental parse  ─┐ (prefetch task, shared AsyncClient)
+      chunk N bulk write                   ┘ (threadpool, session owned by this folder sync)
+
+    Items are written and committed in chunks as the page body is parsed, so
+    no write transaction stays open while the rest of a page downloads. The
+    last chunk of a page commits a checkpoint of its @odata.nextLink
+    (DeltaToken.next_link) with its rows. Only a couple of chunks are
+    resident at any time and a crashed sync resumes from the last
+    checkpointed page; replaying the chunks of a half-written page is
+    harmless (unchanged changeKeys are skipped, deletes are idempotent).
+    The final page stores the new @odata.deltaLink and clears the checkpoint.
+
+    If Graph no longer accepts the stored delta token (410 Gone), the folder is
+    reconciled instead of re-imported: a fresh enumeration (same $select as a
+    first sync) is diffed against the local (message_id, changeKey) set, only
+    new or changed messages are written, and local messages Graph no longer
+    lists are deleted in bulk. In metadata-only mode bodies of changed
+    messages are hydrated lazily (sync.hydrator).
+
+    Every run (successful or failed) is recorded as a SyncRun row with
+    page / byte counts and the time spent in Graph vs the DB. Successful
+    incremental rounds also feed the account's arrival rate (sync.cadence).
+
+    Returns:
+        {"folder", "inserted", "updated", "deleted", "pages", "resumed", "resynced"}
+
+    Graph throttling (429/503) is retried inside the transport (core.graph_client);
+    it only surfaces here once every retry has been used up.
+
+    Raises:
+        RuntimeError: if Graph or the DB write fails (message names the folder;
+                      the original error, e.g. GraphThrottledError, is chained as __cause__)
+    """
+    stats = {"folder": folder, "inserted": 0, "updated": 0, "deleted": 0, "pages": 0, "resumed": False, "resynced": False}
+    metrics: Dict[str, float] = {"graph_requests": 0, "graph_seconds": 0.0, "bytes_downloaded": 0, "db_seconds": 0.0}
+    started_at = datetime.now(timezone.utc)
+    failure: Optional[BaseException] = None
+
+    async def _db(fn, *args):
+        started = time.perf_counter()
+        try:
+            return await run_in_threadpool(fn, *args)
+        finally:
+            metrics["db_seconds"] += time.perf_counter() - started
+
+    def _mark_round_complete(counts: Tuple[int, ...]) -> None:
+        # Feeds the cold-folder cadence (sync.folders)
+        now = datetime.now(timezone.utc)
+        token_row.last_synced_at = now
+        if any(counts) or stats["inserted"] or stats["updated"] or stats["deleted"]:
+            token_row.last_changed_at = now
+
+    def _write_chunk(chunk: PageChunk) -> Tuple[int, int, int]:
+        counts = apply_delta_changes(db, account_id, chunk.items, folder=folder)
+        if not chunk.page_end:
+            # Own transaction: no write lock held while the rest of the page downloads
+            db.commit()
+            return counts
+
+        # Checkpoint in the same transaction as the page's rows
+        if chunk.links.get("@odata.deltaLink"):
+            token_row.delta_token = chunk.links["@odata.deltaLink"]
+            token_row.next_link = None
+            _mark_round_complete(counts)
+        else:
+            token_row.next_link = chunk.links.get("@odata.nextLink")
+        db.commit()
+        return counts
+
+    def _clear_checkpoint() -> None:
+        token_row.next_link = None
+        db.commit()
+
+    async def _consume(start_url: str) -> None:
+        chunks = iter_delta_chunks(start_url, account_id, access_token, metrics=metrics)
+        async for chunk in prefetch(chunks, depth=2):
+            chunk_inserted, chunk_updated, chunk_deleted = await _db(_write_chunk, chunk)
+            stats["inserted"] += chunk_inserted
+            stats["updated"] += chunk_updated
+            stats["deleted"] += chunk_deleted
+            stats["pages"] += chunk.page_end
+
+    def _write_reconcile_chunk(chunk: PageChunk) -> Tuple[int, int, int]:
+        counts = reconcile_page(db, account_id, folder, snapshot, chunk.items)
+        deleted = 0
+        if not chunk.page_end:
+            db.commit()
+            return (*counts, deleted)
+        if chunk.links.get("@odata.deltaLink"):
+            deleted = delete_missing(db, folder, snapshot, seen)
+            token_row.delta_token = chunk.links["@odata.deltaLink"]
+            _mark_round_complete((*counts, deleted))
+        # No nextLink checkpoint: an interrupted resync starts over (the old
+        # token 410s again), since the deletions need the complete id set
+        db.commit()
+        return (*counts, deleted)
+
+    async def _resync() -> None:
+        nonlocal snapshot
+        stats["resynced"] = True
+        snapshot = await _db(load_folder_snapshot, db, account_id, folder)
+        chunks = iter_delta_chunks(base_delta_url(folder), account_id, access_token, metrics=metrics)
+        async for chunk in prefetch(chunks, depth=2):
+            seen.update(item["id"] for item in chunk.items if "@removed" not in item)
+            chunk_inserted, chunk_updated, chunk_deleted = await _db(_write_reconcile_chunk, chunk)
+            stats["inserted"] += chunk_inserted
+            stats["updated"] += chunk_updated
+            stats["deleted"] += chunk_deleted
+            stats["pages"] += chunk.page_end
+
+    async def _consume_fresh() -> None:
+        # Stored delta token > full enumeration; an expired token falls back to a resync
+        if not token_row.delta_token:
+            await _consume(base_delta_url(folder))
+            return
+        try:
+            await _consume(token_row.delta_token)
+        except httpx.HTTPStatusError as e:
+            if stats["pages"] or e.response.status_code not in EXPIRED_DELTA_STATUSES:
+                raise
+            logger.warning("Delta token for %s/%s expired (%s); reconciling", account_id, folder, e.response.status_code)
+            await _resync()
+
+    snapshot: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    seen: Set[str] = set()
+    db = SessionLocal()
+    try:
+        token_row = await _db(get_or_create_delta_token, db, account_id, folder)
+        incremental = token_row.delta_token is not None
+
+        # Resume checkpoint > stored delta token > full enumeration
+        if token_row.next_link:
+            stats["resumed"] = True
+            logger.info("Resuming %s/%s from checkpointed nextLink", account_id, folder)
+            try:
+                await _consume(token_row.next_link)
+            except httpx.HTTPStatusError as e:
+                # Skip tokens don't live forever: an expired checkpoint restarts the round
+                if stats["pages"] or e.response.status_code not in EXPIRED_LINK_STATUSES:
+                    raise
+                logger.warning("Checkpoint for %s/%s expired (%s); restarting", account_id, folder, e.response.status_code)
+                stats["resumed"] = False
+                await _db(_clear_checkpoint)
+                await _consume_fresh()
+        else:
+            await _consume_fresh()
+    except asyncio.CancelledError as e:
+        # Shutdown mid-sync: the page checkpoint makes the next run resume
+        failure = e
+        db.rollback()
+        raise
+    except Exception as e:
+        failure = e
+        db.rollback()
+        raise RuntimeError(f"Delta sync failed for {folder}: {e}") from e
+    finally:
+        db.close()
+        await run_in_threadpool(record_sync_run, account_id, folder, started_at, stats, metrics, failure)
+
+    # Full enumerations say nothing about how fast mail arrives
+    if incremental and not stats["resynced"]:
+        await run_in_threadpool(record_changes, account_id, stats["inserted"] + stats["updated"] + stats["deleted"])
+
+    logger.info(
+        "Synced %s/%s: pages=%d inserted=%d updated=%d deleted=%d resumed=%s resynced=%s",
+        account_id, folder, stats["pages"], stats["inserted"], stats["updated"], stats["deleted"],
+        stats["resumed"], stats["resynced"],
+    )
+    return stats
+
+
+async def sync_account(
+    account_id: UUID,
+    access_token: str,
+    folders: Optional[Iterable[str]] = None,
+    on_folder_synced: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Sync all folders of an account concurrently.
+
+    A folder that is already syncing (another request, the scheduler) is not
+    synced twice: this call waits for the running sync and reports its result.
+
+    Args:
+        account_id: EmailAccount id
+        access_token: valid Graph access token for the account
+        folders: folder keys to sync (default: sync.folders.plan_folders -
+                 every discovered folder that is due, inbox first)
+        on_folder_synced: optional callback receiving each folder's stats as it finishes
+
+    Returns:
+        Aggregated statistics (inserted, updated, deleted, folders_synced)
+
+    Raises:
+        SyncInProgressError: a folder is being synced by another process
+    """
+    folders = tuple(folders or await plan_folders(account_id, access_token))
+    slots = asyncio.Semaphore(settings.SYNC_MAX_CONCURRENT_FOLDERS)
+
+    async def _folder(folder: str) -> Dict[str, Any]:
+        # Tasks queue on the semaphore in creation (= priority) order
+        async with slots:
+            result = await sync_coordinator.run(
+                account_id, folder, lambda: sync_folder(account_id, folder, access_token)
+            )
+        if on_folder_synced is not None:
+            on_folder_synced(result)
+        return result
+
+    results = await asyncio.gather(*(_folder(folder) for folder in folders))
+
+    return {
+        "inserted": sum(r["inserted"] for r in results),
+        "updated": sum(r["updated"] for r in results),
+        "deleted": sum(r["deleted"] for r in results),
+        "folders_synced": list(folders),
+    }
+
+
+# ============================================================================
+# Account-level entry point (background jobs)
+# ============================================================================
+
+async def sync_email_account(account_id: UUID, folders: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Sync an account without a request context (scheduler, background tasks).
+
+    Takes the access token from the shared cache, then runs sync_account.
+    """
+    access_token = await access_token_cache.get(account_id)
+    return await sync_account(account_id, access_token, folders=folders)
+
+
+# ============================================================================
+# User-level fan-out (all accounts of a user, with progress events)
+# ============================================================================
+
+def _load_user_outlook_accounts(user_id: UUID) -> List[Tuple[UUID, str]]:
+    db = SessionLocal()
+    try:
+        rows = db.query(EmailAccount.id, EmailAccount.email_address).filter(
+            EmailAccount.user_id == user_id,
+            EmailAccount.provider == ProviderEnum.outlook,
+            EmailAccount.ms_refresh_token_encrypted.isnot(None),
+        ).order_by(EmailAccount.created_at).all()
+        return [(row.id, row.email_address) for row in rows]
+    finally:
+        db.close()
+
+
+async def sync_user_accounts(
+    user_id: UUID,
+    max_concurrency: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Sync every Outlook account of a user concurrently, yielding progress events.
+
+    A semaphore bounds how many accounts sync at once, so a refresh takes
+    about as long as the slowest account instead of the sum of all of them.
+    Events are yielded as they happen (one queue fed by every account task):
+
+      {"event": "start",            "data": {"accounts": [{"account_id", "email_address"}]}}
+      {"event": "account_started",  "data": {"account_id", "email_address"}}
+      {"event": "folder_synced",    "data": {"account_id", "folder", "inserted", "updated", "deleted", "pages"}}
+      {"event": "account_complete", "data": {"account_id", "email_address", "inserted", "updated", "deleted", "folders_synced", "seconds"}}
+      {"event": "account_error",    "data": {"account_id", "email_address", "error"}}
+      {"event": "complete",         "data": {"accounts", "succeeded", "failed", "inserted", "updated", "deleted", "seconds"}}
+
+    A failing account doesn't stop the others.
+    """
+    accounts = await run_in_threadpool(_load_user_outlook_accounts, user_id)
+    slots = asyncio.Semaphore(max_concurrency or settings.SYNC_FANOUT_MAX_CONCURRENCY)
+    events: asyncio.Queue = asyncio.Queue()
+    started = time.perf_counter()
+
+    async def _account(account_id: UUID, email_address: str) -> Optional[Dict[str, Any]]:
+        async with slots:
+            account_started = time.perf_counter()
+            events.put_nowait({"event": "account_started", "data": {
+                "account_id": str(account_id), "email_address": email_address,
+            }})
+
+            def _folder_done(result: Dict[str, Any]) -> None:
+                events.put_nowait({"event": "folder_synced", "data": {
+                    "account_id": str(account_id),
+                    **{key: result[key] for key in ("folder", "inserted", "updated", "deleted", "pages")},
+                }})
+
+            try:
+                access_token = await access_token_cache.get(account_id)
+                stats = await sync_account(account_id, access_token, on_folder_synced=_folder_done)
+            except Exception as e:
+                logger.warning("Fan-out sync failed for account %s: %s", account_id, e)
+                events.put_nowait({"event": "account_error", "data": {
+                    "account_id": str(account_id), "email_address": email_address, "error": str(e),
+                }})
+                return None
+
+            events.put_nowait({"event": "account_complete", "data": {
+                "account_id": str(account_id), "email_address": email_address, **stats,
+                "seconds": round(time.perf_counter() - account_started, 3),
+            }})
+            return stats
+
+    yield {"event": "start", "data": {"accounts": [
+        {"account_id": str(account_id), "email_address": email_address} for account_id, email_address in accounts
+    ]}}
+
+    tasks = [asyncio.create_task(_account(account_id, email_address)) for account_id, email_address in accounts]
+    done = asyncio.gather(*tasks)
+    try:
+        while not (done.done() and events.empty()):
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+    finally:
+        # Client went away: stop the remaining account syncs (page checkpoints make this safe)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = [stats for stats in done.result() if stats is not None]
+    yield {"event": "complete", "data": {
+        "accounts": len(accounts),
+        "succeeded": len(results),
+        "failed": len(accounts) - len(results),
+        "inserted": sum(r["inserted"] for r in results),
+        "updated": sum(r["updated"] for r in results),
+        "deleted": sum(r["deleted"] for r in results),
+        "seconds": round(time.perf_counter() - started, 3),
+    }}
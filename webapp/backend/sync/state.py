@@ -0,0 +1,206 @@
+"""
+Mailbox State Sync
+
+A lightweight second delta channel per folder that tracks only mailbox
+state: read, flagged, importance and categories.
+
+- Its own deltaLink (DeltaToken.state_delta_token) with a narrow $select
+  (id, changeKey and the state fields): no subject, preview or body bytes
+- Only the state columns of rows whose stored changeKey differs are updated,
+  with one executemany UPDATE per page; change_key itself is left alone, so
+  the main delta channel still picks up any content change behind it
+- Messages not stored yet and deletions are left to the main channel
+
+Used for "updated" change notifications (typically a read / flag change)
+and by POST /emails/sync_outlook/{account_id}?state_only=true.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.graph_client import MS_GRAPH_BASE_URL, iter_delta_pages, prefetch
+from db.database import SessionLocal
+from email_accounts.service import access_token_cache
+from emails.conversations import conversation_keys, refresh_conversations
+from emails.service import BULK_UPSERT_CHUNK_SIZE, state_values_from_graph
+from entities.email import Email
+from sync.coordinator import sync_coordinator
+from sync.folders import synced_folder_keys
+from sync.service import EXPIRED_DELTA_STATUSES, get_or_create_delta_token
+from sync.telemetry import record_sync_run
+
+
+logger = logging.getLogger(__name__)
+
+
+STATE_SELECT_FIELDS = ("id", "changeKey", "isRead", "flag", "importance", "categories")
+STATE_COLUMNS = ("is_read", "is_flagged", "importance", "categories")
+
+# Suffix of the state channel in coordinator keys and SyncRun.folder
+STATE_CHANNEL_SUFFIX = "#state"
+
+
+def state_delta_url(folder: str) -> str:
+    return f"{MS_GRAPH_BASE_URL}/me/mailFolders/{folder}/messages/delta?$select=" + ",".join(STATE_SELECT_FIELDS)
+
+
+def apply_state_changes(db: Session, account_id: UUID, items: List[Dict[str, Any]]) -> int:
+    """
+    Update the state columns of stored messages whose changeKey moved (no commit).
+
+    Returns:
+        Number of rows updated
+    """
+    latest = {item["id"]: item for item in items if "@removed" not in item}
+    if not latest:
+        return 0
+
+    message_ids = list(latest)
+    stored: Dict[str, Optional[str]] = {}
+    for i in range(0, len(message_ids), BULK_UPSERT_CHUNK_SIZE):
+        stored.update(db.execute(
+            select(Email.message_id, Email.change_key).where(
+                Email.email_account_id == account_id,
+                Email.message_id.in_(message_ids[i:i + BULK_UPSERT_CHUNK_SIZE]),
+            )
+        ).all())
+
+    params = []
+    for message_id, item in latest.items():
+        if message_id not in stored or stored[message_id] == item.get("changeKey"):
+            continue
+        values = state_values_from_graph(item)
+        params.append({"b_message_id": message_id, **{f"b_{column}": values[column] for column in STATE_COLUMNS}})
+    if not params:
+        return 0
+
+    table = Email.__table__
+    stmt = update(table).where(
+        table.c.email_account_id == account_id,
+        table.c.message_id == bindparam("b_message_id"),
+    ).values({
+        column: bindparam(f"b_{column}", type_=table.c[column].type) for column in STATE_COLUMNS
+    })
+    db.execute(stmt, params)
+    # Unread / flagged counts of the conversations
+    refresh_conversations(db, conversation_keys(
+        db, Email.email_account_id == account_id, Email.message_id.in_([p["b_message_id"] for p in params]),
+    ))
+    return len(params)
+
+
+async def sync_folder_state(account_id: UUID, folder: str, access_token: str) -> Dict[str, Any]:
+    """
+    Run the state delta of one folder, committing page by page.
+
+    An expired state token simply restarts the channel: re-reading the
+    narrow state of a folder is cheap and needs no reconciliation.
+
+    Returns:
+        {"folder", "inserted", "updated", "deleted", "pages", "resumed"}
+    """
+    stats = {"folder": folder, "inserted": 0, "updated": 0, "deleted": 0, "pages": 0, "resumed": False}
+    metrics: Dict[str, float] = {"graph_requests": 0, "graph_seconds": 0.0, "bytes_downloaded": 0, "db_seconds": 0.0}
+    started_at = datetime.now(timezone.utc)
+    failure: Optional[BaseException] = None
+
+    async def _db(fn, *args):
+        started = time.perf_counter()
+        try:
+            return await run_in_threadpool(fn, *args)
+        finally:
+            metrics["db_seconds"] += time.perf_counter() - started
+
+    def _commit_page(page: Dict[str, Any]) -> int:
+        updated = apply_state_changes(db, account_id, page.get("value", []))
+        if page.get("@odata.deltaLink"):
+            token_row.state_delta_token = page["@odata.deltaLink"]
+        db.commit()
+        return updated
+
+    async def _consume(start_url: str) -> None:
+        pages = iter_delta_pages(
+            start_url, access_token, mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+            metrics=metrics,
+        )
+        async for page in prefetch(pages):
+            stats["updated"] += await _db(_commit_page, page)
+            stats["pages"] += 1
+
+    db = SessionLocal()
+    try:
+        token_row = await _db(get_or_create_delta_token, db, account_id, folder)
+        if not token_row.state_delta_token:
+            await _consume(state_delta_url(folder))
+        else:
+            try:
+                await _consume(token_row.state_delta_token)
+            except httpx.HTTPStatusError as e:
+                if stats["pages"] or e.response.status_code not in EXPIRED_DELTA_STATUSES:
+                    raise
+                logger.warning("State token for %s/%s expired; re-reading folder state", account_id, folder)
+                await _consume(state_delta_url(folder))
+    except asyncio.CancelledError as e:
+        failure = e
+        db.rollback()
+        raise
+    except Exception as e:
+        failure = e
+        db.rollback()
+        raise RuntimeError(f"State sync failed for {folder}: {e}") from e
+    finally:
+        db.close()
+        await run_in_threadpool(
+            record_sync_run, account_id, folder + STATE_CHANNEL_SUFFIX, started_at, stats, metrics, failure
+        )
+
+    logger.info("State-synced %s/%s: pages=%d updated=%d", account_id, folder, stats["pages"], stats["updated"])
+    return stats
+
+
+async def sync_account_state(
+    account_id: UUID,
+    access_token: str,
+    folders: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    State-sync folders of an account concurrently (default: every known folder).
+
+    Returns:
+        Aggregated statistics (same shape as sync.service.sync_account)
+    """
+    if folders is None:
+        folders = await run_in_threadpool(synced_folder_keys, account_id)
+    folders = tuple(folders)
+    slots = asyncio.Semaphore(settings.SYNC_MAX_CONCURRENT_FOLDERS)
+
+    async def _folder(folder: str) -> Dict[str, Any]:
+        async with slots:
+            return await sync_coordinator.run(
+                account_id, folder + STATE_CHANNEL_SUFFIX,
+                lambda: sync_folder_state(account_id, folder, access_token),
+            )
+
+    results = await asyncio.gather(*(_folder(folder) for folder in folders))
+    return {
+        "inserted": 0,
+        "updated": sum(r["updated"] for r in results),
+        "deleted": 0,
+        "folders_synced": list(folders),
+    }
+
+
+async def sync_email_account_state(account_id: UUID, folders: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """State sync without a request context (scheduler): token from the shared cache."""
+    access_token = await access_token_cache.get(account_id)
+    return await sync_account_state(account_id, access_token, folders=folders)
@@ -0,0 +1,330 @@
+"""
+Graph Subscriptions
+
+Keeps one Microsoft Graph change-notification subscription per
+(Outlook account, synced folder), so new mail is pushed to our webhook
+(sync/router.py) instead of waiting for the next polling round.
+
+- ensure_account_subscriptions() creates missing and renews expiring subscriptions
+- SubscriptionManager runs it for every account in the background (started in main.py)
+- Replaced subscriptions, those of folders no longer synced and those of
+  removed accounts are DELETEd at Graph, so they stop notifying right away
+- Enabled only when settings.GRAPH_NOTIFICATION_URL is set (Graph must reach it over HTTPS)
+"""
+
+import asyncio
+import hmac
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.graph_client import MS_GRAPH_BASE_URL, THROTTLE_STATUSES, graph_request, raise_for_graph_status
+from db.database import SessionLocal
+from email_accounts.service import access_token_cache
+from entities.email_account import EmailAccount
+from entities.graph_subscription import GraphSubscription
+from sync.scheduler import load_syncable_accounts
+from sync.folders import synced_folder_keys
+
+
+logger = logging.getLogger(__name__)
+
+
+# Graph notifies on these changes of a folder's messages
+SUBSCRIPTION_CHANGE_TYPES = "created,updated,deleted"
+
+# Longest lifetime Graph accepts for Outlook message subscriptions (7 days)
+GRAPH_MAX_SUBSCRIPTION_MINUTES = 10_080
+
+# Kept off the maximum so clock skew never makes Graph reject the expiration
+EXPIRATION_MARGIN_MINUTES = 5
+
+
+def subscription_resource(folder: str) -> str:
+    return f"me/mailFolders('{folder}')/messages"
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def subscription_lifetime_minutes() -> int:
+    """SUBSCRIPTION_LIFETIME_MINUTES, or as long as Graph allows (never above it)."""
+    longest = GRAPH_MAX_SUBSCRIPTION_MINUTES - EXPIRATION_MARGIN_MINUTES
+    return min(settings.SUBSCRIPTION_LIFETIME_MINUTES or longest, longest)
+
+
+def _expiration() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=subscription_lifetime_minutes())
+
+
+def _graph_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.0000000Z")
+
+
+# ============================================================================
+# DB helpers (run in the threadpool)
+# ============================================================================
+
+def _load_subscriptions(account_id: UUID) -> List[GraphSubscription]:
+    db = SessionLocal()
+    try:
+        return db.query(GraphSubscription).filter(GraphSubscription.email_account_id == account_id).all()
+    finally:
+        db.close()
+
+
+def _save_subscription(
+    account_id: UUID, folder: str, subscription_id: str, client_state: str, expires_at: datetime,
+) -> Optional[str]:
+    """
+    Store the folder's subscription.
+
+    Returns:
+        Id of the subscription it replaces (None if the folder had none)
+    """
+    db = SessionLocal()
+    try:
+        row = db.query(GraphSubscription).filter(
+            GraphSubscription.email_account_id == account_id,
+            GraphSubscription.folder == folder,
+        ).first()
+        if row is None:
+            row = GraphSubscription(email_account_id=account_id, folder=folder)
+            db.add(row)
+        replaced = row.subscription_id if row.subscription_id != subscription_id else None
+        row.subscription_id = subscription_id
+        row.client_state = client_state
+        row.expires_at = expires_at
+        db.commit()
+        return replaced
+    finally:
+        db.close()
+
+
+def _update_expiry(subscription_id: str, expires_at: datetime) -> None:
+    db = SessionLocal()
+    try:
+        db.query(GraphSubscription).filter(
+            GraphSubscription.subscription_id == subscription_id
+        ).update({GraphSubscription.expires_at: expires_at}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def delete_subscription_row(subscription_id: str) -> None:
+    """Forget a subscription (Graph removed it); the manager recreates it on its next pass."""
+    db = SessionLocal()
+    try:
+        db.query(GraphSubscription).filter(
+            GraphSubscription.subscription_id == subscription_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def resolve_notification(subscription_id: str, client_state: Optional[str]) -> Optional[Tuple[UUID, UUID, str]]:
+    """
+    Map a notification to (account_id, user_id, folder).
+
+    Returns None for unknown subscriptions or a clientState that doesn't match
+    (the POST did not come from Graph, or the subscription was replaced).
+    """
+    db = SessionLocal()
+    try:
+        row = db.query(GraphSubscription.client_state, GraphSubscription.folder,
+                       EmailAccount.id, EmailAccount.user_id).join(
+            EmailAccount, GraphSubscription.email_account_id == EmailAccount.id
+        ).filter(GraphSubscription.subscription_id == subscription_id).first()
+    finally:
+        db.close()
+
+    if row is None or not hmac.compare_digest(row.client_state, client_state or ""):
+        return None
+    return row.id, row.user_id, row.folder
+
+
+# ============================================================================
+# Graph calls
+# ============================================================================
+
+async def create_subscription(account_id: UUID, folder: str, access_token: str) -> str:
+    """
+    Subscribe to changes of a folder's messages.
+
+    Graph validates the webhook synchronously (POSTs ?validationToken=... to it)
+    before answering, so the webhook must already be reachable.
+
+    Returns:
+        Graph subscription id
+    """
+    client_state = secrets.token_urlsafe(32)
+    expires_at = _expiration()
+    payload = {
+        "changeType": SUBSCRIPTION_CHANGE_TYPES,
+        "notificationUrl": settings.GRAPH_NOTIFICATION_URL,
+        "resource": subscription_resource(folder),
+        "expirationDateTime": _graph_time(expires_at),
+        "clientState": client_state,
+    }
+    if settings.GRAPH_LIFECYCLE_NOTIFICATION_URL:
+        payload["lifecycleNotificationUrl"] = settings.GRAPH_LIFECYCLE_NOTIFICATION_URL
+
+    resp = await graph_request(
+        "POST", f"{MS_GRAPH_BASE_URL}/subscriptions", access_token,
+        json=payload, mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+    )
+    raise_for_graph_status(resp, expected=(201,))
+    subscription_id = resp.json()["id"]
+
+    replaced = await run_in_threadpool(_save_subscription, account_id, folder, subscription_id, client_state, expires_at)
+    logger.info("Created Graph subscription %s for %s/%s", subscription_id, account_id, folder)
+    if replaced:
+        # Would keep notifying (with a clientState we no longer accept) until it expires
+        await delete_graph_subscription(account_id, replaced, access_token)
+    return subscription_id
+
+
+async def delete_graph_subscription(account_id: UUID, subscription_id: str, access_token: str) -> None:
+    """
+    DELETE a subscription at Graph (one that is already gone is fine).
+
+    Never raises: a subscription we fail to delete still expires on its own.
+    """
+    try:
+        resp = await graph_request(
+            "DELETE", f"{MS_GRAPH_BASE_URL}/subscriptions/{subscription_id}", access_token,
+            mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+        )
+        if resp.status_code != 404:
+            raise_for_graph_status(resp, expected=(204,))
+        logger.info("Deleted Graph subscription %s of %s", subscription_id, account_id)
+    except Exception as e:
+        logger.warning("Could not delete Graph subscription %s: %s", subscription_id, e)
+
+
+async def renew_subscription(account_id: UUID, subscription: GraphSubscription, access_token: str) -> None:
+    """Extend a subscription; replace it (deleting the old one) if Graph no longer renews it."""
+    expires_at = _expiration()
+    resp = await graph_request(
+        "PATCH", f"{MS_GRAPH_BASE_URL}/subscriptions/{subscription.subscription_id}", access_token,
+        json={"expirationDateTime": _graph_time(expires_at)},
+        mailbox=str(account_id), tenant=settings.MICROSOFT_TENANT_ID,
+    )
+    if resp.status_code == 404:
+        logger.warning("Subscription %s is gone; recreating", subscription.subscription_id)
+        await create_subscription(account_id, subscription.folder, access_token)
+        return
+    if resp.status_code not in (200, *THROTTLE_STATUSES):
+        logger.warning("Renewing subscription %s failed (%s); replacing it", subscription.subscription_id, resp.status_code)
+        await create_subscription(account_id, subscription.folder, access_token)
+        return
+    raise_for_graph_status(resp)
+    await run_in_threadpool(_update_expiry, subscription.subscription_id, expires_at)
+
+
+async def ensure_account_subscriptions(
+    account_id: UUID,
+    folders: Optional[Iterable[str]] = None,
+    force_renew: bool = False,
+) -> None:
+    """
+    Create missing and renew soon-to-expire subscriptions for an account's folders
+    (default: every folder it syncs, sync.folders.synced_folder_keys).
+
+    Args:
+        force_renew: renew existing subscriptions regardless of expiry
+                     (Graph asks for this with reauthorizationRequired)
+    """
+    every_folder = folders is None
+    folders = tuple(folders or await run_in_threadpool(synced_folder_keys, account_id))
+    existing = {row.folder: row for row in await run_in_threadpool(_load_subscriptions, account_id)}
+    renew_before = datetime.now(timezone.utc) + timedelta(minutes=settings.SUBSCRIPTION_RENEW_BEFORE_MINUTES)
+
+    access_token = await access_token_cache.get(account_id)
+    if every_folder:
+        # Folders no longer synced (deleted, or no longer discovered)
+        for folder, row in existing.items():
+            if folder not in folders:
+                await delete_graph_subscription(account_id, row.subscription_id, access_token)
+                await run_in_threadpool(delete_subscription_row, row.subscription_id)
+    for folder in folders:
+        row = existing.get(folder)
+        if row is None:
+            await create_subscription(account_id, folder, access_token)
+        elif force_renew or _as_utc(row.expires_at) <= renew_before:
+            await renew_subscription(account_id, row, access_token)
+
+
+async def delete_account_subscriptions(account_id: UUID) -> None:
+    """
+    Delete every subscription of an account at Graph and locally (before the account is removed).
+
+    Never raises: the account removal must go through even if Graph is unreachable.
+    """
+    rows = await run_in_threadpool(_load_subscriptions, account_id)
+    if not rows:
+        return
+    try:
+        access_token = await access_token_cache.get(account_id)
+    except Exception as e:
+        logger.warning("No token to delete the subscriptions of %s (%s); they will expire", account_id, e)
+        return
+    for row in rows:
+        await delete_graph_subscription(account_id, row.subscription_id, access_token)
+        await run_in_threadpool(delete_subscription_row, row.subscription_id)
+
+
+# ============================================================================
+# Background manager
+# ============================================================================
+
+class SubscriptionManager:
+    """Periodically ensures every Outlook account has live subscriptions."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the renewal loop on the running event loop."""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run_loop())
+            logger.info("Subscription manager started (webhook=%s)", settings.GRAPH_NOTIFICATION_URL)
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+            logger.info("Subscription manager stopped")
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Subscription manager pass failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> None:
+        accounts = await run_in_threadpool(load_syncable_accounts)
+        for account_id, _ in accounts:
+            try:
+                await ensure_account_subscriptions(account_id)
+            except Exception as e:
+                logger.warning("Could not ensure subscriptions for account %s: %s", account_id, e)
+
+
+# Process-wide manager (started from main.py when GRAPH_NOTIFICATION_URL is set)
+subscription_manager = SubscriptionManager(interval_seconds=settings.SUBSCRIPTION_CHECK_INTERVAL_SECONDS)
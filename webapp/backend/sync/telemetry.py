@@ -0,0 +1,136 @@
+"""
+Sync Telemetry
+
+Persists one SyncRun row per folder sync and answers the questions the
+/sync/runs and /sync/stats endpoints ask of them:
+
+- record_sync_run()     -> called by sync.service.sync_folder (success and failure)
+- list_sync_runs()      -> recent runs of the current user's accounts
+- throughput_stats()    -> per account/folder aggregates over a time window
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from entities.email_account import EmailAccount
+from entities.sync_run import SyncRun
+
+
+logger = logging.getLogger(__name__)
+
+# Error messages are kept short; the full traceback is in the logs
+ERROR_MESSAGE_MAX_LENGTH = 500
+
+
+def record_sync_run(
+    account_id: UUID,
+    folder: str,
+    started_at: datetime,
+    stats: Dict[str, Any],
+    metrics: Dict[str, float],
+    error: Optional[BaseException] = None,
+) -> None:
+    """
+    Store the telemetry of one folder sync (own session, commits).
+
+    Args:
+        stats: sync_folder statistics (inserted, updated, deleted, pages, resumed)
+        metrics: graph_requests, graph_seconds, bytes_downloaded, db_seconds
+        error: the root exception if the sync failed
+    """
+    finished_at = datetime.now(timezone.utc)
+    duration = (finished_at - started_at).total_seconds()
+    items = stats["inserted"] + stats["updated"] + stats["deleted"]
+
+    db = SessionLocal()
+    try:
+        db.add(SyncRun(
+            email_account_id=account_id,
+            folder=folder,
+            started_at=started_at,
+            finished_at=finished_at,
+            duration_seconds=duration,
+            pages=stats["pages"],
+            graph_requests=int(metrics.get("graph_requests", 0)),
+            bytes_downloaded=int(metrics.get("bytes_downloaded", 0)),
+            inserted=stats["inserted"],
+            updated=stats["updated"],
+            deleted=stats["deleted"],
+            resumed=stats["resumed"],
+            graph_seconds=metrics.get("graph_seconds", 0.0),
+            db_seconds=metrics.get("db_seconds", 0.0),
+            items_per_second=items / duration if duration > 0 else None,
+            status="error" if error else "ok",
+            error_class=type(error).__name__ if error else None,
+            error_message=str(error)[:ERROR_MESSAGE_MAX_LENGTH] if error else None,
+        ))
+        db.commit()
+    except Exception:
+        # Telemetry must never fail a sync
+        db.rollback()
+        logger.exception("Could not record sync run for %s/%s", account_id, folder)
+    finally:
+        db.close()
+
+
+def list_sync_runs(
+    db: Session,
+    user_id: UUID,
+    account_id: Optional[UUID] = None,
+    folder: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 100,
+) -> List[SyncRun]:
+    """Most recent sync runs of the user's accounts, newest first."""
+    query = db.query(SyncRun).join(
+        EmailAccount, SyncRun.email_account_id == EmailAccount.id
+    ).filter(EmailAccount.user_id == user_id)
+
+    if account_id is not None:
+        query = query.filter(SyncRun.email_account_id == account_id)
+    if folder is not None:
+        query = query.filter(SyncRun.folder == folder)
+    if status is not None:
+        query = query.filter(SyncRun.status == status)
+
+    return query.order_by(SyncRun.started_at.desc()).limit(limit).all()
+
+
+def throughput_stats(db: Session, user_id: UUID, since: datetime) -> List[Dict[str, Any]]:
+    """
+    Aggregate the user's sync runs since `since`, per (account, folder).
+
+    One GROUP BY query; slow accounts sort first (lowest average items/sec).
+    """
+    rows = db.query(
+        SyncRun.email_account_id,
+        EmailAccount.email_address,
+        SyncRun.folder,
+        func.count(SyncRun.id).label("runs"),
+        func.sum(case((SyncRun.status == "error", 1), else_=0)).label("errors"),
+        func.avg(SyncRun.duration_seconds).label("avg_duration_seconds"),
+        func.max(SyncRun.duration_seconds).label("max_duration_seconds"),
+        func.avg(SyncRun.items_per_second).label("avg_items_per_second"),
+        func.avg(SyncRun.graph_seconds).label("avg_graph_seconds"),
+        func.avg(SyncRun.db_seconds).label("avg_db_seconds"),
+        func.sum(SyncRun.bytes_downloaded).label("total_bytes_downloaded"),
+        func.sum(SyncRun.inserted + SyncRun.updated + SyncRun.deleted).label("total_items"),
+        func.max(SyncRun.started_at).label("last_run_at"),
+    ).join(
+        EmailAccount, SyncRun.email_account_id == EmailAccount.id
+    ).filter(
+        EmailAccount.user_id == user_id,
+        SyncRun.started_at >= since,
+    ).group_by(
+        SyncRun.email_account_id, EmailAccount.email_address, SyncRun.folder
+    ).all()
+
+    stats = [dict(row._mapping) for row in rows]
+    stats.sort(key=lambda s: (s["avg_items_per_second"] is None, s["avg_items_per_second"] or 0.0))
+    return stats
@@ -0,0 +1,183 @@
+"""
+Standalone sync worker
+
+Runs delta syncs outside the API process, so sync scales on its own nodes:
+
+    cd webapp/backend
+    python -m sync_worker                       # SYNC_WORKER_CONCURRENCY accounts at once
+    python -m sync_worker --concurrency 32 --worker-id sync-a
+
+Any number of workers can run against the same database. Accounts are
+shared through leases (sync/leases.py): a worker claims due accounts,
+keeps their leases alive with heartbeats while syncing, schedules the next
+round (sync/cadence.py) and releases them. A worker that dies loses its
+leases after SYNC_LEASE_SECONDS and other workers take over; the
+interrupted delta rounds resume from their page checkpoints.
+
+When workers run, start the API with SYNC_SCHEDULER_ENABLED=false: syncs the
+API would have started (change notifications, manual syncs, new accounts)
+are then requested through AccountSyncState (sync.cadence.request_sync)
+and picked up by the next worker poll.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, Optional, Set
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.graph_client import GraphThrottledError, close_graph_client
+from db.database import create_tables, register_entities
+from sync.cadence import schedule_next_sync
+from sync.coordinator import SyncInProgressError
+from sync.leases import claim_due_accounts, release_lease, renew_leases
+from sync.service import sync_email_account
+
+
+logger = logging.getLogger("sync_worker")
+
+# All entity models, so SQLAlchemy can resolve relationships
+register_entities()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class SyncWorker:
+    """Claims due accounts through DB leases and syncs them, `concurrency` at a time."""
+
+    def __init__(
+        self,
+        worker_id: str,
+        concurrency: int,
+        lease_seconds: float,
+        poll_seconds: float,
+    ):
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._running: Dict[UUID, asyncio.Task] = {}
+        # Accounts whose lease another worker took over while we were syncing them
+        self._lost: Set[UUID] = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Poll for due accounts until stop(); then cancel and release in-flight ones."""
+        logger.info("Sync worker %s started (concurrency=%d)", self.worker_id, self.concurrency)
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await self._poll()
+                except Exception:
+                    logger.exception("Sync worker poll failed")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            heartbeat.cancel()
+            tasks = list(self._running.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(heartbeat, *tasks, return_exceptions=True)
+            logger.info("Sync worker %s stopped", self.worker_id)
+
+    async def _poll(self) -> None:
+        free = self.concurrency - len(self._running)
+        claimed = await run_in_threadpool(claim_due_accounts, self.worker_id, free, self.lease_seconds)
+        for account_id, _ in claimed:
+            task = asyncio.create_task(self._sync_account(account_id))
+            self._running[account_id] = task
+            task.add_done_callback(lambda _, account_id=account_id: self._running.pop(account_id, None))
+        if claimed:
+            logger.info("Claimed %d accounts (%d running)", len(claimed), len(self._running))
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await run_in_threadpool(renew_leases, self.worker_id, list(self._running), self.lease_seconds)
+            except Exception:
+                logger.exception("Lease heartbeat failed")
+                continue
+            # Lost a lease (we stalled past expiry and another worker claimed it): stop syncing it
+            for account_id in set(self._running) - held:
+                logger.warning("Lease on %s lost; cancelling its sync", account_id)
+                self._lost.add(account_id)
+                self._running[account_id].cancel()
+
+    async def _sync_account(self, account_id: UUID) -> None:
+        retry_after: Optional[float] = None
+        try:
+            stats = await sync_email_account(account_id)
+            logger.info(
+                "Synced %s: inserted=%d updated=%d deleted=%d",
+                account_id, stats["inserted"], stats["updated"], stats["deleted"],
+            )
+        except asyncio.CancelledError:
+            raise
+        except SyncInProgressError:
+            logger.info("Skipped %s: an API process is syncing it", account_id)
+        except Exception as e:
+            if isinstance(e.__cause__, GraphThrottledError):
+                retry_after = e.__cause__.retry_after
+            logger.warning("Sync of %s failed: %s", account_id, e)
+        finally:
+            # Shielded: a cancelled sync still gives its account back
+            await asyncio.shield(self._finish(account_id, retry_after))
+
+    async def _finish(self, account_id: UUID, retry_after: Optional[float]) -> None:
+        if account_id in self._lost:
+            # The account belongs to another worker now: its schedule and lease are not ours
+            self._lost.discard(account_id)
+            return
+        try:
+            # Owner-checked as well: the lease may have moved since the last heartbeat
+            await run_in_threadpool(schedule_next_sync, account_id, retry_after, self.worker_id)
+            await run_in_threadpool(release_lease, self.worker_id, account_id)
+        except Exception:
+            logger.exception("Could not release %s", account_id)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    create_tables()
+    worker = SyncWorker(
+        worker_id=args.worker_id or default_worker_id(),
+        concurrency=args.concurrency,
+        lease_seconds=args.lease_seconds,
+        poll_seconds=args.poll_seconds,
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await close_graph_client()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run Outlook delta syncs from DB leases")
+    parser.add_argument("--worker-id", default=None, help="lease owner name (default: host:pid:random)")
+    parser.add_argument("--concurrency", type=int, default=settings.SYNC_WORKER_CONCURRENCY)
+    parser.add_argument("--lease-seconds", type=float, default=settings.SYNC_LEASE_SECONDS)
+    parser.add_argument("--poll-seconds", type=float, default=settings.SYNC_WORKER_POLL_SECONDS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main_async(parse_args()))
@@ -0,0 +1,135 @@
+"""
+Shared fixtures for the backend tests
+
+Every test runs against a throwaway SQLite database and an in-process fake
+Microsoft Graph (fake_graph.app) mounted on the shared Graph AsyncClient via
+httpx.ASGITransport, so no sockets, credentials or Postgres are needed.
+
+Run from webapp/backend:
+    python -m pytest -q tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+
+## Settings are read at import time: configure the environment before any app import
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_db_dir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'tests.db')}"
+os.environ["SYNC_SCHEDULER_ENABLED"] = "false"
+os.environ["BODY_HYDRATOR_ENABLED"] = "false"
+os.environ["FOLDER_DISCOVERY_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("APPLICATION_ID", "test-app")
+os.environ.setdefault("CLIENT_SECRET", "test-secret")
+os.environ.setdefault("TOKEN_ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+import core.graph_client as graph_client  # noqa: E402
+from db.database import Base, SessionLocal, create_tables  # noqa: E402
+from email_accounts.service import access_token_cache, encrypt_token  # noqa: E402
+from entities.email_account import EmailAccount, ProviderEnum  # noqa: E402
+from entities.users import User  # noqa: E402
+from fake_graph.app import FakeMailbox, create_app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def run():
+    """
+    Run a coroutine on one event loop shared by the whole session.
+
+    The Graph limiters and the sync coordinator are process-wide asyncio
+    objects, so every test drives them from the same loop.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.run_until_complete(graph_client.close_graph_client())
+    loop.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    create_tables()
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    """Empty every table after each test."""
+    yield
+    db = SessionLocal()
+    try:
+        for table in reversed(Base.metadata.sorted_tables):
+            db.execute(table.delete())
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def account():
+    """A user with one Outlook account whose Graph access token is already cached."""
+    suffix = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        user = User(
+            id=uuid.uuid4(), email=f"test-{suffix}@example.com",
+            first_name="Test", last_name="User", password_hash="!",
+        )
+        email_account = EmailAccount(
+            id=uuid.uuid4(), user_id=user.id, provider=ProviderEnum.outlook,
+            email_address=f"test-{suffix}@outlook.example.com",
+            ms_refresh_token_encrypted=encrypt_token("fake-refresh-token"),
+        )
+        db.add_all([user, email_account])
+        db.commit()
+        ids = SimpleNamespace(user_id=user.id, account_id=email_account.id, email=user.email)
+    finally:
+        db.close()
+
+    access_token_cache.put(ids.account_id, "fake-access-token", datetime.now(timezone.utc) + timedelta(hours=1))
+    yield ids
+    access_token_cache.invalidate(ids.account_id)
+
+
+@pytest.fixture
+def fake_graph(run):
+    """
+    Factory: fake_graph(mailbox=None, **create_app kwargs) -> fake Graph app.
+
+    The app is mounted on the shared Graph client, so everything under test
+    that calls Graph talks to it. Retry-After defaults to 0 to keep retries fast.
+    """
+    def _mount(mailbox=None, **kwargs):
+        kwargs.setdefault("retry_after_seconds", 0)
+        app = create_app(mailbox or FakeMailbox(), **kwargs)
+        run(graph_client.close_graph_client())
+        graph_client._graph_client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            limits=graph_client.GRAPH_HTTP_LIMITS,
+            timeout=graph_client.GRAPH_HTTP_TIMEOUT,
+        )
+        return app
+
+    yield _mount
+    run(graph_client.close_graph_client())
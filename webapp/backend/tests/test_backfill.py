@@ -0,0 +1,49 @@
+"""A new account's backfill keeps scheduled syncs off the account until phase 3."""
+
+import sync.backfill as backfill
+from core.config import settings
+from fake_graph.app import FakeMailbox
+from sync.leases import claim_due_accounts
+from sync.scheduler import sync_scheduler
+
+
+def test_backfill_holds_account_from_sync_workers(run, fake_graph, account, db, monkeypatch):
+    fake_graph(FakeMailbox.seeded(10, folders=("inbox",)))
+    claims_during_backfill = []
+    real_backfill_recent = backfill.backfill_recent
+
+    async def _backfill_recent(*args, **kwargs):
+        claims_during_backfill.append(claim_due_accounts("worker-a", 10, 60))
+        return await real_backfill_recent(*args, **kwargs)
+
+    monkeypatch.setattr(settings, "BACKFILL_PARTITIONED", False)
+    monkeypatch.setattr(backfill, "backfill_recent", _backfill_recent)
+    run(backfill.backfill_new_account(account.account_id, account.user_id))
+
+    assert claims_during_backfill == [[]]
+    ## Handed off: the delta baseline is due for the workers now
+    assert claim_due_accounts("worker-a", 10, 60) == [(account.account_id, account.user_id)]
+
+
+def test_backfill_holds_account_in_scheduler(run, fake_graph, account, monkeypatch):
+    fake_graph(FakeMailbox.seeded(10, folders=("inbox",)))
+    seen = []
+    spawned = []
+
+    async def _backfill_recent(*args, **kwargs):
+        seen.append((sync_scheduler.is_running(account.account_id), sync_scheduler.trigger(account.account_id, account.user_id)))
+        return {}
+
+    monkeypatch.setattr(settings, "SYNC_SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(settings, "BACKFILL_PARTITIONED", False)
+    monkeypatch.setattr(backfill, "backfill_recent", _backfill_recent)
+    monkeypatch.setattr(sync_scheduler, "_spawn", lambda account_id, *args: spawned.append(account_id))
+
+    async def _backfill():
+        await backfill.start_backfill(account.account_id, account.user_id)
+
+    run(_backfill())
+    ## Running as far as the scheduler knows; the phase 3 request ran after it
+    assert seen == [(True, False)]
+    assert spawned == [account.account_id]
+    assert not sync_scheduler.is_running(account.account_id)
@@ -0,0 +1,43 @@
+"""Incrementally maintained conversation summaries."""
+
+from emails.conversations import SUMMARY_COLUMNS, conversation_lock_key, rebuild_conversations
+from entities.conversation import Conversation
+from fake_graph.app import FakeMailbox
+from sync.service import sync_folder
+
+
+def _summaries(db, account_id):
+    return {
+        row.conversation_key: tuple(
+            sorted(getattr(row, c)) if c == "participants" else getattr(row, c) for c in SUMMARY_COLUMNS
+        )
+        for row in db.query(Conversation).filter(Conversation.email_account_id == account_id)
+    }
+
+
+def test_incremental_summaries_match_a_rebuild(run, fake_graph, account, db):
+    mailbox = FakeMailbox.seeded(60, folders=("inbox", "sentitems"))
+    fake_graph(mailbox, page_size=25)
+    for folder in ("inbox", "sentitems"):
+        run(sync_folder(account.account_id, folder, "fake-access-token"))
+
+    ## Mark read, move a message to another conversation, delete a conversation's latest message
+    inbox = list(mailbox.folders["inbox"].values())
+    mailbox.update_message("inbox", inbox[0]["id"], isRead=True)
+    mailbox.update_message("inbox", inbox[1]["id"], conversationId=inbox[-1]["conversationId"])
+    mailbox.remove_message("inbox", inbox[2]["id"])
+    run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+
+    db.expire_all()
+    incremental = _summaries(db, account.account_id)
+    rebuild_conversations(db, account.account_id)
+    assert incremental == _summaries(db, account.account_id)
+    assert len(incremental) > 10
+    db.rollback()
+
+
+def test_conversation_lock_keys_are_per_account():
+    key = conversation_lock_key(("acct-a", "AAQk-1"))
+    assert key == conversation_lock_key(("acct-a", "AAQk-1"))
+    assert key != conversation_lock_key(("acct-b", "AAQk-1"))
+    assert -2 ** 63 <= key < 2 ** 63
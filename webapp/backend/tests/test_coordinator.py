@@ -0,0 +1,39 @@
+"""Per-account advisory lock bookkeeping of the sync coordinator."""
+
+import asyncio
+import threading
+import uuid
+
+import sync.coordinator as coordinator
+from sync.coordinator import SyncCoordinator, advisory_lock_key
+
+
+def test_slow_lock_connection_does_not_block_other_accounts(run, monkeypatch):
+    slow, fast = uuid.uuid4(), uuid.uuid4()
+    release_slow = threading.Event()
+    connects = []
+
+    def _try_lock(key):
+        connects.append(key)
+        if key == advisory_lock_key(slow):
+            release_slow.wait(5)
+        return None
+
+    monkeypatch.setattr(coordinator, "_try_lock", _try_lock)
+    coord = SyncCoordinator()
+
+    async def _scenario():
+        slow_acquire = asyncio.ensure_future(coord._acquire_account(slow))
+        await asyncio.sleep(0.05)
+        ## The other account gets its lock while the first one is still connecting
+        await asyncio.wait_for(coord._acquire_account(fast), timeout=1)
+        release_slow.set()
+        await slow_acquire
+        ## Folder syncs of an account share one lock connection
+        await coord._acquire_account(slow)
+        for account_id in (slow, slow, fast):
+            await coord._release_account(account_id)
+
+    run(_scenario())
+    assert connects == [advisory_lock_key(slow), advisory_lock_key(fast)]
+    assert coord._account_locks == {} and coord._account_guards == {}
@@ -0,0 +1,37 @@
+"""Delta sync end to end against the fake Graph."""
+
+from entities.delta_token import DeltaToken
+from entities.email import Email
+from fake_graph.app import FakeMailbox
+from fake_graph.generator import generate_messages
+from sync.service import sync_folder
+
+
+def _message_ids(db, account_id):
+    return {row.message_id for row in db.query(Email.message_id).filter(Email.email_account_id == account_id)}
+
+
+def test_full_then_incremental_sync(run, fake_graph, account, db):
+    mailbox = FakeMailbox.seeded(120, folders=("inbox",))
+    app = fake_graph(mailbox, page_size=25)
+
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert stats["inserted"] == 120
+    assert stats["pages"] == 5
+    assert _message_ids(db, account.account_id) == set(mailbox.folders["inbox"])
+    token = db.query(DeltaToken).filter(DeltaToken.email_account_id == account.account_id).one()
+    assert token.delta_token and token.next_link is None
+
+    ## One of each change kind, picked up from the stored deltaLink
+    existing = list(mailbox.folders["inbox"])
+    mailbox.add_messages("inbox", generate_messages(1, mailbox="new"))
+    mailbox.update_message("inbox", existing[0], isRead=True)
+    mailbox.remove_message("inbox", existing[1])
+    requests_before = app.state.stats["requests"]
+
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert (stats["inserted"], stats["updated"], stats["deleted"]) == (1, 1, 1)
+    assert app.state.stats["requests"] - requests_before == 1
+    db.expire_all()
+    assert _message_ids(db, account.account_id) == set(mailbox.folders["inbox"])
+    assert db.query(Email).filter(Email.message_id == existing[0]).one().is_read
@@ -0,0 +1,100 @@
+"""Graph transport: token refresh on 401, throttling and concurrency limits."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import core.graph_client as graph_client
+import email_accounts.service as account_service
+from email_accounts.service import access_token_cache
+from fake_graph.app import FakeMailbox
+from sync.service import sync_folder
+
+
+class RejectToken:
+    """ASGI wrapper: answers 401 to every request made with `token`."""
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.token = token
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers") or [])
+        if scope["type"] == "http" and headers.get(b"authorization") == f"Bearer {self.token}".encode():
+            self.rejected += 1
+            await send({"type": "http.response.start", "status": 401, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self.app(scope, receive, send)
+
+
+def test_revoked_token_is_refreshed_once(run, fake_graph, account, monkeypatch):
+    refreshes = []
+
+    def _refresh(account_id):
+        refreshes.append(account_id)
+        return "fresh-token", datetime.now(timezone.utc) + timedelta(hours=1)
+
+    monkeypatch.setattr(account_service, "_refresh_account_token", _refresh)
+    app = fake_graph(FakeMailbox.seeded(30, folders=("inbox",)), page_size=10)
+    rejecting = RejectToken(app, "fake-access-token")
+    graph_client._graph_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=rejecting))
+
+    ## The sync keeps sending the revoked token; only the first 401 refreshes it
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert stats["inserted"] == 30
+    assert refreshes == [account.account_id]
+    assert rejecting.rejected == 3
+    assert access_token_cache.peek(account.account_id) == "fresh-token"
+
+
+# ============================================================================
+# Throttling
+# ============================================================================
+
+def test_throttled_sync_waits_for_retry_after(run, fake_graph, account, monkeypatch):
+    delays = []
+    real_sleep = graph_client.asyncio.sleep
+
+    async def _sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    app = fake_graph(FakeMailbox.seeded(60, folders=("inbox",)), page_size=10, throttle_every=3, retry_after_seconds=7)
+    monkeypatch.setattr(graph_client.asyncio, "sleep", _sleep)
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+
+    assert stats["inserted"] == 60
+    ## 6 pages + 2 retries: requests 3 and 6 were throttled
+    assert app.state.stats["throttled"] == 2
+    assert delays == [7.0, 7.0]
+    assert graph_client.get_limiter(f"mailbox:{account.account_id}", 4, 4).limit < 4
+
+
+def test_mailbox_slot_is_taken_before_tenant_slot(run, fake_graph, account):
+    fake_graph(FakeMailbox())
+    mailbox = graph_client.get_limiter(
+        f"mailbox:{account.account_id}", graph_client.MAILBOX_CONCURRENCY_INITIAL, graph_client.MAILBOX_CONCURRENCY_MAX,
+    )
+    tenant = graph_client.get_limiter(
+        "tenant:queued-tenant", graph_client.TENANT_CONCURRENCY_INITIAL, graph_client.TENANT_CONCURRENCY_MAX,
+    )
+
+    async def _scenario():
+        for _ in range(int(mailbox.limit)):
+            await mailbox.acquire()
+        request = asyncio.ensure_future(graph_client.graph_request(
+            "GET", f"{graph_client.MS_GRAPH_BASE_URL}/me/mailFolders", "fake-access-token",
+            mailbox=str(account.account_id), tenant="queued-tenant",
+        ))
+        await asyncio.sleep(0.01)
+        ## Queued on its (full) mailbox without holding a tenant slot
+        queued_tenant_slots = tenant.in_flight
+        for _ in range(int(mailbox.limit)):
+            await mailbox.release()
+        resp = await request
+        return queued_tenant_slots, resp.status_code
+
+    assert run(_scenario()) == (0, 200)
@@ -0,0 +1,39 @@
+"""Body hydration after a metadata-only sync."""
+
+from entities.email import Email
+from fake_graph.app import FakeMailbox
+from sync.hydrator import BodyHydrator
+from sync.service import sync_folder
+
+
+def _bodies(db, account_id):
+    db.expire_all()
+    return {
+        row.message_id: row.email_thread_html
+        for row in db.query(Email.message_id, Email.email_thread_html).filter(Email.email_account_id == account_id)
+    }
+
+
+def test_background_hydration(run, fake_graph, account, db):
+    mailbox = FakeMailbox.seeded(5, folders=("inbox",))
+    app = fake_graph(mailbox)
+    run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert set(_bodies(db, account.account_id).values()) == {None}
+
+    ## A message deleted before its body was fetched: 404, not asked for again
+    gone = next(iter(mailbox.folders["inbox"]))
+    mailbox.remove_message("inbox", gone)
+    hydrator = BodyHydrator(interval_seconds=60, batch_size=20)
+    assert run(hydrator.run_once()) == 4
+    assert app.state.stats["batch_subrequests"] == 5
+    assert run(hydrator.run_once()) == 0
+    assert app.state.stats["batch_subrequests"] == 5
+
+    ## A new changeKey clears the stored body so it is hydrated again
+    edited = next(m for m in mailbox.folders["inbox"])
+    mailbox.update_message("inbox", edited, subject="edited")
+    run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    bodies = _bodies(db, account.account_id)
+    assert bodies[edited] is None
+    assert sum(body is not None for body in bodies.values()) == 3
+    assert run(hydrator.run_once()) == 1
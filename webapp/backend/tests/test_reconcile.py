@@ -0,0 +1,40 @@
+"""An expired delta token (410) reconciles the folder instead of re-importing it."""
+
+import pytest
+
+from core.config import settings
+from entities.delta_token import DeltaToken
+from entities.email import Email
+from fake_graph.app import FakeMailbox
+from fake_graph.generator import generate_messages
+from sync.service import sync_folder
+
+
+@pytest.mark.parametrize("metadata_only", [True, False])
+def test_expired_delta_token_reconciles(run, fake_graph, account, db, monkeypatch, metadata_only):
+    monkeypatch.setattr(settings, "SYNC_METADATA_ONLY", metadata_only)
+    mailbox = FakeMailbox.seeded(40, folders=("inbox",))
+    app = fake_graph(mailbox, page_size=15)
+    run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    old_token = db.query(DeltaToken).filter(DeltaToken.email_account_id == account.account_id).one().delta_token
+
+    existing = list(mailbox.folders["inbox"])
+    mailbox.add_messages("inbox", generate_messages(1, mailbox="new"))
+    mailbox.update_message("inbox", existing[0], subject="edited")
+    mailbox.remove_message("inbox", existing[1])
+    mailbox.expire_delta_tokens()
+    items_before = app.state.stats["items"]
+
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert stats["resynced"] is True
+    assert (stats["inserted"], stats["updated"], stats["deleted"]) == (1, 1, 1)
+    ## The whole folder is enumerated once, but only the differences are written
+    assert app.state.stats["items"] - items_before == 40
+
+    db.expire_all()
+    assert db.query(DeltaToken).filter(DeltaToken.email_account_id == account.account_id).one().delta_token != old_token
+    rows = {row.message_id: row for row in db.query(Email).filter(Email.email_account_id == account.account_id)}
+    assert set(rows) == set(mailbox.folders["inbox"])
+    assert rows[existing[0]].subject.startswith("edited")
+    ## The resync keeps the folder's mode: bodies come along unless metadata-only
+    assert (rows[existing[0]].email_thread_html is None) is metadata_only
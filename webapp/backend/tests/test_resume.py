@@ -0,0 +1,54 @@
+"""A delta round interrupted mid-way resumes from its checkpointed nextLink."""
+
+import httpx
+import pytest
+
+import core.graph_client as graph_client
+from entities.delta_token import DeltaToken
+from entities.email import Email
+from fake_graph.app import FakeMailbox
+from sync.service import sync_folder
+
+
+class FailingDelta:
+    """ASGI wrapper: answers the Nth delta page request with a non-retryable 400."""
+
+    def __init__(self, app, fail_on: int):
+        self.app = app
+        self.fail_on = fail_on
+        self.delta_requests = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/messages/delta"):
+            self.delta_requests += 1
+            if self.delta_requests == self.fail_on:
+                await send({"type": "http.response.start", "status": 400, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        await self.app(scope, receive, send)
+
+
+def test_resume_from_next_link(run, fake_graph, account, db):
+    mailbox = FakeMailbox.seeded(50, folders=("inbox",))
+    app = fake_graph(mailbox, page_size=10)
+    failing = FailingDelta(app, fail_on=3)
+    graph_client._graph_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=failing))
+
+    with pytest.raises(RuntimeError):
+        run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+
+    ## Pages 1-2 are committed with the nextLink of page 2 as checkpoint
+    token = db.query(DeltaToken).filter(DeltaToken.email_account_id == account.account_id).one()
+    assert token.next_link and "$skiptoken=" in token.next_link
+    assert token.delta_token is None
+    assert db.query(Email).filter(Email.email_account_id == account.account_id).count() == 20
+
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert stats["resumed"] is True
+    assert (stats["pages"], stats["inserted"]) == (3, 30)
+    assert failing.delta_requests == 6  # 2 good + 1 failed + 3 resumed, no restart
+
+    db.expire_all()
+    token = db.query(DeltaToken).filter(DeltaToken.email_account_id == account.account_id).one()
+    assert token.next_link is None and token.delta_token
+    assert db.query(Email).filter(Email.email_account_id == account.account_id).count() == 50
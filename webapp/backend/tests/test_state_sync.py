@@ -0,0 +1,43 @@
+"""The read / flag state channel next to the main delta channel."""
+
+from entities.conversation import Conversation
+from entities.email import Email
+from fake_graph.app import FakeMailbox
+from fake_graph.generator import generate_messages
+from sync.service import sync_folder
+from sync.state import sync_folder_state
+
+
+def test_state_channel_updates_state_only(run, fake_graph, account, db):
+    mailbox = FakeMailbox.seeded(20, folders=("inbox",))
+    fake_graph(mailbox, page_size=10)
+    run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+
+    ## First state round only establishes the state token
+    assert run(sync_folder_state(account.account_id, "inbox", "fake-access-token"))["updated"] == 0
+
+    unread = next(m for m in mailbox.folders["inbox"].values() if not m["isRead"])
+    stored = db.query(Email).filter(Email.message_id == unread["id"]).one()
+    old_change_key = stored.change_key
+    unread_before = db.query(Conversation).filter(
+        Conversation.email_account_id == account.account_id, Conversation.conversation_id == unread["conversationId"],
+    ).one().unread_count
+    mailbox.update_message("inbox", unread["id"], isRead=True, flag={"flagStatus": "flagged"})
+    mailbox.add_messages("inbox", generate_messages(1, mailbox="new"))
+
+    stats = run(sync_folder_state(account.account_id, "inbox", "fake-access-token"))
+    assert stats["updated"] == 1
+    db.expire_all()
+    stored = db.query(Email).filter(Email.message_id == unread["id"]).one()
+    assert (stored.is_read, stored.is_flagged) == (True, True)
+    ## Content is the main channel's: changeKey untouched, new messages not inserted
+    assert stored.change_key == old_change_key
+    assert db.query(Email).filter(Email.email_account_id == account.account_id).count() == 20
+    conversation = db.query(Conversation).filter(
+        Conversation.email_account_id == account.account_id, Conversation.conversation_id == unread["conversationId"],
+    ).one()
+    assert conversation.unread_count == unread_before - 1
+    assert conversation.is_flagged
+
+    stats = run(sync_folder(account.account_id, "inbox", "fake-access-token"))
+    assert (stats["inserted"], stats["updated"]) == (1, 1)
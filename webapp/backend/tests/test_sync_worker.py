@@ -0,0 +1,52 @@
+"""Sync worker leases: a worker that loses an account's lease lets go of it."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import sync_worker
+from entities.account_sync_state import AccountSyncState
+from sync_worker import SyncWorker
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def test_lost_lease_cancels_sync_and_keeps_new_owner_state(run, account, db, monkeypatch):
+    syncs = []
+
+    async def _slow_sync(account_id):
+        syncs.append(account_id)
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(sync_worker, "sync_email_account", _slow_sync)
+    worker = SyncWorker("worker-a", concurrency=1, lease_seconds=0.3, poll_seconds=0.05)
+    stolen_next_sync_at = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    async def _scenario():
+        task = asyncio.ensure_future(worker.run())
+        while account.account_id not in worker._running:
+            await asyncio.sleep(0.01)
+
+        ## Worker A stalled past its lease; worker B claimed the account and scheduled it
+        state = db.get(AccountSyncState, account.account_id)
+        state.lease_owner = "worker-b"
+        state.lease_expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+        state.next_sync_at = stolen_next_sync_at
+        db.commit()
+
+        for _ in range(100):
+            if account.account_id not in worker._running:
+                break
+            await asyncio.sleep(0.02)
+        stopped_syncing = account.account_id not in worker._running
+        worker.stop()
+        await task
+        return stopped_syncing
+
+    assert run(_scenario()) is True
+    assert syncs == [account.account_id]
+    db.expire_all()
+    state = db.get(AccountSyncState, account.account_id)
+    assert state.lease_owner == "worker-b"
+    assert _as_utc(state.next_sync_at) == stolen_next_sync_at
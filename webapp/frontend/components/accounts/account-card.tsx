@@ -56,8 +56,9 @@ export function AccountCard({ account, onDelete, onSync }: AccountCardProps) {
     const handleViewInbox = async () => {
         try {
             // Use authenticated API client instead of plain fetch
-            const { fetchConversations } = await import('@/utils/conversations-api');
-            const conversations = await fetchConversations(account.id);
+            // Only the newest conversation is needed: ask for a one-row page
+            const { fetchConversationsPage } = await import('@/utils/conversations-api');
+            const { items: conversations } = await fetchConversationsPage(account.id, 1);
 
             // Check if account has any emails
             if (!conversations || conversations.length === 0) {
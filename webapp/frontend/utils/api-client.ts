@@ -20,11 +20,12 @@ function getAuthToken(): string | null {
 
 /**
  * Base fetch wrapper with auth token injection and error handling
+ * Returns the successful response; callers parse the body.
  */
-export async function apiClient<T>(
+async function request(
     endpoint: string,
     options: RequestOptions = {}
-): Promise<T> {
+): Promise<Response> {
     const { requiresAuth = false, headers = {}, ...restOptions } = options;
 
     const config: RequestInit = {
@@ -72,12 +73,7 @@ export async function apiClient<T>(
             );
         }
 
-        // Handle 204 No Content
-        if (response.status === 204) {
-            return {} as T;
-        }
-
-        return await response.json();
+        return response;
     } catch (error) {
         if (error instanceof Error) {
             throw error;
@@ -86,6 +82,42 @@ export async function apiClient<T>(
     }
 }
 
+/**
+ * Fetch an endpoint and parse its JSON body
+ */
+export async function apiClient<T>(
+    endpoint: string,
+    options: RequestOptions = {}
+): Promise<T> {
+    const response = await request(endpoint, options);
+
+    // Handle 204 No Content
+    if (response.status === 204) {
+        return {} as T;
+    }
+
+    return await response.json();
+}
+
+/**
+ * One page of a paginated list endpoint (GET /api/emails/, /api/emails/conversations)
+ */
+export interface Page<T> {
+    items: T[];
+    nextCursor: string | null; // X-Next-Cursor: pass as ?cursor= to get the following page
+}
+
+export async function apiClientPage<T>(
+    endpoint: string,
+    options: RequestOptions = {}
+): Promise<Page<T>> {
+    const response = await request(endpoint, options);
+    return {
+        items: await response.json(),
+        nextCursor: response.headers.get('X-Next-Cursor'),
+    };
+}
+
 /**
  * Convenience methods for common HTTP verbs
  */
@@ -3,20 +3,41 @@
  */
 
 import { Conversation } from "@/types/api";
-import { apiClient } from "./api-client";
+import { apiClient, apiClientPage, Page } from "./api-client";
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
-export async function fetchConversations(accountId?: string): Promise<Conversation[]> {
-    const endpoint = accountId
-        ? `/api/emails/conversations?account_id=${accountId}`
-        : `/api/emails/conversations`;
+// Rows per request when loading a whole list (the backend's API_MAX_PAGE_SIZE)
+const FULL_LIST_PAGE_SIZE = 500;
+
+export async function fetchConversationsPage(
+    accountId?: string,
+    limit?: number,
+    cursor?: string | null
+): Promise<Page<Conversation>> {
+    const params = new URLSearchParams();
+    if (accountId) params.set("account_id", accountId);
+    if (limit) params.set("limit", String(limit));
+    if (cursor) params.set("cursor", cursor);
+    const query = params.toString();
 
-    return apiClient<Conversation[]>(endpoint, {
+    return apiClientPage<Conversation>(`/api/emails/conversations${query ? `?${query}` : ""}`, {
         requiresAuth: true,
     });
 }
 
+// Every conversation, newest first: follows X-Next-Cursor until the last page
+export async function fetchConversations(accountId?: string): Promise<Conversation[]> {
+    const conversations: Conversation[] = [];
+    let cursor: string | null = null;
+    do {
+        const page: Page<Conversation> = await fetchConversationsPage(accountId, FULL_LIST_PAGE_SIZE, cursor);
+        conversations.push(...page.items);
+        cursor = page.nextCursor;
+    } while (cursor);
+    return conversations;
+}
+
 export async function fetchConversation(emailId: number): Promise<Conversation> {
     return apiClient<Conversation>(`/api/emails/${emailId}`, {
         requiresAuth: true,